@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of adversarial collision buckets: the cost of a
+duplicate check (get) and of an insert into a bucket already holding many
+entries, for the csv layout and the indexed layout.
+
+Run from the processor directory, after bin/protogen:
+
+    python3 bench/bench_bucket.py --sizes 10 100 1000 10000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from sawtooth_coo.processor.coo_bucket import IndexedBucket  # noqa: E402
+from sawtooth_coo.processor.coo_state import GDMState  # noqa: E402
+from sawtooth_coo.processor.coo_state import Message  # noqa: E402
+
+
+def _message(sender_ref, field_size):
+    return Message(sender_ref=sender_ref,
+                   subject='S' * field_size,
+                   predicate='P' * field_size,
+                   object_='O' * field_size,
+                   sender='AU',
+                   receiver='SG')
+
+
+def _csv_get(state, data, sender_ref):
+    return state._deserialize(data).get(sender_ref)
+
+
+def _csv_insert(state, data, message):
+    messages = state._deserialize(data)
+    messages[message.sender_ref] = message
+    return state._serialize(messages)
+
+
+def _time(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10, 100, 1000],
+                        help='entries already in the bucket')
+    parser.add_argument('--number', type=int, default=50,
+                        help='iterations per measurement')
+    parser.add_argument('--field-size', type=int, default=64,
+                        help='length of subject, predicate and object')
+    opts = parser.parse_args(args)
+
+    state = GDMState(context=None)
+
+    fmt = "%8s %12s %12s %12s %12s %12s"
+    print(fmt % ('entries', 'csv bytes', 'csv get us', 'csv ins us',
+                 'idx get us', 'idx ins us'))
+    for size in opts.sizes:
+        messages = {
+            'ref-{:08d}'.format(i): _message(
+                'ref-{:08d}'.format(i), opts.field_size)
+            for i in range(0, 2 * size, 2)
+        }
+        csv_entry = state._serialize(messages)
+        indexed = IndexedBucket.from_messages(messages)
+        indexed_entry = indexed.data
+
+        # the lookup misses and the new record lands mid-bucket
+        probe = 'ref-{:08d}'.format(size - 1 if size % 2 == 0 else size)
+        new_message = _message(probe, opts.field_size)
+
+        print(fmt % (
+            size,
+            len(csv_entry),
+            '{:.1f}'.format(_time(
+                lambda: _csv_get(state, csv_entry, probe), opts.number)),
+            '{:.1f}'.format(_time(
+                lambda: _csv_insert(state, csv_entry, new_message),
+                opts.number)),
+            '{:.1f}'.format(_time(
+                lambda: IndexedBucket(indexed_entry).get(probe),
+                opts.number)),
+            '{:.1f}'.format(_time(
+                lambda: IndexedBucket(indexed_entry).insert(new_message),
+                opts.number)),
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Measure GDMClient read throughput against a local stand-in REST API,
+with and without connection pooling.
+
+"unpooled" repeats what GDMClient did before it kept a session: a module
+level requests.get, with the Basic Auth header rebuilt, for every call.
+"pooled" is GDMClient.show over its pooled keep-alive session, and
+"async" AsyncGDMClient.show with as many requests in flight as threads.
+
+    python3 bench/bench_client.py --requests 2000 --threads 1 4 16
+"""
+import argparse
+import asyncio
+import base64
+import concurrent.futures
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from sawtooth_coo.coo_address import make_message_address  # noqa: E402
+from sawtooth_coo.coo_async_client import AsyncGDMClient  # noqa: E402
+from sawtooth_coo.coo_client import GDMClient  # noqa: E402
+from sawtooth_coo.testing.rest_api import MemoryRestApi  # noqa: E402
+
+
+AUTH_USER = 'bench'
+AUTH_PASSWORD = 'secret'
+
+
+def _sender_refs(count):
+    return ['ref-{:08d}'.format(i) for i in range(count)]
+
+
+def _seed(api, sender_refs):
+    for sender_ref in sender_refs:
+        api.state[make_message_address(sender_ref)] = ','.join(
+            [sender_ref, 's', 'o', 'p', 'AU', 'SG']).encode()
+
+
+def _unpooled_show(base_url, sender_ref):
+    auth_string = "{}:{}".format(AUTH_USER, AUTH_PASSWORD)
+    headers = {
+        'Authorization': 'Basic {}'.format(
+            base64.b64encode(auth_string.encode()).decode()),
+    }
+    result = requests.get(
+        "{}/state/{}".format(base_url, make_message_address(sender_ref)),
+        headers=headers)
+    result.raise_for_status()
+    return base64.b64decode(result.json()["data"])
+
+
+def _run(show, sender_refs, threads):
+    start = time.perf_counter()
+    if threads == 1:
+        for sender_ref in sender_refs:
+            show(sender_ref)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+            for _ in executor.map(show, sender_refs):
+                pass
+    return time.perf_counter() - start
+
+
+async def _run_async(url, sender_refs, concurrency):
+    async with AsyncGDMClient(url, auth_user=AUTH_USER,
+                              auth_password=AUTH_PASSWORD,
+                              max_concurrency=concurrency) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            client.show(sender_ref) for sender_ref in sender_refs])
+        return time.perf_counter() - start
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n')[0],
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000,
+                        help='reads per run')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8],
+                        help='concurrent readers to run with')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='simulated seconds the REST API takes per '
+                        'request')
+    opts = parser.parse_args(args)
+
+    sender_refs = _sender_refs(opts.requests)
+
+    fmt = "%-10s %8s %12s %12s"
+    print(fmt % ('mode', 'threads', 'req/s', 'connections'))
+    with MemoryRestApi(latency=opts.latency) as api:
+        _seed(api, sender_refs)
+
+        for threads in opts.threads:
+            api.reset_counters()
+            elapsed = _run(
+                lambda sender_ref: _unpooled_show(api.url, sender_ref),
+                sender_refs, threads)
+            print(fmt % ('unpooled', threads,
+                         round(len(sender_refs) / elapsed, 1),
+                         api.connections))
+
+            api.reset_counters()
+            with GDMClient(api.url, auth_user=AUTH_USER,
+                           auth_password=AUTH_PASSWORD,
+                           pool_size=threads) as client:
+                elapsed = _run(client.show, sender_refs, threads)
+            print(fmt % ('pooled', threads,
+                         round(len(sender_refs) / elapsed, 1),
+                         api.connections))
+
+            api.reset_counters()
+            elapsed = asyncio.run(_run_async(api.url, sender_refs, threads))
+            print(fmt % ('async', threads,
+                         round(len(sender_refs) / elapsed, 1),
+                         api.connections))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Compare the csv (family version 1.0) and protobuf (family version 1.1)
+codecs: payload encode/decode cost, state entry encode/decode cost and
+state entry size.
+
+Run from the processor directory, after bin/protogen:
+
+    python3 bench/bench_codec.py --number 20000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from sawtooth_coo.processor.coo_bucket import IndexedBucket  # noqa: E402
+from sawtooth_coo.processor.coo_payload import GDMPayload  # noqa: E402
+from sawtooth_coo.processor.coo_payload import GDMProtobufPayload  # noqa
+from sawtooth_coo.processor.coo_state import GDMState  # noqa: E402
+from sawtooth_coo.processor.coo_state import Message  # noqa: E402
+from sawtooth_coo.protobuf.generic_discrete_message_pb2 import \
+    MessageList  # noqa: E402
+
+
+def _fields(i, field_size):
+    return [
+        'ref-{:08d}'.format(i),
+        'S' * field_size,
+        'P' * field_size,
+        'O' * field_size,
+        'AU',
+        'SG',
+    ]
+
+
+def _encode_csv(fields):
+    return ",".join(fields).encode()
+
+
+def _encode_protobuf(fields):
+    sender_ref, subject, predicate, object_, sender, receiver = fields
+    message_list = MessageList()
+    message_list.messages.add(
+        sender_ref=sender_ref,
+        subject=subject,
+        predicate=predicate,
+        object=object_,
+        sender=sender,
+        recipient=receiver)
+    return message_list.SerializeToString()
+
+
+def _bucket(size, field_size):
+    messages = {}
+    for i in range(size):
+        sender_ref, subject, predicate, object_, sender, receiver = \
+            _fields(i, field_size)
+        messages[sender_ref] = Message(sender_ref=sender_ref,
+                                       subject=subject,
+                                       predicate=predicate,
+                                       object_=object_,
+                                       sender=sender,
+                                       receiver=receiver)
+    return messages
+
+
+def _time(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--number', type=int, default=10000,
+                        help='iterations per measurement')
+    parser.add_argument('--field-size', type=int, default=64,
+                        help='length of subject, predicate and object')
+    parser.add_argument('--bucket-size', type=int, default=8,
+                        help='messages per state entry')
+    opts = parser.parse_args(args)
+
+    fields = _fields(0, opts.field_size)
+    csv_payload = _encode_csv(fields)
+    pb_payload = _encode_protobuf(fields)
+
+    state = GDMState(context=None)
+    bucket = _bucket(opts.bucket_size, opts.field_size)
+    csv_entry = state._serialize(bucket)
+    pb_entry = IndexedBucket.from_messages(bucket).data
+
+    rows = [
+        ('payload encode', len(csv_payload), len(pb_payload),
+         _time(lambda: _encode_csv(fields), opts.number),
+         _time(lambda: _encode_protobuf(fields), opts.number)),
+        ('payload decode', len(csv_payload), len(pb_payload),
+         _time(lambda: GDMPayload.from_bytes(csv_payload), opts.number),
+         _time(lambda: GDMProtobufPayload.from_bytes(pb_payload),
+               opts.number)),
+        ('state encode', len(csv_entry), len(pb_entry),
+         _time(lambda: state._serialize(bucket), opts.number),
+         _time(lambda: IndexedBucket.from_messages(bucket).data,
+               opts.number)),
+        ('state decode', len(csv_entry), len(pb_entry),
+         _time(lambda: state._deserialize(csv_entry), opts.number),
+         _time(lambda: IndexedBucket(pb_entry).to_dict(), opts.number)),
+    ]
+
+    fmt = "%-16s %10s %10s %12s %12s"
+    print(fmt % ('', 'csv bytes', 'pb bytes', 'csv us/op', 'pb us/op'))
+    for name, csv_size, pb_size, csv_us, pb_us in rows:
+        print(fmt % (name, csv_size, pb_size,
+                     '{:.2f}'.format(csv_us), '{:.2f}'.format(pb_us)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""Benchmark CoOTransactionHandler.apply against an in-memory Context.
+
+Drives the handler with synthetic workloads and reports transactions per
+second and memory allocated per transaction. Results can be saved as JSON
+and compared against a stored baseline:
+
+    python3 bench/bench_handler.py --output baseline.json
+    python3 bench/bench_handler.py --baseline baseline.json
+
+The comparison exits with status 1 when any workload's throughput drops
+by more than --tolerance.
+"""
+import argparse
+import collections
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from sawtooth_sdk.processor.exceptions import InvalidTransaction  # noqa
+
+from sawtooth_coo.coo_address import make_index_addresses  # noqa: E402
+from sawtooth_coo.coo_address import make_message_addresses  # noqa: E402
+from sawtooth_coo.processor.coo_bucket import IndexedBucket  # noqa: E402
+from sawtooth_coo.processor.coo_cache import DECODE_CACHE  # noqa: E402
+from sawtooth_coo.processor.coo_message import Message  # noqa: E402
+from sawtooth_coo.processor.coo_state import GDMState  # noqa: E402
+from sawtooth_coo.processor.coo_state import _make_coo_address  # noqa
+from sawtooth_coo.processor.handler import CoOTransactionHandler  # noqa
+from sawtooth_coo.protobuf.generic_discrete_message_pb2 import \
+    MessageList  # noqa: E402
+from sawtooth_coo.testing.context import MemoryContext  # noqa: E402
+from sawtooth_coo.testing.context import make_process_request  # noqa
+
+
+Workload = collections.namedtuple(
+    'Workload', ['name', 'field_size', 'object_size', 'duplicates',
+                 'bucket_size'])
+
+
+WORKLOADS = [
+    Workload('unique', 16, 16, False, 0),
+    Workload('duplicates', 16, 16, True, 0),
+    Workload('colliding', 16, 16, False, 64),
+    Workload('large-object', 16, 64 * 1024, False, 0),
+    Workload('fields-256', 256, 256, False, 0),
+    Workload('fields-4096', 4096, 4096, False, 0),
+]
+
+
+def _fields(sender_ref, workload):
+    return [
+        sender_ref,
+        's' * workload.field_size,
+        'p' * workload.field_size,
+        'o' * workload.object_size,
+        'AU',
+        'SG',
+    ]
+
+
+def _encode(family_version, records):
+    if family_version == '1.1':
+        message_list = MessageList()
+        for sender_ref, subject, predicate, object_, sender, receiver \
+                in records:
+            message_list.messages.add(
+                sender_ref=sender_ref,
+                subject=subject,
+                predicate=predicate,
+                object=object_,
+                sender=sender,
+                recipient=receiver)
+        return message_list.SerializeToString()
+
+    return "\n".join(",".join(record) for record in records).encode()
+
+
+def _addresses(family_version, record):
+    """The addresses a transaction declares for a record, the one its
+    message is stored at first.
+    """
+    sender_ref, _, _, _, sender, receiver = record
+    if family_version == '1.0':
+        return [_make_coo_address(sender_ref)]
+
+    return make_message_addresses(sender_ref, sender, receiver) \
+        + make_index_addresses(sender_ref, sender, receiver)
+
+
+def _requests(workload, family_version, transactions, batch_size):
+    """Returns:
+        (list of TpProcessRequest, list of list of str): the requests, and
+            the addresses each one stores its messages at.
+    """
+    per_txn = batch_size if family_version == '2.0' else 1
+    requests = []
+    stored_at = []
+    for i in range(transactions):
+        records = [
+            _fields('ref-{:08d}-{:03d}'.format(i, j), workload)
+            for j in range(per_txn)
+        ]
+        declared = [_addresses(family_version, record) for record in records]
+        addresses = [address for record_addresses in declared
+                     for address in record_addresses]
+        request = make_process_request(
+            _encode(family_version, records),
+            family_version=family_version,
+            inputs=addresses,
+            outputs=addresses)
+        requests.append(request)
+        stored_at.append([record_addresses[0]
+                          for record_addresses in declared])
+        if workload.duplicates:
+            requests.append(request)
+            stored_at.append(stored_at[-1])
+
+    return requests, stored_at
+
+
+def _seed_collisions(state, stored_at, workload, family_version):
+    """Pre-fill the message addresses of every request with bucket_size
+    other entries, as if their sender_refs had collided with them.
+    """
+    for n, addresses in enumerate(stored_at):
+        messages = {}
+        for k in range(workload.bucket_size):
+            sender_ref = 'collision-{:08d}-{:04d}'.format(n, k)
+            messages[sender_ref] = Message(
+                sender_ref, 's', 'p', 'o', 'AU', 'SG')
+
+        for address in addresses:
+            if family_version == '1.1':
+                state[address] = IndexedBucket.from_messages(messages).data
+            else:
+                state[address] = GDMState(None)._serialize(messages)
+
+
+def _apply_all(handler, context, requests):
+    rejected = 0
+    for request in requests:
+        try:
+            handler.apply(request, context)
+            context.commit()
+        except InvalidTransaction:
+            context.discard()
+            rejected += 1
+    return rejected
+
+
+def run_workload(workload, family_version, opts):
+    handler = CoOTransactionHandler()
+    requests, stored_at = _requests(
+        workload, family_version, opts.transactions, opts.batch_size)
+
+    state = {}
+    if workload.bucket_size:
+        _seed_collisions(state, stored_at, workload, family_version)
+    seeded = dict(state)
+
+    context = MemoryContext(
+        state=state,
+        get_latency=opts.get_latency,
+        set_latency=opts.set_latency)
+
+    DECODE_CACHE.clear()
+    start = time.perf_counter()
+    rejected = _apply_all(handler, context, requests)
+    elapsed = time.perf_counter() - start
+
+    # second pass, against the same starting state, for memory only
+    sample = requests[:opts.alloc_sample]
+    context.state.clear()
+    context.state.update(seeded)
+    DECODE_CACHE.clear()
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    peak_total = 0
+    for request in sample:
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        _apply_all(handler, context, [request])
+        _, peak = tracemalloc.get_traced_memory()
+        peak_total += peak - current
+    blocks = sys.getallocatedblocks() - blocks_before
+    tracemalloc.stop()
+
+    messages = len(requests) * (
+        opts.batch_size if family_version == '2.0' else 1)
+
+    return collections.OrderedDict([
+        ('transactions', len(requests)),
+        ('rejected', rejected),
+        ('seconds', round(elapsed, 6)),
+        ('tps', round(len(requests) / elapsed, 2)),
+        ('messages_per_second', round(messages / elapsed, 2)),
+        ('peak_alloc_bytes_per_txn', int(peak_total / max(len(sample), 1))),
+        ('retained_blocks_per_txn', round(blocks / max(len(sample), 1), 2)),
+        ('get_calls', context.get_calls),
+        ('set_calls', context.set_calls),
+    ])
+
+
+def compare(results, baseline, tolerance):
+    """Print the change against baseline for every workload in both.
+
+    Returns:
+        (list of str): the workloads whose tps regressed by more than
+            tolerance.
+    """
+    regressions = []
+    fmt = "%-24s %12s %12s %8s"
+    print(fmt % ('workload', 'baseline tps', 'tps', 'change'))
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]['tps']
+        change = (result['tps'] - before) / before
+        flag = ''
+        if change < -tolerance:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print(fmt % (key, before, result['tps'],
+                     '{:+.1%}'.format(change)) + flag)
+
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n')[0],
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--transactions', type=int, default=2000,
+                        help='transactions per workload')
+    parser.add_argument('--family-versions', nargs='+',
+                        default=['1.0', '1.1', '2.0'],
+                        help='family versions to run every workload with')
+    parser.add_argument('--batch-size', type=int, default=16,
+                        help='messages per family version 2.0 transaction')
+    parser.add_argument('--workloads', nargs='+',
+                        choices=[w.name for w in WORKLOADS],
+                        help='run only these workloads')
+    parser.add_argument('--get-latency', type=float, default=0,
+                        help='simulated seconds per get_state call')
+    parser.add_argument('--set-latency', type=float, default=0,
+                        help='simulated seconds per set_state call')
+    parser.add_argument('--alloc-sample', type=int, default=200,
+                        help='transactions traced for allocation figures')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline',
+                        help='compare against results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='allowed fractional tps drop against the '
+                        'baseline')
+    opts = parser.parse_args(args)
+
+    workloads = [w for w in WORKLOADS
+                 if opts.workloads is None or w.name in opts.workloads]
+
+    results = collections.OrderedDict()
+    fmt = "%-24s %10s %10s %12s %14s"
+    print(fmt % ('workload', 'txns', 'rejected', 'tps', 'alloc B/txn'))
+    for workload in workloads:
+        for family_version in opts.family_versions:
+            key = '{}/{}'.format(workload.name, family_version)
+            result = run_workload(workload, family_version, opts)
+            results[key] = result
+            print(fmt % (key, result['transactions'], result['rejected'],
+                         result['tps'], result['peak_alloc_bytes_per_txn']))
+
+    if opts.output:
+        with open(opts.output, 'w') as fd:
+            json.dump(collections.OrderedDict([
+                ('python', platform.python_version()),
+                ('options', vars(opts)),
+                ('results', results),
+            ]), fd, indent=2)
+
+    if opts.baseline:
+        with open(opts.baseline) as fd:
+            baseline = json.load(fd)['results']
+        print()
+        if compare(results, baseline, opts.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Measure how fast GDMClient builds signed batches for create_many, with
+the headers signed on the calling thread or by SigningPools of several
+sizes.
+
+Nothing is submitted; each run times building and packing the batches.
+The pool is started before the clock starts, as a client keeps its pool
+between calls.
+
+    python3 bench/bench_signing.py --messages 5000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import time
+
+from sawtooth_signing import create_context
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from sawtooth_coo.coo_client import GDMClient  # noqa: E402
+from sawtooth_coo.processor.coo_message import Message  # noqa: E402
+
+
+def _messages(count):
+    return [
+        Message('ref-{:08d}'.format(i), 'subject', 'predicate', 'object',
+                'AU', 'SG')
+        for i in range(count)
+    ]
+
+
+def _run(client, messages, binary, max_batch_size):
+    start = time.perf_counter()
+    batches, _, _ = client._pack_messages(  # pylint: disable=protected-access
+        messages, binary, max_batch_size)
+    return time.perf_counter() - start, batches
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n')[0],
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--messages', type=int, default=5000,
+                        help='messages per run')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, 2, 4],
+                        help='signing processes to run with; 1 signs on '
+                        'the calling thread')
+    parser.add_argument('--batch-size', type=int, default=100,
+                        help='transactions per batch')
+    parser.add_argument('--binary', action='store_true',
+                        help='build protobuf (family 1.1) payloads')
+    opts = parser.parse_args(args)
+
+    key = create_context('secp256k1').new_random_private_key().as_hex()
+    messages = _messages(opts.messages)
+
+    fmt = "%-8s %10s %10s"
+    print(fmt % ('workers', 'tx/s', 'batches'))
+    for workers in opts.workers:
+        with GDMClient('http://127.0.0.1:0', key=key,
+                       sign_workers=workers) as client:
+            if workers > 1:
+                # warm up: spawn the workers and load the key in each
+                _run(client, messages[:workers * 64], opts.binary,
+                     opts.batch_size)
+
+            elapsed, batches = _run(
+                client, messages, opts.binary, opts.batch_size)
+
+        print(fmt % (workers, round(len(messages) / elapsed, 1),
+                     len(batches)))
+
+
+if __name__ == '__main__':
+    main()
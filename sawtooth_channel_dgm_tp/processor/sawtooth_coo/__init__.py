@@ -1,5 +1,16 @@
 __all__ = [
+    'coo_address',
+    'coo_async_client',
+    'coo_cache',
     'coo_client',
     'coo_cli',
-    'coo_exceptions'
+    'coo_exceptions',
+    'coo_export',
+    'coo_import',
+    'coo_loadgen',
+    'coo_outbox',
+    'coo_signing',
+    'coo_submitter',
+    'coo_subscriber',
+    'coo_waiter',
 ]
@@ -0,0 +1,104 @@
+"""State addresses of the generic-discrete-message family, shared by the
+transaction processor and the client so they can not drift apart.
+
+There are two address layouts for messages. The legacy layout, used by
+family version 1.0, is the namespace followed by the sha512 of the
+sender_ref. The channel layout, used by the later versions, partitions
+messages by the pair of parties exchanging them:
+
+    namespace | c1 | sha512(pair)[:14] | sha512(sender)[:2]
+              | sha512(sender_ref)[:46]
+
+"c1" marks version 1 of the channel layout. A prefix scan of the first
+22 characters returns the traffic of one channel, in both directions;
+the first 24 return one direction. Keeping a channel's messages under
+one subtree also keeps the validator's merkle tree updates local.
+
+Index entries, which copy each message under its receiver and under its
+sender, are stored at
+
+    namespace | tag | sha512(party)[:30] | sha512(sender_ref)[:32]
+
+so that every index entry of one party shares an address prefix.
+
+A sender_ref is unique across the family, whatever the parties and the
+layout of its message. A message stored in the channel layout is
+recorded in a registry entry at its legacy address, which holds the
+address the message is stored at. The legacy address depends on the
+sender_ref alone, so every family version already declares it and finds
+any earlier message with the same sender_ref there, and a message can be
+found from its sender_ref without knowing its parties.
+"""
+import hashlib
+
+
+FAMILY_NAME = 'generic-discrete-message'
+
+GDM_NAMESPACE = hashlib.sha512(FAMILY_NAME.encode('utf-8')).hexdigest()[0:6]
+
+CHANNEL_LAYOUT_TAG = 'c1'
+RECEIVER_INDEX_TAG = 'f0'
+SENDER_INDEX_TAG = 'f1'
+
+
+def _sha512(value):
+    return hashlib.sha512(value.encode('utf-8')).hexdigest()
+
+
+def make_message_address(sender_ref):
+    """The legacy (family version 1.0) address of a message."""
+    return GDM_NAMESPACE + _sha512(sender_ref)[:64]
+
+
+def make_channel_prefix(party, other_party):
+    """The address prefix of the messages exchanged, in either direction,
+    between two parties.
+    """
+    pair = '\x00'.join(sorted([party, other_party]))
+    return GDM_NAMESPACE + CHANNEL_LAYOUT_TAG + _sha512(pair)[:14]
+
+
+def make_direction_prefix(sender, receiver):
+    """The address prefix of the messages sent by sender to receiver."""
+    return make_channel_prefix(sender, receiver) + _sha512(sender)[:2]
+
+
+def make_channel_message_address(sender_ref, sender, receiver):
+    """The channel layout address of a message."""
+    return make_direction_prefix(sender, receiver) + _sha512(sender_ref)[:46]
+
+
+def make_message_addresses(sender_ref, sender, receiver):
+    """The addresses a message with sender_ref is looked for at, given
+    its parties: its channel layout address, then its legacy address,
+    where a registry entry records where it is stored under any other
+    parties.
+    """
+    return [
+        make_channel_message_address(sender_ref, sender, receiver),
+        make_message_address(sender_ref),
+    ]
+
+
+def make_receiver_index_prefix(receiver):
+    return GDM_NAMESPACE + RECEIVER_INDEX_TAG + _sha512(receiver)[:30]
+
+
+def make_sender_index_prefix(sender):
+    return GDM_NAMESPACE + SENDER_INDEX_TAG + _sha512(sender)[:30]
+
+
+def make_receiver_index_address(receiver, sender_ref):
+    return make_receiver_index_prefix(receiver) + _sha512(sender_ref)[:32]
+
+
+def make_sender_index_address(sender, sender_ref):
+    return make_sender_index_prefix(sender) + _sha512(sender_ref)[:32]
+
+
+def make_index_addresses(sender_ref, sender, receiver):
+    """The index entry addresses a new message is copied to."""
+    return [
+        make_receiver_index_address(receiver, sender_ref),
+        make_sender_index_address(sender, sender_ref),
+    ]
@@ -0,0 +1,400 @@
+"""A GDMClient for asyncio, built on aiohttp.
+
+One AsyncGDMClient can carry many concurrent submissions and reads on a
+single event loop. A semaphore bounds the requests in flight, and the
+connections are pooled by one aiohttp connector, which several clients
+can share:
+
+    connector = aiohttp.TCPConnector(limit=200)
+    async with AsyncGDMClient(url, key=key, connector=connector) as client:
+        await asyncio.gather(*[client.create(...) for ... in ...])
+
+create and create_many wait through one AsyncBatchStatusWaiter, which
+polls the statuses of every batch being waited on together. They sign
+on the event loop's default executor, so that signing does not hold up
+the other requests on the loop.
+"""
+import asyncio
+import collections
+import functools
+import json
+
+import aiohttp
+
+from sawtooth_sdk.protobuf.batch_pb2 import BatchList
+
+from sawtooth_coo.coo_address import make_channel_prefix
+from sawtooth_coo.coo_address import make_receiver_index_prefix
+from sawtooth_coo.coo_address import make_sender_index_prefix
+from sawtooth_coo.coo_client import BaseGDMClient
+from sawtooth_coo.coo_exceptions import CoOException
+from sawtooth_coo.coo_exceptions import CoONotFoundException
+from sawtooth_coo.coo_waiter import AsyncBatchStatusWaiter
+from sawtooth_coo.processor.coo_bucket import REGISTRY_ENTRY_PREFIX
+
+
+class AsyncGDMClient(BaseGDMClient):
+
+    # seconds to wait for a connection and for each response
+    CONNECT_TIMEOUT = 3.05
+    READ_TIMEOUT = 30
+
+    def __init__(self, base_url, keyfile=None, key=None, auth_user=None,
+                 auth_password=None, max_concurrency=100, connector=None,
+                 timeout=None, retries=3, sign_workers=1,
+                 cache=None):
+        """Constructor.
+
+        Args:
+            base_url (str): URL of the validator REST API.
+            keyfile (str): file holding the private key to sign with.
+            key (str): the private key, if there is no keyfile.
+            auth_user (str): user name for REST API Basic Auth, sent with
+                every request.
+            auth_password (str): password for REST API Basic Auth.
+            max_concurrency (int): the most requests this client has in
+                flight at once; the rest wait their turn.
+            connector (aiohttp.BaseConnector): a connection pool shared
+                with other clients, which close() leaves open. By default
+                the client creates its own, of max_concurrency
+                connections.
+            timeout (tuple of float): (connect, read) timeouts in seconds,
+                CONNECT_TIMEOUT and READ_TIMEOUT by default.
+            retries (int): times a read is retried on connection errors
+                and 502/503/504 responses: a GET, or a batch_statuses or
+                receipts query, which are posted. Submissions are never
+                retried, as they are not idempotent.
+            sign_workers (int): processes create_many signs with; 1 signs
+                on a thread of the event loop's default executor.
+            cache (MessageCache): caches the entries show reads; none by
+                default.
+        """
+        super().__init__(base_url, keyfile=keyfile, key=key,
+                         sign_workers=sign_workers, cache=cache)
+
+        self._auth = None
+        if auth_user is not None:
+            self._auth = aiohttp.BasicAuth(auth_user, auth_password or '')
+
+        self._max_concurrency = max_concurrency
+        self._connector = connector
+        self._timeout = timeout or (self.CONNECT_TIMEOUT, self.READ_TIMEOUT)
+        self._retries = retries
+
+        # created on first use, inside the running event loop
+        self._session = None
+        self._semaphore = None
+        self._waiter = None
+
+    @property
+    def waiter(self):
+        """The AsyncBatchStatusWaiter create and create_many wait with."""
+        if self._waiter is None:
+            self._waiter = AsyncBatchStatusWaiter(self)
+        return self._waiter
+
+    async def close(self):
+        """Stop the waiter, close the client's session, and its connector
+        unless it was given one to share, and stop the signing processes.
+        """
+        if self._waiter is not None:
+            await self._waiter.close()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self._close_signing_pool()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def create(
+            self, sender_ref, subject, predicate, object_, sender,
+            receiver, wait=None, binary=False):
+        batch_list, addresses = await self._in_executor(
+            self._create_signed_batch_list,
+            sender_ref, subject, predicate, object_, sender, receiver,
+            binary)
+        if self._cache is not None:
+            self._cache.discard_missing(addresses)
+
+        batch_id = batch_list.batches[0].header_signature
+
+        response = await self._send_request(
+            "batches", batch_list.SerializeToString(),
+            'application/octet-stream')
+
+        if wait and wait > 0:
+            await self.waiter.wait([batch_id], timeout=wait)
+
+        return response
+
+    async def create_many(self, messages, binary=False, max_batch_size=None,
+                          max_batches_per_request=None,
+                          with_transaction_ids=False, wait=None):
+        """Create several messages, like GDMClient.create_many, posting
+        the batch lists concurrently.
+
+        Returns:
+            (list of str): the id of the batch holding each message, in
+                the order of messages; with with_transaction_ids, a tuple
+                of it and the transaction ids.
+        """
+        max_batch_size = max_batch_size or self.MAX_BATCH_SIZE
+        max_batches_per_request = \
+            max_batches_per_request or self.MAX_BATCHES_PER_REQUEST
+
+        if self._sign_workers > 1:
+            # started here, as concurrent calls would each start one
+            self._get_signing_pool()
+        batches, batch_ids, transaction_ids = await self._in_executor(
+            self._pack_messages, messages, binary, max_batch_size)
+
+        await asyncio.gather(*[
+            self._send_request(
+                "batches",
+                BatchList(
+                    batches=batches[start:start + max_batches_per_request]
+                ).SerializeToString(),
+                'application/octet-stream')
+            for start in range(0, len(batches), max_batches_per_request)
+        ])
+
+        if wait and wait > 0:
+            await self.waiter.wait(
+                list(collections.OrderedDict.fromkeys(batch_ids)),
+                timeout=wait)
+
+        if with_transaction_ids:
+            return batch_ids, transaction_ids
+        return batch_ids
+
+    def _create_signed_batch_list(self, sender_ref, subject, predicate,
+                                  object_, sender, receiver, binary):
+        transaction, addresses = self._create_transaction(
+            sender_ref, subject, predicate, object_, sender, receiver,
+            binary=binary)
+        return self._create_batch_list([transaction]), addresses
+
+    async def _in_executor(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(function, *args))
+
+    async def list(self, page_size=None):
+        """Iterate over every message in the namespace a page at a time,
+        like GDMClient.list:
+
+            async for message in client.list():
+                ...
+        """
+        async for entries in self._iter_pages(self._get_prefix(), page_size):
+            for message in self._decode_listed(entries):
+                yield message
+
+    async def inbox(self, receiver):
+        """List the messages sent to receiver, like GDMClient.inbox."""
+        return await self._list_prefix(
+            make_receiver_index_prefix(receiver),
+            lambda message: message.receiver == receiver)
+
+    async def outbox(self, sender):
+        """List the messages sent by sender, like GDMClient.outbox."""
+        return await self._list_prefix(
+            make_sender_index_prefix(sender),
+            lambda message: message.sender == sender)
+
+    async def channel(self, party, other_party):
+        """List the messages exchanged between two parties, like
+        GDMClient.channel.
+        """
+        parties = {party, other_party}
+        return await self._list_prefix(
+            make_channel_prefix(party, other_party),
+            lambda message: {message.sender, message.receiver} == parties)
+
+    async def _list_prefix(self, prefix, belongs):
+        entries = []
+        async for page in self._iter_pages(prefix):
+            entries.extend(page)
+
+        return self._collect_messages(entries, belongs)
+
+    async def _iter_pages(self, prefix, page_size=None):
+        start = None
+        head = None
+        while True:
+            # pinned to the head of the first page, like GDMClient's
+            entries, start, page_head = self._decode_page(
+                await self._send_request(
+                    self._state_query(prefix, page_size, start, head)))
+            head = head or page_head
+            yield entries
+            if start is None:
+                return
+
+    async def show(self, sender_ref, sender=None, receiver=None):
+        """Get the state entry holding sender_ref, like GDMClient.show."""
+        data = await self._show_from(
+            sender_ref, self._get_addresses(sender_ref, sender, receiver))
+        if data.startswith(REGISTRY_ENTRY_PREFIX):
+            data = await self._show_from(
+                sender_ref, [self._registered_address(sender_ref, data)])
+
+        return data
+
+    async def _show_from(self, sender_ref, addresses):
+        data, addresses = self._find_cached(sender_ref, addresses)
+        if data is not None:
+            return data
+
+        for n, address in enumerate(addresses, 1):
+            try:
+                result = await self._send_request(
+                    "state/{}".format(address),
+                    sender_ref=sender_ref)
+            except CoONotFoundException:
+                if self._cache is not None:
+                    self._cache.put_missing(address)
+                if n == len(addresses):
+                    raise
+                continue
+            except CoOException:
+                if n == len(addresses):
+                    raise
+                continue
+
+            data = self._accept_entry(sender_ref, address, result)
+            if data is not None:
+                return data
+
+        raise CoONotFoundException(
+            "No such certificate: {}".format(sender_ref))
+
+    async def get_receipts(self, transaction_ids):
+        """Get the receipts of committed transactions, like
+        GDMClient.get_receipts, querying the chunks concurrently.
+        """
+        transaction_ids = list(transaction_ids)
+        chunks = [
+            transaction_ids[start:start + self.RECEIPTS_PER_REQUEST]
+            for start in range(
+                0, len(transaction_ids), self.RECEIPTS_PER_REQUEST)
+        ]
+
+        try:
+            results = await asyncio.gather(*[
+                self._send_request(
+                    'receipts', json.dumps(chunk).encode(),
+                    'application/json', retry=True)
+                for chunk in chunks
+            ])
+        except CoONotFoundException:
+            raise CoONotFoundException(
+                'No receipts for some of: {}'.format(
+                    ', '.join(transaction_ids)))
+
+        receipts = {}
+        for result in results:
+            receipts.update(self._decode_receipts(result))
+
+        return receipts
+
+    async def confirm(self, messages, transaction_ids):
+        """Check from the receipts of their transactions that messages
+        were stored as sent, like GDMClient.confirm.
+        """
+        return self._match_receipts(
+            messages, transaction_ids,
+            await self.get_receipts(
+                collections.OrderedDict.fromkeys(transaction_ids)))
+
+    async def get_statuses(self, batch_ids):
+        """Get the statuses of several batches with one query, like
+        GDMClient.get_statuses.
+        """
+        return self._decode_statuses(await self._send_request(
+            'batch_statuses', json.dumps(list(batch_ids)).encode(),
+            'application/json', retry=True))
+
+    def _get_session(self):
+        if self._session is None:
+            connector = self._connector or aiohttp.TCPConnector(
+                limit=self._max_concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                connector_owner=self._connector is None,
+                auth=self._auth)
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        return self._session
+
+    async def _send_request(self,
+                            suffix,
+                            data=None,
+                            content_type=None,
+                            sender_ref=None,
+                            timeout=None,
+                            retry=False):
+        """Send a GET, or a POST of data, retrying a GET, or a POST that
+        retry says is a read, like GDMClient._send_request.
+        """
+
+        url = "{}/{}".format(self._base_url.strip('/'), suffix)
+
+        headers = {}
+        if content_type is not None:
+            headers['Content-Type'] = content_type
+
+        connect_timeout, read_timeout = timeout or self._timeout
+        client_timeout = aiohttp.ClientTimeout(
+            sock_connect=connect_timeout, sock_read=read_timeout)
+
+        session = self._get_session()
+        # only reads are retried, so a posted batch is never submitted
+        # twice
+        attempts = self._retries + 1 if data is None or retry else 1
+        for attempt in range(attempts):
+            if attempt:
+                await asyncio.sleep(self.RETRY_BACKOFF * 2 ** (attempt - 1))
+
+            try:
+                async with self._semaphore:
+                    async with session.request(
+                            'POST' if data is not None else 'GET',
+                            url,
+                            data=data,
+                            headers=headers,
+                            timeout=client_timeout) as result:
+                        status = result.status
+                        reason = result.reason
+                        retry_after = result.headers.get('Retry-After')
+                        text = await result.text()
+
+            except (aiohttp.ClientConnectionError,
+                    asyncio.TimeoutError) as err:
+                if attempt + 1 < attempts:
+                    continue
+                raise CoOException(
+                    'Failed to connect to {}: {}'.format(url, str(err)))
+
+            except aiohttp.ClientError as err:
+                raise CoOException(err)
+
+            if status in self.RETRY_STATUSES and attempt + 1 < attempts:
+                continue
+
+            break
+
+        if status == 404:
+            raise CoONotFoundException(
+                "No such certificate: {}".format(sender_ref))
+
+        elif status in self.BACKPRESSURE_STATUSES:
+            raise self._backpressure_error(status, reason, retry_after)
+
+        elif not 200 <= status < 400:
+            raise CoOException("Error {}: {}".format(status, reason))
+
+        return text
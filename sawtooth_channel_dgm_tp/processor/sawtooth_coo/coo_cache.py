@@ -0,0 +1,180 @@
+"""Read-through cache of the state entries GDMClient.show fetches.
+
+A message cannot change once it is created: the handler rejects any
+sender_ref that already exists. Entries are cached by address with no
+expiry, in an in-memory LRU and optionally in a SQLite file that
+outlives the process. An entry can still gain messages, as several
+sender_refs can share an address, so a cached entry only answers for
+the messages it holds; the client reads the address again for any other
+sender_ref. An address that is not found is only remembered for a short
+time, as the message may be committed any moment.
+"""
+import collections
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_MISSING_TTL = 5.0
+# addresses not found, past which the expired ones are dropped
+MAX_MISSING = 4096
+
+
+class MessageCache:
+    """Cache of state entries by address, shared by the threads using a
+    client, or by several clients.
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES,
+                 missing_ttl=DEFAULT_MISSING_TTL):
+        """Constructor.
+
+        Args:
+            path (str): SQLite file to keep entries in across processes,
+                created if need be; memory only by default.
+            max_bytes (int): bound on the total size of the entries kept
+                in memory; the file is not bounded.
+            missing_ttl (float): seconds an address that was not found is
+                reported as missing without asking the REST API again.
+        """
+        self._max_bytes = max_bytes
+        self._missing_ttl = missing_ttl
+
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._missing = {}
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS entries '
+                '(address TEXT PRIMARY KEY, data BLOB NOT NULL)')
+            self._db.commit()
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return collections.OrderedDict([
+                ('hits', self._hits),
+                ('misses', self._misses),
+                ('entries', len(self._entries)),
+                ('bytes', self._size),
+                ('missing', len(self._missing)),
+            ])
+
+    def get(self, address):
+        """Returns:
+            (bytes): the cached entry at address, or None.
+        """
+        with self._lock:
+            data = self._entries.get(address)
+            if data is not None:
+                self._entries.move_to_end(address)
+                self._hits += 1
+                return data
+
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT data FROM entries WHERE address = ?',
+                    (address,)).fetchone()
+                if row is not None:
+                    self._hits += 1
+                    self._remember(address, bytes(row[0]))
+                    return bytes(row[0])
+
+            self._misses += 1
+            return None
+
+    def is_missing(self, address):
+        """Whether address was not found less than missing_ttl seconds
+        ago.
+        """
+        with self._lock:
+            expires = self._missing.get(address)
+            if expires is None:
+                return False
+            if expires <= time.monotonic():
+                del self._missing[address]
+                return False
+            return True
+
+    def put(self, address, data):
+        """Cache the entry read from address."""
+        with self._lock:
+            self._missing.pop(address, None)
+            self._remember(address, data)
+            if self._db is not None:
+                with self._db:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO entries VALUES (?, ?)',
+                        (address, data))
+
+    def put_missing(self, address):
+        """Remember for missing_ttl seconds that address was not found."""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._missing) >= MAX_MISSING:
+                self._missing = {
+                    missing: expires
+                    for missing, expires in self._missing.items()
+                    if expires > now
+                }
+            self._missing[address] = now + self._missing_ttl
+
+    def discard_missing(self, addresses):
+        """Forget that addresses were not found, e.g. once a message has
+        been submitted to them.
+        """
+        with self._lock:
+            for address in addresses:
+                self._missing.pop(address, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._missing.clear()
+            self._hits = 0
+            self._misses = 0
+            if self._db is not None:
+                with self._db:
+                    self._db.execute('DELETE FROM entries')
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, address, data):
+        if len(data) > self._max_bytes:
+            return
+
+        previous = self._entries.pop(address, None)
+        if previous is not None:
+            self._size -= len(previous)
+
+        self._entries[address] = data
+        self._size += len(data)
+
+        while self._size > self._max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
@@ -2,6 +2,7 @@ from __future__ import print_function
 
 import argparse
 import getpass
+import json
 import logging
 import os
 import traceback
@@ -9,16 +10,32 @@ import sys
 import pkg_resources
 
 from colorlog import ColoredFormatter
+from sawtooth_signing import create_context
 
 # FIXME: we reffer to CooClient but import GDMClient?
 from sawtooth_coo.coo_client import GDMClient
 from sawtooth_coo.coo_exceptions import CoOException
+from sawtooth_coo.coo_export import COMPRESSORS
+from sawtooth_coo.coo_export import Exporter
+from sawtooth_coo.coo_export import WRITERS
+from sawtooth_coo.coo_export import compression_for
+from sawtooth_coo.coo_import import Importer
+from sawtooth_coo.coo_import import READERS
+from sawtooth_coo.coo_loadgen import LoadGenerator
+from sawtooth_coo.coo_loadgen import summary
+from sawtooth_coo.coo_outbox import Outbox
+from sawtooth_coo.coo_subscriber import GDMSubscriber
 
 
 DISTRIBUTION_NAME = 'sawtooth-gdm'
 
 
 DEFAULT_URL = 'http://127.0.0.1:8008'
+DEFAULT_VALIDATOR_URL = 'tcp://127.0.0.1:4004'
+
+MESSAGE_FORMAT = "%-20s %-10s %-10s %-15.15s %-15.15s %s"
+
+LOGGER = logging.getLogger(__name__)
 
 
 def create_console_handler(verbose_level):
@@ -133,16 +150,270 @@ def add_send_parser(subparsers, parent_parser):
         type=int,
         help='set time, in seconds, to wait for certificate to commit')
 
+    parser.add_argument(
+        '--binary',
+        action='store_true',
+        default=False,
+        help='send the message with the protobuf encoding '
+        '(family version 1.1)')
+
+    parser.add_argument(
+        '--outbox',
+        type=str,
+        help='journal the message in this outbox file, for reconcile')
+
+
+def add_reconcile_parser(subparsers, parent_parser):
+    parser = subparsers.add_parser(
+        'reconcile',
+        help='resolves the messages an outbox has not seen committed',
+        description='Queries the statuses of the batches in <outbox> that '
+        'are not known to be committed or invalid, in bulk, records the '
+        'final ones, and sends again, as they were signed, the ones the '
+        'validator does not know, e.g. after a crash.',
+        parents=[parent_parser])
+
+    parser.add_argument(
+        'outbox',
+        type=str,
+        help='the outbox file written by send --outbox')
+
+    parser.add_argument(
+        '--wait',
+        type=float,
+        default=30,
+        help='seconds to wait for the batches still pending, or sent '
+        'again, to commit (default 30)')
+
+    _add_read_arguments(parser)
+
+
+def add_import_parser(subparsers, parent_parser):
+    parser = subparsers.add_parser(
+        'import',
+        help='sends the messages of a CSV or JSONL file',
+        description='Streams messages from <file>, or stdin, and sends them '
+        'in batches, pipelining the signing of each chunk with the '
+        'submission of the ones before it. CSV rows hold sender_ref, '
+        'subject, predicate, object, sender and receiver, in that order; '
+        'JSONL objects have those keys. With --log, what became of each '
+        'record is appended to a result log, and an interrupted import run '
+        'again with the same log resumes where it stopped.',
+        parents=[parent_parser])
+
+    parser.add_argument(
+        'file',
+        type=str,
+        nargs='?',
+        default='-',
+        help='the file to import, - for stdin (the default)')
+
+    parser.add_argument(
+        '--format',
+        choices=list(READERS),
+        help='format of the input, by default from the file extension, '
+        'or csv')
+
+    parser.add_argument(
+        '--log',
+        type=str,
+        help='result log to append to, and resume from')
+
+    parser.add_argument(
+        '--binary',
+        action='store_true',
+        default=False,
+        help='send protobuf encoded (family version 1.1) transactions')
+
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        help='messages signed together (default {})'.format(
+            Importer.CHUNK_SIZE))
+
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        help='transactions per batch (default {})'.format(
+            GDMClient.MAX_BATCH_SIZE))
+
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        help='batches in flight at most, fewer while the validator '
+        'turns them away (default {})'.format(
+            Importer.CONCURRENCY))
+
+    parser.add_argument(
+        '--rate',
+        type=float,
+        help='most messages to submit per second')
+
+    parser.add_argument(
+        '--sign-workers',
+        type=int,
+        default=1,
+        help='processes to sign with (default 1, on the main thread)')
+
+    parser.add_argument(
+        '--wait',
+        type=float,
+        default=300,
+        help='seconds to wait for each batch to commit (default 300)')
+
+    parser.add_argument(
+        '--progress',
+        type=float,
+        default=5,
+        help='seconds between progress lines on stderr, 0 for none '
+        '(default 5)')
+
+    parser.add_argument(
+        '--url',
+        type=str,
+        help='specify URL of REST API')
+
+    parser.add_argument(
+        '--username',
+        type=str,
+        help="identify name of sender's private key file")
+
+    parser.add_argument(
+        '--key-dir',
+        type=str,
+        help="identify directory of user's private key file")
+
+    parser.add_argument(
+        '--auth-user',
+        type=str,
+        help='specify username for authentication if REST API '
+        'is using Basic Auth')
+
+    parser.add_argument(
+        '--auth-password',
+        type=str,
+        help='specify password for authentication if REST API '
+        'is using Basic Auth')
+
+
+def add_loadgen_parser(subparsers, parent_parser):
+    parser = subparsers.add_parser(
+        'loadgen',
+        help='submits synthetic messages and measures their latency',
+        description='Submits batches of synthetic messages, open loop at '
+        '--rate messages per second or closed loop from --concurrency '
+        'workers, follows every batch through to commit, and reports the '
+        'p50, p95 and p99 submit and commit latencies, the accepted and '
+        'rejected counts and the throughput over time. With --local, the '
+        'load goes to an in-process stand-in for the validator.',
+        parents=[parent_parser])
+
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        '--rate',
+        type=float,
+        help='messages per second to offer, whatever the latency')
+
+    mode.add_argument(
+        '--concurrency',
+        type=int,
+        help='batches in flight at once, each submitted once the last '
+        'one of its worker resolves (default 1)')
+
+    parser.add_argument(
+        '--duration',
+        type=float,
+        help='seconds to submit for (default {}, unless --batches is '
+        'given)'.format(LoadGenerator.DURATION))
+
+    parser.add_argument(
+        '--batches',
+        type=int,
+        help='batches to submit at most')
+
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        help='messages per batch (default {})'.format(
+            LoadGenerator.BATCH_SIZE))
+
+    parser.add_argument(
+        '--binary',
+        action='store_true',
+        default=False,
+        help='send protobuf encoded (family version 1.1) transactions')
+
+    parser.add_argument(
+        '--max-in-flight',
+        type=int,
+        help='requests posting at once with --rate (default {})'.format(
+            LoadGenerator.MAX_IN_FLIGHT))
+
+    parser.add_argument(
+        '--wait',
+        type=float,
+        default=30,
+        help='seconds to wait for each batch to commit (default 30)')
+
+    parser.add_argument(
+        '--interval',
+        type=float,
+        help='seconds per entry of the timeline, and between progress '
+        'lines on stderr (default {})'.format(LoadGenerator.INTERVAL))
+
+    parser.add_argument(
+        '--results',
+        type=str,
+        help='JSON file to write the results to')
+
+    parser.add_argument(
+        '--local',
+        action='store_true',
+        default=False,
+        help='run against an in-process stand-in for the validator and '
+        'its REST API, which applies the transactions with the handler, '
+        'signing with a throwaway key')
+
+    parser.add_argument(
+        '--local-block-interval',
+        type=float,
+        default=0.1,
+        help='seconds between the blocks of the stand-in (default 0.1)')
+
+    parser.add_argument(
+        '--url',
+        type=str,
+        help='specify URL of REST API')
+
+    parser.add_argument(
+        '--username',
+        type=str,
+        help="identify name of sender's private key file")
+
+    parser.add_argument(
+        '--key-dir',
+        type=str,
+        help="identify directory of user's private key file")
+
+    parser.add_argument(
+        '--auth-user',
+        type=str,
+        help='specify username for authentication if REST API '
+        'is using Basic Auth')
+
+    parser.add_argument(
+        '--auth-password',
+        type=str,
+        help='specify password for authentication if REST API '
+        'is using Basic Auth')
+
 
-##############################################################
-# FIXME: this looks like boilerplate from the XO sample game #
-# TODO: delete it if not required, else fix it               #
-##############################################################
 def add_list_parser(subparsers, parent_parser):
     parser = subparsers.add_parser(
         'list',
-        help='TODO: write help here FIXME:',
-        description='TODO: write a description FIXME:',
+        help='lists every message',
+        description='Lists every message in the generic-discrete-message '
+        'namespace, fetching the state a page at a time.',
         parents=[parent_parser])
 
     parser.add_argument(
@@ -150,6 +421,11 @@ def add_list_parser(subparsers, parent_parser):
         type=str,
         help='specify URL of REST API')
 
+    parser.add_argument(
+        '--page-size',
+        type=int,
+        help='state entries to fetch per request')
+
     parser.add_argument(
         '--username',
         type=str,
@@ -173,6 +449,65 @@ def add_list_parser(subparsers, parent_parser):
         'is using Basic Auth')
 
 
+def add_export_parser(subparsers, parent_parser):
+    parser = subparsers.add_parser(
+        'export',
+        help='writes every message to a JSONL or CSV file',
+        description='Streams every message in the generic-discrete-message '
+        'namespace to <file>, or stdout, writing each page of state as it '
+        'arrives, in a format the import subcommand reads. A file export '
+        'checkpoints its progress, and run again after an interruption it '
+        'resumes where the checkpoint was taken.',
+        parents=[parent_parser])
+
+    parser.add_argument(
+        'file',
+        type=str,
+        nargs='?',
+        default='-',
+        help='the file to write, - for stdout (the default)')
+
+    parser.add_argument(
+        '--format',
+        choices=list(WRITERS),
+        help='format of the output, by default from the file extension, '
+        'or jsonl')
+
+    parser.add_argument(
+        '--compress',
+        choices=list(COMPRESSORS),
+        help='compress the output, by default if the file extension is '
+        'one of {}'.format(', '.join(
+            extension for extension, _ in COMPRESSORS.values())))
+
+    parser.add_argument(
+        '--checkpoint',
+        type=str,
+        help='checkpoint to write and resume from (default <file>'
+        '.checkpoint)')
+
+    parser.add_argument(
+        '--checkpoint-pages',
+        type=int,
+        help='pages written between checkpoints (default {})'.format(
+            Exporter.CHECKPOINT_PAGES))
+
+    parser.add_argument(
+        '--page-size',
+        type=int,
+        help='state entries to fetch per request (default {})'.format(
+            GDMClient.PAGE_SIZE))
+
+    parser.add_argument(
+        '--progress',
+        type=float,
+        default=5,
+        help='seconds between progress lines on stderr, 0 for none '
+        '(default 5)')
+
+    _add_read_arguments(parser)
+
+
 def add_show_parser(subparsers, parent_parser):
     parser = subparsers.add_parser(
         'show',
@@ -214,6 +549,113 @@ def add_show_parser(subparsers, parent_parser):
         'is using Basic Auth')
 
 
+def add_inbox_parser(subparsers, parent_parser):
+    parser = subparsers.add_parser(
+        'inbox',
+        help='lists the messages sent to a receiver',
+        description='Lists the messages sent to <receiver>, read from its '
+        'index entries. Only messages sent with family version 1.1 '
+        '(--binary) or 2.0 are indexed.',
+        parents=[parent_parser])
+
+    parser.add_argument(
+        'receiver',
+        type=str,
+        help='receiver of the messages')
+
+    _add_read_arguments(parser)
+
+
+def add_outbox_parser(subparsers, parent_parser):
+    parser = subparsers.add_parser(
+        'outbox',
+        help='lists the messages sent by a sender',
+        description='Lists the messages sent by <sender>, read from its '
+        'index entries. Only messages sent with family version 1.1 '
+        '(--binary) or 2.0 are indexed.',
+        parents=[parent_parser])
+
+    parser.add_argument(
+        'sender',
+        type=str,
+        help='sender of the messages')
+
+    _add_read_arguments(parser)
+
+
+def add_channel_parser(subparsers, parent_parser):
+    parser = subparsers.add_parser(
+        'channel',
+        help='lists the messages exchanged between two parties',
+        description='Lists the messages exchanged, in either direction, '
+        'between <party> and <other_party>. Only messages sent with family '
+        'version 1.1 (--binary) or 2.0 are stored by channel.',
+        parents=[parent_parser])
+
+    parser.add_argument(
+        'party',
+        type=str,
+        help='one party of the channel')
+
+    parser.add_argument(
+        'other_party',
+        type=str,
+        help='the other party of the channel')
+
+    _add_read_arguments(parser)
+
+
+def add_watch_parser(subparsers, parent_parser):
+    parser = subparsers.add_parser(
+        'watch',
+        help='prints messages as they are committed',
+        description='Prints the messages sent to <receiver> as the blocks '
+        'holding them are committed, from the event stream of the '
+        'validator, until interrupted. With -v, the id of each block is '
+        'logged as it is committed, to resume from with --from-block.',
+        parents=[parent_parser])
+
+    parser.add_argument(
+        'receiver',
+        type=str,
+        help='receiver of the messages')
+
+    parser.add_argument(
+        '--sender',
+        type=str,
+        help='only print messages sent by sender')
+
+    parser.add_argument(
+        '--from-block',
+        type=str,
+        help='first print the messages committed after this block id')
+
+    parser.add_argument(
+        '--validator-url',
+        type=str,
+        help='specify URL of the validator component endpoint (default '
+        '{})'.format(DEFAULT_VALIDATOR_URL))
+
+
+def _add_read_arguments(parser):
+    parser.add_argument(
+        '--url',
+        type=str,
+        help='specify URL of REST API')
+
+    parser.add_argument(
+        '--auth-user',
+        type=str,
+        help='specify username for authentication if REST API '
+        'is using Basic Auth')
+
+    parser.add_argument(
+        '--auth-password',
+        type=str,
+        help='specify password for authentication if REST API '
+        'is using Basic Auth')
+
+
 def create_parent_parser(prog_name):
     parent_parser = argparse.ArgumentParser(prog=prog_name, add_help=False)
     parent_parser.add_argument(
@@ -248,8 +690,16 @@ def create_parser(prog_name):
     subparsers.required = True
 
     add_send_parser(subparsers, parent_parser)
+    add_reconcile_parser(subparsers, parent_parser)
+    add_import_parser(subparsers, parent_parser)
+    add_loadgen_parser(subparsers, parent_parser)
     add_list_parser(subparsers, parent_parser)
+    add_export_parser(subparsers, parent_parser)
     add_show_parser(subparsers, parent_parser)
+    add_inbox_parser(subparsers, parent_parser)
+    add_outbox_parser(subparsers, parent_parser)
+    add_channel_parser(subparsers, parent_parser)
+    add_watch_parser(subparsers, parent_parser)
 
     return parser
 
@@ -258,27 +708,107 @@ def do_list(args):
     url = _get_url(args)
     auth_user, auth_password = _get_auth_info(args)
 
-    client = GDMClient(base_url=url, keyfile=None)
+    client = GDMClient(base_url=url, keyfile=None, auth_user=auth_user,
+                       auth_password=auth_password)
 
-    certificate_list = [
-        certificate.split(',')
-        for certificates in client.list(
-                auth_user=auth_user,
-                auth_password=auth_password)
-        for certificate in certificates.decode().split('|')
-    ]
+    _print_messages(client.list(page_size=args.page_size))
 
-    if certificate_list is not None:
-        fmt = "%-15s %-15.15s %-15.15s %s"
-        print(fmt % ('DOCUMENT_HASH', 'SENDER', 'RECIPIENT', 'STATE'))
-        for certificate_data in certificate_list:
 
-            certificate_number, status, sender, recipient = certificate_data
+def do_export(args):
+    url = _get_url(args)
+    auth_user, auth_password = _get_auth_info(args)
+
+    compression = args.compress
+    if compression is None and args.file != '-':
+        compression = compression_for(args.file)
+
+    file_format = args.format
+    if file_format is None:
+        name = args.file
+        if compression is not None:
+            name = name[:-len(COMPRESSORS[compression][0])]
+        extension = os.path.splitext(name)[1].lstrip('.').lower()
+        file_format = extension if extension in WRITERS else 'jsonl'
+
+    with GDMClient(base_url=url, keyfile=None, auth_user=auth_user,
+                   auth_password=auth_password) as client:
+        exporter = Exporter(
+            client,
+            args.file,
+            file_format=file_format,
+            compression=compression,
+            checkpoint_path=args.checkpoint,
+            page_size=args.page_size,
+            checkpoint_pages=args.checkpoint_pages,
+            progress=sys.stderr if args.progress else None,
+            progress_interval=args.progress)
+        count = exporter.run()
+
+    LOGGER.info("Exported %s messages", count)
+
+
+def do_inbox(args):
+    url = _get_url(args)
+    auth_user, auth_password = _get_auth_info(args)
+
+    client = GDMClient(base_url=url, keyfile=None, auth_user=auth_user,
+                       auth_password=auth_password)
+
+    _print_messages(client.inbox(args.receiver))
+
+
+def do_outbox(args):
+    url = _get_url(args)
+    auth_user, auth_password = _get_auth_info(args)
+
+    client = GDMClient(base_url=url, keyfile=None, auth_user=auth_user,
+                       auth_password=auth_password)
+
+    _print_messages(client.outbox(args.sender))
+
+
+def do_channel(args):
+    url = _get_url(args)
+    auth_user, auth_password = _get_auth_info(args)
+
+    client = GDMClient(base_url=url, keyfile=None, auth_user=auth_user,
+                       auth_password=auth_password)
+
+    _print_messages(client.channel(args.party, args.other_party))
+
+
+def do_watch(args):
+    url = args.validator_url or DEFAULT_VALIDATOR_URL
+    last_known_block_ids = [args.from_block] if args.from_block else None
+
+    subscriber = GDMSubscriber(
+        url, receiver=args.receiver, sender=args.sender,
+        last_known_block_ids=last_known_block_ids)
+
+    _print_message_header()
+    with subscriber:
+        for block in subscriber.blocks():
+            for message in block.messages:
+                _print_message(message)
+            LOGGER.info("Block %s: %s", block.block_num, block.block_id)
+            sys.stdout.flush()
+
+
+def _print_messages(messages):
+    _print_message_header()
+    for message in messages:
+        _print_message(message)
+
+
+def _print_message_header():
+    print(MESSAGE_FORMAT % ('SENDER_REF', 'SENDER', 'RECEIVER', 'SUBJECT',
+                            'PREDICATE', 'OBJECT'))
 
-            print(fmt % (certificate_number, sender[:6], recipient[:6], status))
-    else:
-        # FIXME: rename CoOException to GDMException
-        raise CoOException("Could not retrieve certificate listing.")
+
+def _print_message(message):
+    print(MESSAGE_FORMAT % (message.sender_ref, message.sender,
+                            message.receiver, message.subject,
+                            message.predicate, message.object))
 
 
 def do_send(args):
@@ -293,21 +823,122 @@ def do_send(args):
     keyfile = _get_keyfile(args)
     auth_user, auth_password = _get_auth_info(args)
 
-    client = GDMClient(base_url=url, keyfile=keyfile)
+    outbox = Outbox(args.outbox) if args.outbox else None
+    client = GDMClient(base_url=url, keyfile=keyfile, auth_user=auth_user,
+                       auth_password=auth_password, outbox=outbox)
 
     if args.wait and args.wait > 0:
         response = client.create(
             sender_ref, subject, predicate, object_, sender, receiver,
             wait=args.wait,
-            auth_user=auth_user,
-            auth_password=auth_password)
+            binary=args.binary)
     else:
         response = client.create(
             sender_ref, subject, predicate, object_, sender, receiver,
-            auth_user=auth_user,
-            auth_password=auth_password)
+            binary=args.binary)
 
     print("Response: {}".format(response))
+    if outbox is not None:
+        outbox.close()
+
+
+def do_reconcile(args):
+    url = _get_url(args)
+    auth_user, auth_password = _get_auth_info(args)
+
+    with Outbox(args.outbox) as outbox, \
+            GDMClient(base_url=url, keyfile=None, auth_user=auth_user,
+                      auth_password=auth_password, outbox=outbox) as client:
+        counts = client.reconcile(wait=args.wait)
+        journaled = outbox.counts()
+
+    print('batches: {}'.format(' '.join(
+        '{} {}'.format(status.lower(), count)
+        for status, count in counts.items())))
+    print('messages: {}'.format(' '.join(
+        '{} {}'.format(status.lower(), count)
+        for status, count in journaled.items())))
+
+
+def do_import(args):
+    url = _get_url(args)
+    keyfile = _get_keyfile(args)
+    auth_user, auth_password = _get_auth_info(args)
+
+    file_format = args.format
+    if file_format is None:
+        extension = os.path.splitext(args.file)[1].lstrip('.').lower()
+        file_format = extension if extension in READERS else 'csv'
+
+    with GDMClient(base_url=url, keyfile=keyfile, auth_user=auth_user,
+                   auth_password=auth_password,
+                   pool_size=args.concurrency or Importer.CONCURRENCY,
+                   sign_workers=args.sign_workers) as client:
+        importer = Importer(
+            client,
+            log_path=args.log,
+            binary=args.binary,
+            chunk_size=args.chunk_size,
+            max_batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            wait=args.wait,
+            progress=sys.stderr if args.progress else None,
+            progress_interval=args.progress)
+
+        if args.file == '-':
+            stats = importer.run(READERS[file_format](sys.stdin))
+        else:
+            with open(args.file, newline='') as stream:
+                stats = importer.run(READERS[file_format](stream))
+
+    if stats.failed:
+        raise CoOException(
+            '{} messages failed; run again with the same --log to retry '
+            'them'.format(stats.failed))
+
+
+def do_loadgen(args):
+    if args.local:
+        # only needed here, and only for local runs
+        from sawtooth_coo.testing.validator import MemoryValidator
+
+        with MemoryValidator(
+                block_interval=args.local_block_interval) as validator:
+            key = create_context('secp256k1').new_random_private_key()
+            _run_loadgen(args, validator.url, key=key.as_hex())
+    else:
+        auth_user, auth_password = _get_auth_info(args)
+        _run_loadgen(args, _get_url(args), keyfile=_get_keyfile(args),
+                     auth_user=auth_user, auth_password=auth_password)
+
+
+def _run_loadgen(args, url, **client_args):
+    pool_size = args.concurrency or 1
+    if args.rate is not None:
+        pool_size = args.max_in_flight or LoadGenerator.MAX_IN_FLIGHT
+
+    with GDMClient(base_url=url, pool_size=pool_size,
+                   **client_args) as client:
+        generator = LoadGenerator(
+            client,
+            rate=args.rate,
+            concurrency=args.concurrency,
+            duration=args.duration,
+            batches=args.batches,
+            batch_size=args.batch_size,
+            binary=args.binary,
+            wait=args.wait,
+            max_in_flight=args.max_in_flight,
+            interval=args.interval,
+            progress=sys.stderr)
+        results = generator.run()
+
+    print(summary(results))
+    if args.results is not None:
+        with open(args.results, 'w') as stream:
+            json.dump(results, stream, indent=2)
+            stream.write('\n')
 
 
 def _get_url(args):
@@ -346,8 +977,24 @@ def main(prog_name=os.path.basename(sys.argv[0]), args=None):
 
     if args.command == 'send':
         do_send(args)
+    elif args.command == 'reconcile':
+        do_reconcile(args)
+    elif args.command == 'import':
+        do_import(args)
+    elif args.command == 'loadgen':
+        do_loadgen(args)
     elif args.command == 'list':
         do_list(args)
+    elif args.command == 'export':
+        do_export(args)
+    elif args.command == 'inbox':
+        do_inbox(args)
+    elif args.command == 'outbox':
+        do_outbox(args)
+    elif args.command == 'channel':
+        do_channel(args)
+    elif args.command == 'watch':
+        do_watch(args)
     else:
         raise CoOException("invalid command: {}".format(args.command))
 
@@ -1,37 +1,170 @@
+import collections
 import hashlib
+import itertools
 import base64
 from base64 import b64encode
-import time
+import json
 import random
+import time
+import urllib.parse
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import yaml
 
+from google.protobuf.message import DecodeError
+
 from sawtooth_signing import create_context
 from sawtooth_signing import CryptoFactory
 from sawtooth_signing import ParseError
 from sawtooth_signing.secp256k1 import Secp256k1PrivateKey
 
+from sawtooth_sdk.processor.exceptions import InternalError
 from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
 from sawtooth_sdk.protobuf.transaction_pb2 import Transaction
 from sawtooth_sdk.protobuf.batch_pb2 import BatchList
 from sawtooth_sdk.protobuf.batch_pb2 import BatchHeader
 from sawtooth_sdk.protobuf.batch_pb2 import Batch
 
+from sawtooth_coo.coo_address import GDM_NAMESPACE
+from sawtooth_coo.coo_address import make_channel_message_address
+from sawtooth_coo.coo_address import make_channel_prefix
+from sawtooth_coo.coo_address import make_index_addresses
+from sawtooth_coo.coo_address import make_message_address
+from sawtooth_coo.coo_address import make_message_addresses
+from sawtooth_coo.coo_address import make_receiver_index_prefix
+from sawtooth_coo.coo_address import make_sender_index_prefix
+from sawtooth_coo.coo_exceptions import CoOBackpressureException
 from sawtooth_coo.coo_exceptions import CoOException
+from sawtooth_coo.coo_exceptions import CoONotFoundException
+from sawtooth_coo.coo_signing import SigningPool
+from sawtooth_coo.coo_outbox import SUBMITTED
+from sawtooth_coo.coo_waiter import BatchStatus
+from sawtooth_coo.coo_waiter import BatchStatusWaiter
+from sawtooth_coo.coo_waiter import FINAL_STATUSES
+from sawtooth_coo.processor.coo_bucket import INDEX_ENTRY_PREFIX
+from sawtooth_coo.processor.coo_bucket import REGISTRY_ENTRY_PREFIX
+from sawtooth_coo.processor.coo_bucket import decode_registry_entry
+from sawtooth_coo.processor.coo_bucket import record_hash
+from sawtooth_coo.processor.coo_message import Message
+from sawtooth_coo.processor.coo_payload import CSV_SEPARATORS
+from sawtooth_coo.processor.coo_receipts import decode_receipt_data
+from sawtooth_coo.processor.coo_state import decode_state_entry
+from sawtooth_coo.protobuf.generic_discrete_message_pb2 import MessageList
 
 
 def _sha512(data):
     return hashlib.sha512(data).hexdigest()
 
 
-class GDMClient:
-    def __init__(self, base_url, keyfile=None, key=None):
+def _fits_csv(fields):
+    """Whether fields can be sent as a family version 1.0 csv payload,
+    holding neither its commas nor the separators of the csv state
+    entries it is stored in.
+    """
+    return not any(
+        separator in field
+        for field in fields for separator in (',',) + CSV_SEPARATORS)
+
+
+def _decode_state_entry(data):
+    """decode_state_entry, raising CoOException rather than the SDK's
+    InternalError for an entry that can not be decoded.
+    """
+    try:
+        return decode_state_entry(data)
+    except InternalError as err:
+        raise CoOException(
+            'Failed to decode state entry: {}'.format(err))
+
+
+def _group_by_address(address_lists):
+    """Split items into groups that share no address with each other.
+
+    Args:
+        address_lists (list of list of str): the addresses of each item.
+
+    Returns:
+        (list of list of int): the indexes of the items in each group, in
+            order, the groups in the order of their first item.
+    """
+    parents = list(range(len(address_lists)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    owners = {}
+    for i, addresses in enumerate(address_lists):
+        for address in addresses:
+            owner = owners.setdefault(address, i)
+            root, other = find(i), find(owner)
+            if root != other:
+                parents[max(root, other)] = min(root, other)
+
+    groups = {}
+    for i in range(len(address_lists)):
+        groups.setdefault(find(i), []).append(i)
+
+    return [groups[root] for root in sorted(groups)]
+
+
+def _pack_groups(groups, max_size):
+    """Pack groups of item indexes into bins of at most max_size items,
+    keeping each group in one bin unless it is larger than max_size.
+    """
+    bins = []
+    current = []
+    for group in groups:
+        for start in range(0, len(group), max_size):
+            chunk = group[start:start + max_size]
+            if len(current) + len(chunk) > max_size:
+                bins.append(current)
+                current = []
+            current.extend(chunk)
+    if current:
+        bins.append(current)
+
+    return bins
 
+
+class BaseGDMClient:
+    """Signing, transaction construction and response decoding shared by
+    GDMClient and AsyncGDMClient, which differ only in how they talk to
+    the REST API.
+    """
+
+    # defaults for create_many
+    MAX_BATCH_SIZE = 100
+    MAX_BATCHES_PER_REQUEST = 100
+
+    # state entries per page when listing
+    PAGE_SIZE = 100
+
+    # transaction ids per receipts query
+    RECEIPTS_PER_REQUEST = 100
+
+    # statuses with which the REST API turns requests away for now
+    BACKPRESSURE_STATUSES = (429, 503)
+
+    # statuses a read is retried on, and seconds before the first retry
+    RETRY_STATUSES = (502, 503, 504)
+    RETRY_BACKOFF = 0.1
+
+    def __init__(self, base_url, keyfile=None, key=None, sign_workers=1,
+                 cache=None):
         self._base_url = base_url
+        self._cache = cache
+        self._sign_workers = sign_workers
+        self._signing_pool = None
 
         if keyfile is None:
             if key is None:
                 self._signer = None
+                self._private_key = None
+                self._public_key = None
                 return
             else:
                 private_key_str = key
@@ -52,10 +185,495 @@ class GDMClient:
 
         self._signer = CryptoFactory(create_context('secp256k1')) \
             .new_signer(private_key)
+        self._private_key = private_key
+        # derived once; every transaction and batch header carries it
+        self._public_key = self._signer.get_public_key().as_hex()
+
+    def _pack_messages(self, messages, binary, max_batch_size):
+        """Build a transaction for each message and pack them into
+        batches, keeping transactions that share an address in the same
+        batch (see GDMClient.create_many). With more than one
+        sign_workers, the headers are signed by a SigningPool.
+
+        Returns:
+            (list of Batch, list of str, list of str): the batches, the id
+                of the batch holding each message, and the id of each
+                message's transaction.
+        """
+        if self._sign_workers > 1:
+            return self._pack_messages_in_pool(
+                messages, binary, max_batch_size)
+
+        transactions = []
+        address_lists = []
+        for message in messages:
+            transaction, addresses = self._create_transaction(
+                message.sender_ref,
+                message.subject,
+                message.predicate,
+                message.object,
+                message.sender,
+                message.receiver,
+                binary=binary)
+            transactions.append(transaction)
+            address_lists.append(addresses)
+
+        batch_ids = [None] * len(transactions)
+        batches = []
+        for indexes in _pack_groups(
+                _group_by_address(address_lists), max_batch_size):
+            batch = self._create_batch(
+                [transactions[i] for i in indexes])
+            for i in indexes:
+                batch_ids[i] = batch.header_signature
+            batches.append(batch)
+
+        return batches, batch_ids, [
+            transaction.header_signature for transaction in transactions]
+
+    def _pack_messages_in_pool(self, messages, binary, max_batch_size):
+        pool = self._get_signing_pool()
+
+        headers = []
+        payloads = []
+        address_lists = []
+        for message in messages:
+            header, payload, addresses = self._create_transaction_header(
+                message.sender_ref,
+                message.subject,
+                message.predicate,
+                message.object,
+                message.sender,
+                message.receiver,
+                binary=binary)
+            headers.append(header)
+            payloads.append(payload)
+            address_lists.append(addresses)
+
+        bins = _pack_groups(_group_by_address(address_lists), max_batch_size)
+
+        # transactions are signed in batch order, and the batch headers
+        # are built and queued for signing as their transactions'
+        # signatures come back, while the pool is still busy with later
+        # transactions
+        signatures = pool.sign_iter(
+            headers[i] for indexes in bins for i in indexes)
+        batch_contents = []
+
+        def batch_headers():
+            for indexes in bins:
+                transactions = [
+                    Transaction(
+                        header=headers[i],
+                        payload=payloads[i],
+                        header_signature=next(signatures))
+                    for i in indexes
+                ]
+                batch_header = self._create_batch_header(transactions)
+                batch_contents.append((batch_header, transactions))
+                yield batch_header
+
+        batch_ids = [None] * len(headers)
+        transaction_ids = [None] * len(headers)
+        batches = []
+        for n, signature in enumerate(pool.sign_iter(batch_headers())):
+            batch_header, transactions = batch_contents[n]
+            batches.append(Batch(
+                header=batch_header,
+                transactions=transactions,
+                header_signature=signature))
+            for i, transaction in zip(bins[n], transactions):
+                batch_ids[i] = signature
+                transaction_ids[i] = transaction.header_signature
+
+        return batches, batch_ids, transaction_ids
+
+    def _get_signing_pool(self):
+        if self._signing_pool is None:
+            self._signing_pool = SigningPool(
+                self._private_key.as_hex(), workers=self._sign_workers)
+        return self._signing_pool
+
+    def _close_signing_pool(self):
+        if self._signing_pool is not None:
+            self._signing_pool.close()
+            self._signing_pool = None
+
+    def _backpressure_error(self, status, reason, retry_after=None):
+        """Returns:
+            (CoOBackpressureException): for a response turned away, with
+                the seconds of its Retry-After header if it has one.
+        """
+        try:
+            seconds = max(0.0, float(retry_after))
+        except (TypeError, ValueError):
+            # absent, or an HTTP date
+            seconds = None
+
+        return CoOBackpressureException(
+            "Error {}: {}".format(status, reason), retry_after=seconds)
+
+    def _state_query(self, prefix, page_size=None, start=None, head=None):
+        query = [('address', prefix), ('limit', page_size or self.PAGE_SIZE)]
+        if start is not None:
+            query.append(('start', start))
+        if head is not None:
+            query.append(('head', head))
+        return 'state?{}'.format(urllib.parse.urlencode(query))
+
+    def _decode_page(self, result):
+        """Decode one page of a state listing.
+
+        Returns:
+            (list of bytes, str, str): the entries' data, the paging
+                cursor of the next page, None on the last one, and the id
+                of the block whose state the page was read from.
+        """
+        try:
+            page = json.loads(result)
+            entries = [
+                base64.b64decode(entry["data"]) for entry in page["data"]
+            ]
+        except (ValueError, KeyError, TypeError) as err:
+            raise CoOException(err)
+
+        # the cursor, not the "next" link, as the REST API may not know
+        # the URL it is reached by
+        return (entries, page.get("paging", {}).get("next_position"),
+                page.get("head"))
+
+    def _decode_listed(self, entries):
+        for data in entries:
+            # skip the receiver and sender index entries, which copy
+            # messages, and the registry entries, which hold none
+            if not data.startswith(
+                    (INDEX_ENTRY_PREFIX, REGISTRY_ENTRY_PREFIX)):
+                yield from _decode_state_entry(data).values()
+
+    def _collect_messages(self, entries, belongs):
+        messages = {}
+        for data in entries:
+            # parties whose hashes share the prefix can share an entry
+            for sender_ref, message in _decode_state_entry(data).items():
+                if belongs(message):
+                    messages[sender_ref] = message
+
+        return [messages[sender_ref] for sender_ref in sorted(messages)]
+
+    def _decode_entry(self, result):
+        try:
+            return base64.b64decode(yaml.safe_load(result)["data"])
+
+        except BaseException:
+            return None
+
+    def _accept_entry(self, sender_ref, address, result):
+        """Decode and cache the entry show read from address.
+
+        Returns:
+            (bytes): the entry, or None if it does not hold sender_ref,
+                as another message stored at the address can.
+        """
+        data = self._decode_entry(result)
+        if data is None:
+            return None
+
+        if self._cache is not None:
+            self._cache.put(address, data)
+        if not self._holds(sender_ref, data):
+            return None
+
+        return data
+
+    def _decode_receipts(self, result):
+        """Returns:
+            (dict): transaction id (str) keys, list of Receipt values.
+        """
+        try:
+            return {
+                receipt['transaction_id']: [
+                    decoded
+                    for data in receipt.get('data', [])
+                    for decoded in decode_receipt_data(base64.b64decode(data))
+                ]
+                for receipt in json.loads(result)['data']
+            }
+        except (ValueError, KeyError, TypeError, DecodeError) as err:
+            raise CoOException(err)
+
+    def _match_receipts(self, messages, transaction_ids, receipts):
+        confirmed = []
+        for message, transaction_id in zip(messages, transaction_ids):
+            expected = record_hash(message)
+            confirmed.append(next(
+                (receipt for receipt in receipts.get(transaction_id, ())
+                 if receipt.sender_ref == message.sender_ref
+                 and receipt.record_hash == expected),
+                None))
+
+        return confirmed
+
+    def _decode_statuses(self, result):
+        try:
+            return {
+                status['id']: status
+                for status in json.loads(result)['data']
+            }
+        except (ValueError, KeyError, TypeError) as err:
+            raise CoOException(err)
+
+    def _get_addresses(self, sender_ref, sender=None, receiver=None):
+        """The addresses show tries, in order."""
+        if sender is not None and receiver is not None:
+            return make_message_addresses(sender_ref, sender, receiver)
+        return [self._get_address(sender_ref)]
+
+    def _registered_address(self, sender_ref, data):
+        """Returns:
+            (str): the address the registry entry data records for
+                sender_ref.
+
+        Raises:
+            CoONotFoundException: sender_ref is not in the entry.
+        """
+        try:
+            address = decode_registry_entry(data).get(sender_ref)
+        except InternalError as err:
+            raise CoOException(
+                'Failed to decode registry entry: {}'.format(err))
+
+        if address is None:
+            raise CoONotFoundException(
+                "No such certificate: {}".format(sender_ref))
+
+        return address
+
+    def _holds(self, sender_ref, data):
+        """Whether the state entry data holds sender_ref: its message, or
+        for a registry entry, the address of its message.
+
+        Raises:
+            CoOException: data can not be decoded.
+        """
+        if data.startswith(REGISTRY_ENTRY_PREFIX):
+            try:
+                return sender_ref in decode_registry_entry(data)
+            except InternalError as err:
+                raise CoOException(
+                    'Failed to decode registry entry: {}'.format(err))
+
+        return sender_ref in _decode_state_entry(data)
+
+    def _find_cached(self, sender_ref, addresses):
+        """Look addresses up in the cache, if there is one. A cached entry
+        that does not hold sender_ref predates its message, which may
+        share the address, so the address is read again.
+
+        Returns:
+            (bytes, list of str): a cached entry, or None and the addresses
+                that are not known to be missing.
+        """
+        if self._cache is None:
+            return None, addresses
+
+        remaining = []
+        for address in addresses:
+            data = self._cache.get(address)
+            if data is not None:
+                if self._holds(sender_ref, data):
+                    return data, []
+                remaining.append(address)
+            elif not self._cache.is_missing(address):
+                remaining.append(address)
+
+        if not remaining:
+            raise CoONotFoundException(
+                "No such certificate: {}".format(sender_ref))
+
+        return None, remaining
+
+    def _get_prefix(self):
+        return GDM_NAMESPACE
+
+    def _get_address(self, sender_ref, sender=None, receiver=None):
+        if sender is not None and receiver is not None:
+            return make_channel_message_address(sender_ref, sender, receiver)
+        return make_message_address(sender_ref)
+
+    def _create_transaction(self,
+                            sender_ref,
+                            subject,
+                            predicate,
+                            object_,
+                            sender,
+                            receiver,
+                            binary=False):
+        """Returns:
+            (Transaction, list of str): the signed transaction, and the
+                addresses it declares.
+        """
+        header, payload, addresses = self._create_transaction_header(
+            sender_ref, subject, predicate, object_, sender, receiver,
+            binary=binary)
+
+        signature = self._signer.sign(header)
+
+        transaction = Transaction(
+            header=header,
+            payload=payload,
+            header_signature=signature
+        )
+
+        return transaction, addresses
+
+    def _create_transaction_header(self,
+                                   sender_ref,
+                                   subject,
+                                   predicate,
+                                   object_,
+                                   sender,
+                                   receiver,
+                                   binary=False):
+        """Returns:
+            (bytes, bytes, list of str): the serialized header, the
+                payload, and the addresses the header declares.
+        """
+        # a field the csv payload can not carry goes as 1.1, which stores
+        # it as it is
+        binary = binary or not _fits_csv(
+            (sender_ref, subject, predicate, object_, sender, receiver))
+
+        if binary:
+            # Family version 1.1 payloads are protobuf MessageLists
+            message_list = MessageList()
+            message_list.messages.add(
+                sender_ref=sender_ref,
+                subject=subject,
+                predicate=predicate,
+                object=object_,
+                sender=sender,
+                recipient=receiver)
+            payload = message_list.SerializeToString()
+            family_version = "1.1"
+        else:
+            # Serialization is just a delimited utf-8 encoded string
+            payload = ",".join(
+                [sender_ref, subject, predicate, object_, sender, receiver]
+            ).encode()
+            family_version = "1.0"
+
+        # Construct the address
+        if binary:
+            # 1.1 messages are stored at their channel layout address, but
+            # the handler also checks the legacy one for duplicates and
+            # records them in the registry entry there, and copies them to
+            # the party index entries
+            addresses = make_message_addresses(sender_ref, sender, receiver)
+            addresses += make_index_addresses(sender_ref, sender, receiver)
+        else:
+            addresses = [self._get_address(sender_ref)]
+
+        header = TransactionHeader(
+            signer_public_key=self._public_key,
+            family_name="generic-discrete-message",
+            family_version=family_version,
+            inputs=addresses,
+            outputs=addresses,
+            dependencies=[],
+            payload_sha512=_sha512(payload),
+            batcher_public_key=self._public_key,
+            nonce=hex(random.randint(0, 2**64))
+        ).SerializeToString()
+
+        return header, payload, addresses
+
+    def _create_batch_list(self, transactions):
+        return BatchList(batches=[self._create_batch(transactions)])
+
+    def _create_batch(self, transactions):
+        header = self._create_batch_header(transactions)
+
+        signature = self._signer.sign(header)
+
+        batch = Batch(
+            header=header,
+            transactions=transactions,
+            header_signature=signature)
+        return batch
+
+    def _create_batch_header(self, transactions):
+        transaction_signatures = [t.header_signature for t in transactions]
+
+        return BatchHeader(
+            signer_public_key=self._public_key,
+            transaction_ids=transaction_signatures
+        ).SerializeToString()
+
+
+class GDMClient(BaseGDMClient):
+
+    # seconds to wait for a connection and for each response
+    CONNECT_TIMEOUT = 3.05
+    READ_TIMEOUT = 30
+
+    # seconds the waiter follows a journaled batch for; reconcile picks
+    # up the ones still unresolved after that
+    OUTBOX_WAIT = 300
+
+    def __init__(self, base_url, keyfile=None, key=None, auth_user=None,
+                 auth_password=None, pool_size=10, keep_alive=True,
+                 timeout=None, retries=3, sign_workers=1,
+                 cache=None, outbox=None):
+        """Constructor.
+
+        Args:
+            base_url (str): URL of the validator REST API.
+            keyfile (str): file holding the private key to sign with.
+            key (str): the private key, if there is no keyfile.
+            auth_user (str): user name for REST API Basic Auth, sent with
+                every request.
+            auth_password (str): password for REST API Basic Auth.
+            pool_size (int): connections kept open to the REST API, the
+                most requests that can be in flight at once from threads
+                sharing this client.
+            keep_alive (bool): reuse connections between requests.
+            timeout (tuple of float): (connect, read) timeouts in seconds,
+                CONNECT_TIMEOUT and READ_TIMEOUT by default.
+            retries (int): times a read is retried on connection errors
+                and 502/503/504 responses: a GET, or a batch_statuses or
+                receipts query, which are posted. Submissions are never
+                retried, as they are not idempotent.
+            sign_workers (int): processes create_many signs with; 1 signs
+                on the calling thread.
+            cache (MessageCache): caches the entries show reads; none by
+                default.
+            outbox (Outbox): journals every batch create and create_many
+                sign, and what becomes of it, for reconcile; none by
+                default.
+        """
+
+        super().__init__(base_url, keyfile=keyfile, key=key,
+                         sign_workers=sign_workers, cache=cache)
+
+        self._timeout = timeout or (self.CONNECT_TIMEOUT, self.READ_TIMEOUT)
+        self._retries = retries
+        self._session = self._create_session(
+            auth_user, auth_password, pool_size, keep_alive, retries)
+        self._waiter = None
+        self._outbox = outbox
+
+    @property
+    def waiter(self):
+        """The BatchStatusWaiter create and create_many wait with, which
+        callers can also add their own batch ids to.
+        """
+        if self._waiter is None:
+            self._waiter = BatchStatusWaiter(self)
+        return self._waiter
 
     def create(
             self, sender_ref, subject, predicate, object_, sender,
-            receiver, wait=None, auth_user=None, auth_password=None):
+            receiver, wait=None, binary=False):
         return self._send_coo_txn(
             sender_ref,
             subject,
@@ -64,87 +682,473 @@ class GDMClient:
             sender,
             receiver,
             wait=wait,
-            auth_user=auth_user,
-            auth_password=auth_password)
+            binary=binary)
 
-    def list(self, auth_user=None, auth_password=None):
-        gdm_prefix = self._get_prefix()
+    def create_many(self, messages, binary=False, max_batch_size=None,
+                    max_batches_per_request=None, wait=None,
+                    with_transaction_ids=False):
+        """Create several messages with as few batches and requests as
+        possible.
 
-        result = self._send_request(
-            "state?address={}".format(gdm_prefix),
-            auth_user=auth_user,
-            auth_password=auth_password)
+        Every message gets a transaction of its own. Transactions that
+        share an address are kept, in order, in the same batch, so that
+        separate batches touch disjoint addresses and the validator's
+        parallel scheduler can run them side by side. A batch is
+        committed or rejected as a whole: one duplicate sender_ref makes
+        every message in its batch fail.
 
-        try:
-            encoded_entries = yaml.safe_load(result)["data"]
+        Args:
+            messages (list of Message): the messages to create.
+            binary (bool): send family version 1.1 transactions; a
+                message with a field holding ",", "|" or a newline is
+                always sent as 1.1.
+            max_batch_size (int): transactions per batch, MAX_BATCH_SIZE
+                by default.
+            max_batches_per_request (int): batches per POST to the REST
+                API, MAX_BATCHES_PER_REQUEST by default.
+            wait (float): seconds to wait for the batches to be committed
+                or rejected before returning.
+            with_transaction_ids (bool): also return the id of each
+                message's transaction, to confirm with confirm().
 
-            return [
-                base64.b64decode(entry["data"]) for entry in encoded_entries
-            ]
+        Returns:
+            (list of str): the id of the batch holding each message, in
+                the order of messages; with with_transaction_ids, a tuple
+                of it and the transaction ids.
 
-        except BaseException:
-            return None
+        Raises:
+            CoOBackpressureException: the REST API turned a request away;
+                the batches posted before it are not waited on. A
+                SubmissionQueue submits again what is turned away.
+        """
+        max_batches_per_request = \
+            max_batches_per_request or self.MAX_BATCHES_PER_REQUEST
 
-    def show(self, sender_ref, auth_user=None, auth_password=None):
-        address = self._get_address(sender_ref)
+        batches, batch_ids, transaction_ids = self.sign_batches(
+            messages, binary, max_batch_size)
+        if self._outbox is not None:
+            self._outbox.record(messages, batches, batch_ids,
+                                transaction_ids)
 
-        result = self._send_request(
-            "state/{}".format(address),
-            sender_ref=sender_ref,
-            auth_user=auth_user,
-            auth_password=auth_password)
-        try:
-            return base64.b64decode(yaml.safe_load(result)["data"])
+        self._post_batches(batches, max_batches_per_request)
 
-        except BaseException:
-            return None
+        if wait and wait > 0:
+            self.waiter.wait(
+                list(collections.OrderedDict.fromkeys(batch_ids)),
+                timeout=wait)
 
-    def _get_status(self, batch_id, wait, auth_user=None, auth_password=None):
-        try:
-            result = self._send_request(
-                'batch_statuses?id={}&wait={}'.format(batch_id, wait),
-                auth_user=auth_user,
-                auth_password=auth_password)
-            return yaml.safe_load(result)['data'][0]['status']
-        except BaseException as err:
-            raise CoOException(err)
+        if with_transaction_ids:
+            return batch_ids, transaction_ids
+        return batch_ids
 
-    def _get_prefix(self):
-        return _sha512('generic-discrete-message'.encode('utf-8'))[0:6]
+    def sign_batches(self, messages, binary=False, max_batch_size=None):
+        """Build and sign the batches create_many would post for
+        messages, without posting them or journaling them in the outbox.
+
+        Args:
+            messages (list of Message): the messages.
+            binary (bool): family version 1.1 transactions, as for
+                create_many.
+            max_batch_size (int): transactions per batch, MAX_BATCH_SIZE
+                by default.
+
+        Returns:
+            (list of Batch, list of str, list of str): the batches, the id
+                of the batch holding each message, and the id of each
+                message's transaction.
+        """
+        return self._pack_messages(
+            messages, binary, max_batch_size or self.MAX_BATCH_SIZE)
+
+    def submit_batches(self, batches):
+        """Post signed batches in one request, without journaling them in
+        the outbox or waiting on them.
+
+        Raises:
+            CoOBackpressureException: the REST API turned them away for
+                now, with 429 or 503; they can be posted again later.
+            CoOException: they could not be posted.
+        """
+        self._send_request(
+            "batches", BatchList(batches=batches).SerializeToString(),
+            'application/octet-stream')
+
+    def reconcile(self, wait=None):
+        """Resolve the batches the outbox has not seen resolved, e.g.
+        after a crash: query their statuses in bulk, record the final
+        ones, and post again, from the outbox, the ones the validator
+        does not know.
+
+        Args:
+            wait (float): seconds to wait for the batches still pending,
+                and the ones posted again, to resolve.
+
+        Returns:
+            (dict): the number of batches found COMMITTED, INVALID and
+                PENDING, and RESUBMITTED.
+        """
+        if self._outbox is None:
+            raise CoOException('The client has no outbox to reconcile')
+
+        counts = collections.OrderedDict(
+            (name, 0) for name in (
+                'COMMITTED', 'INVALID', 'PENDING', 'RESUBMITTED'))
+        waiting = []
+
+        unresolved = self._outbox.unresolved()
+        while True:
+            page = list(itertools.islice(unresolved, self.waiter.CHUNK_SIZE))
+            if not page:
+                break
+
+            statuses = self.get_statuses(
+                [batch_id for batch_id, _, _ in page])
+            unknown = []
+            for batch_id, _, data in page:
+                status = statuses.get(batch_id, {})
+                batch_status = BatchStatus(
+                    batch_id, status.get('status', 'UNKNOWN'),
+                    status.get('invalid_transactions', []))
+                if batch_status.status in FINAL_STATUSES:
+                    self._outbox.mark_status(batch_status)
+                    counts[batch_status.status] += 1
+                elif batch_status.status == 'UNKNOWN':
+                    batch = Batch()
+                    batch.ParseFromString(data)
+                    unknown.append(batch)
+                else:
+                    waiting.append(batch_id)
+                    counts['PENDING'] += 1
+
+            if unknown:
+                self._post_batches(unknown, self.MAX_BATCHES_PER_REQUEST)
+                waiting.extend(batch.header_signature for batch in unknown)
+                counts['RESUBMITTED'] += len(unknown)
+
+        for batch_id in waiting:
+            self.waiter.add(batch_id, timeout=self.OUTBOX_WAIT,
+                            callback=self._outbox.mark_status)
+        if wait and wait > 0:
+            self.waiter.wait(waiting, timeout=wait)
+
+        return counts
+
+    def list(self, page_size=None):
+        """Iterate over every message in the namespace, fetching the state
+        entries one page at a time, so memory stays flat however many
+        there are.
+
+        Args:
+            page_size (int): state entries per request, PAGE_SIZE by
+                default.
+
+        Yields:
+            (Message): the messages, in address order.
+        """
+        yield from self._decode_listed(
+            self._iter_state(self._get_prefix(), page_size))
+
+    def list_pages(self, page_size=None, start=None, head=None):
+        """Iterate over the namespace a page at a time, like list, with
+        the paging cursor to resume from after each page. Every page is
+        read from the state at the same block, so the listing is a
+        snapshot.
+
+        Args:
+            page_size (int): state entries per request, PAGE_SIZE by
+                default.
+            start (str): a paging cursor to resume from, as yielded
+                earlier; the start of the namespace by default.
+            head (str): the block to read the state at, as yielded
+                earlier; the chain head at the first request by default.
+
+        Yields:
+            (list of Message, str, str): the messages of a page, in
+                address order, the cursor of the next page, None after
+                the last, and the block the pages are read at.
+        """
+        for entries, start, head in self._iter_pages(
+                self._get_prefix(), page_size, start, head):
+            yield list(self._decode_listed(entries)), start, head
+
+    def inbox(self, receiver):
+        """List the messages sent to receiver, with one address-prefix query
+        of its index entries. Only messages created with family version
+        1.1 or 2.0 are indexed.
+
+        Returns:
+            (list of Message): the messages, in sender_ref order.
+        """
+        return self._list_prefix(
+            make_receiver_index_prefix(receiver),
+            lambda message: message.receiver == receiver)
+
+    def outbox(self, sender):
+        """List the messages sent by sender, like inbox.
+
+        Returns:
+            (list of Message): the messages, in sender_ref order.
+        """
+        return self._list_prefix(
+            make_sender_index_prefix(sender),
+            lambda message: message.sender == sender)
+
+    def channel(self, party, other_party):
+        """List the messages exchanged between two parties, in either
+        direction, with one address-prefix query of their channel. Only
+        messages created with family version 1.1 or 2.0 are stored in the
+        channel layout.
+
+        Returns:
+            (list of Message): the messages, in sender_ref order.
+        """
+        parties = {party, other_party}
+        return self._list_prefix(
+            make_channel_prefix(party, other_party),
+            lambda message: {message.sender, message.receiver} == parties)
+
+    def _list_prefix(self, prefix, belongs):
+        return self._collect_messages(self._iter_state(prefix), belongs)
+
+    def _iter_state(self, prefix, page_size=None):
+        for entries, _, _ in self._iter_pages(prefix, page_size):
+            yield from entries
+
+    def _iter_pages(self, prefix, page_size=None, start=None, head=None):
+        while True:
+            # the later pages are read at the head of the first, so an
+            # entry moved by a block committed meanwhile is neither
+            # listed twice nor missed
+            entries, start, page_head = self._decode_page(
+                self._send_request(
+                    self._state_query(prefix, page_size, start, head)))
+            head = head or page_head
+            yield entries, start, head
+            if start is None:
+                return
+
+    def show(self, sender_ref, sender=None, receiver=None):
+        """Get the state entry holding sender_ref. Given the sender and
+        receiver, its channel layout address is tried before the legacy
+        one; a registry entry there gives the address it is stored at,
+        whatever its parties. With a cache, an entry holding sender_ref is
+        never fetched again for it, and an address not found is not asked
+        for again for a few seconds.
+        """
+        data = self._show_from(
+            sender_ref, self._get_addresses(sender_ref, sender, receiver))
+        if data.startswith(REGISTRY_ENTRY_PREFIX):
+            data = self._show_from(
+                sender_ref, [self._registered_address(sender_ref, data)])
+
+        return data
+
+    def _show_from(self, sender_ref, addresses):
+        """Get the first of addresses whose state entry holds sender_ref.
+        """
+        data, addresses = self._find_cached(sender_ref, addresses)
+        if data is not None:
+            return data
+
+        for n, address in enumerate(addresses, 1):
+            try:
+                result = self._send_request(
+                    "state/{}".format(address),
+                    sender_ref=sender_ref)
+            except CoONotFoundException:
+                if self._cache is not None:
+                    self._cache.put_missing(address)
+                if n == len(addresses):
+                    raise
+                continue
+            except CoOException:
+                if n == len(addresses):
+                    raise
+                continue
+
+            data = self._accept_entry(sender_ref, address, result)
+            if data is not None:
+                return data
+
+        raise CoONotFoundException(
+            "No such certificate: {}".format(sender_ref))
+
+    def get_statuses(self, batch_ids):
+        """Get the statuses of several batches with one query.
+
+        Returns:
+            (dict): batch id (str) keys, values the status documents of the
+                REST API: dicts with 'id', 'status' and
+                'invalid_transactions'.
+        """
+        # posted, as a long list of ids would not fit in a URL
+        return self._decode_statuses(self._send_request(
+            'batch_statuses', json.dumps(list(batch_ids)).encode(),
+            'application/json', retry=True))
 
-    def _get_address(self, sender_ref):
-        gdm_prefix = self._get_prefix()
-        message_address = _sha512(sender_ref.encode('utf-8'))[0:64]
-        return gdm_prefix + message_address
+    def get_receipts(self, transaction_ids):
+        """Get the receipts of committed transactions, RECEIPTS_PER_REQUEST
+        at a time.
+
+        Returns:
+            (dict): transaction id (str) keys, values the list of Receipt
+                of the transaction's messages.
+
+        Raises:
+            CoONotFoundException: one of the transactions has not been
+                committed.
+        """
+        transaction_ids = list(transaction_ids)
+
+        receipts = {}
+        for start in range(0, len(transaction_ids), self.RECEIPTS_PER_REQUEST):
+            chunk = transaction_ids[start:start + self.RECEIPTS_PER_REQUEST]
+            try:
+                # posted, as a long list of ids would not fit in a URL
+                result = self._send_request(
+                    'receipts', json.dumps(chunk).encode(),
+                    'application/json', retry=True)
+            except CoONotFoundException:
+                raise CoONotFoundException(
+                    'No receipts for some of: {}'.format(', '.join(chunk)))
+
+            receipts.update(self._decode_receipts(result))
+
+        return receipts
+
+    def confirm(self, messages, transaction_ids):
+        """Check from the receipts of their transactions that messages
+        were stored as sent, with a query per RECEIPTS_PER_REQUEST
+        messages rather than a state read per message.
+
+        Args:
+            messages (list of Message): messages created with
+                create_many(..., with_transaction_ids=True).
+            transaction_ids (list of str): the id of each message's
+                transaction, as it returned.
+
+        Returns:
+            (list of Receipt): the receipt of each message, or None if its
+                transaction did not store it as sent.
+        """
+        return self._match_receipts(
+            messages, transaction_ids,
+            self.get_receipts(
+                collections.OrderedDict.fromkeys(transaction_ids)))
+
+    def _post_batches(self, batches, max_batches_per_request):
+        """Post batches, max_batches_per_request per request, recording
+        them as SUBMITTED in the outbox, which then follows them to their
+        final status from the waiter's thread.
+        """
+        for start in range(0, len(batches), max_batches_per_request):
+            chunk = batches[start:start + max_batches_per_request]
+            self.submit_batches(chunk)
+
+            if self._outbox is not None:
+                batch_ids = [batch.header_signature for batch in chunk]
+                self._outbox.mark(batch_ids, SUBMITTED)
+                for batch_id in batch_ids:
+                    self.waiter.add(batch_id, timeout=self.OUTBOX_WAIT,
+                                    callback=self._outbox.mark_status)
+
+    def close(self):
+        """Stop the waiter, resolving the batches it still follows with
+        their last known status, close the pooled connections to the REST
+        API, and stop the signing processes.
+        """
+        if self._waiter is not None:
+            self._waiter.close()
+        self._session.close()
+        self._close_signing_pool()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _create_session(self, auth_user, auth_password, pool_size,
+                        keep_alive, retries):
+        session = requests.Session()
+
+        if auth_user is not None:
+            auth_string = "{}:{}".format(auth_user, auth_password)
+            b64_string = b64encode(auth_string.encode()).decode()
+            session.headers['Authorization'] = 'Basic {}'.format(b64_string)
+
+        if not keep_alive:
+            session.headers['Connection'] = 'close'
+
+        # only idempotent requests are retried once sent, so a posted
+        # batch is never submitted twice; the posted reads are retried by
+        # _send_request
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.1,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False)
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        return session
 
     def _send_request(self,
                       suffix,
                       data=None,
                       content_type=None,
                       sender_ref=None,
-                      auth_user=None,
-                      auth_password=None):
-
+                      timeout=None,
+                      retry=False):
+        """Send a GET, or a POST of data. The session retries a GET; a
+        POST is retried here if retry says it is a read, like the
+        batch_statuses and receipts queries.
+        """
         url = "{}/{}".format(self._base_url.strip('/'), suffix)
 
         headers = {}
-        if auth_user is not None:
-            auth_string = "{}:{}".format(auth_user, auth_password)
-            b64_string = b64encode(auth_string.encode()).decode()
-            auth_header = 'Basic {}'.format(b64_string)
-            headers['Authorization'] = auth_header
-
         if content_type is not None:
             headers['Content-Type'] = content_type
 
+        timeout = timeout or self._timeout
+        attempts = self._retries + 1 if data is not None and retry else 1
+
         try:
-            if data is not None:
-                result = requests.post(url, headers=headers, data=data)
-            else:
-                result = requests.get(url, headers=headers)
+            for attempt in range(attempts):
+                if attempt:
+                    time.sleep(self.RETRY_BACKOFF * 2 ** (attempt - 1))
+
+                try:
+                    if data is not None:
+                        result = self._session.post(
+                            url, headers=headers, data=data,
+                            timeout=timeout)
+                    else:
+                        result = self._session.get(
+                            url, headers=headers, timeout=timeout)
+                except requests.ConnectionError:
+                    if attempt + 1 < attempts:
+                        continue
+                    raise
+
+                if result.status_code in self.RETRY_STATUSES and \
+                        attempt + 1 < attempts:
+                    continue
+                break
 
             if result.status_code == 404:
-                raise CoOException("No such certificate: {}".format(sender_ref))
+                raise CoONotFoundException(
+                    "No such certificate: {}".format(sender_ref))
+
+            elif result.status_code in self.BACKPRESSURE_STATUSES:
+                raise self._backpressure_error(
+                    result.status_code, result.reason,
+                    result.headers.get('Retry-After'))
 
             elif not result.ok:
                 raise CoOException("Error {}: {}".format(
@@ -154,6 +1158,9 @@ class GDMClient:
             raise CoOException(
                 'Failed to connect to {}: {}'.format(url, str(err)))
 
+        except CoOException:
+            raise
+
         except BaseException as err:
             raise CoOException(err)
 
@@ -167,78 +1174,31 @@ class GDMClient:
                       sender,
                       receiver,
                       wait=None,
-                      auth_user=None,
-                      auth_password=None):
-        # Serialization is just a delimited utf-8 encoded string
-        payload = ",".join(
-            [sender_ref, subject, predicate, object_, sender, receiver]
-        ).encode()
-
-        # Construct the address
-        address = self._get_address(sender_ref)
-
-        header = TransactionHeader(
-            signer_public_key=self._signer.get_public_key().as_hex(),
-            family_name="generic-discrete-message",
-            family_version="1.0",
-            inputs=[address],
-            outputs=[address],
-            dependencies=[],
-            payload_sha512=_sha512(payload),
-            batcher_public_key=self._signer.get_public_key().as_hex(),
-            nonce=hex(random.randint(0, 2**64))
-        ).SerializeToString()
-
-        signature = self._signer.sign(header)
-
-        transaction = Transaction(
-            header=header,
-            payload=payload,
-            header_signature=signature
-        )
+                      binary=False):
+        transaction, addresses = self._create_transaction(
+            sender_ref, subject, predicate, object_, sender, receiver,
+            binary=binary)
+        if self._cache is not None:
+            self._cache.discard_missing(addresses)
 
         batch_list = self._create_batch_list([transaction])
         batch_id = batch_list.batches[0].header_signature
+        if self._outbox is not None:
+            self._outbox.record(
+                [Message(sender_ref, subject, predicate, object_, sender,
+                         receiver)],
+                batch_list.batches, [batch_id],
+                [transaction.header_signature])
 
-        if wait and wait > 0:
-            wait_time = 0
-            start_time = time.time()
-            response = self._send_request(
-                "batches", batch_list.SerializeToString(),
-                'application/octet-stream',
-                auth_user=auth_user,
-                auth_password=auth_password)
-            while wait_time < wait:
-                status = self._get_status(
-                    batch_id,
-                    wait - int(wait_time),
-                    auth_user=auth_user,
-                    auth_password=auth_password)
-                wait_time = time.time() - start_time
-
-                if status != 'PENDING':
-                    return response
-
-            return response
-
-        return self._send_request(
+        response = self._send_request(
             "batches", batch_list.SerializeToString(),
-            'application/octet-stream',
-            auth_user=auth_user,
-            auth_password=auth_password)
-
-    def _create_batch_list(self, transactions):
-        transaction_signatures = [t.header_signature for t in transactions]
-
-        header = BatchHeader(
-            signer_public_key=self._signer.get_public_key().as_hex(),
-            transaction_ids=transaction_signatures
-        ).SerializeToString()
+            'application/octet-stream')
+        if self._outbox is not None:
+            self._outbox.mark([batch_id], SUBMITTED)
+            self.waiter.add(batch_id, timeout=self.OUTBOX_WAIT,
+                            callback=self._outbox.mark_status)
 
-        signature = self._signer.sign(header)
+        if wait and wait > 0:
+            self.waiter.wait([batch_id], timeout=wait)
 
-        batch = Batch(
-            header=header,
-            transactions=transactions,
-            header_signature=signature)
-        return BatchList(batches=[batch])
+        return response
@@ -1,2 +1,31 @@
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+
+
 class CoOException(Exception):
     pass
+
+
+class CoONotFoundException(CoOException):
+    pass
+
+
+class CoOBackpressureException(CoOException):
+    """The REST API turned a request away for now, with 429 Too Many
+    Requests or 503 Service Unavailable; it can be sent again later, not
+    before retry_after seconds if that is not None.
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CoOInvalidTransaction(InvalidTransaction):
+    """A transaction the handler rejects, with a reason code from a fixed
+    set, which the rejection metric is labelled with, as the message can
+    carry values such as the sender_ref.
+    """
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
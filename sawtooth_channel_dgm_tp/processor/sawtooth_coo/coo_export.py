@@ -0,0 +1,258 @@
+"""Stream every message in the GDM namespace to JSONL or CSV.
+
+An Exporter writes the messages of each page of state as it arrives, so
+memory stays flat however large the namespace is, optionally compressed
+with gzip, bzip2 or xz. The files it writes can be read back by
+coo_import.
+
+Every few pages the output is synced to disk and a checkpoint is
+written next to it, atomically: the paging cursor of the next page, the
+block the pages are read at and the size of the output up to there. Run
+again with the same checkpoint, an interrupted export truncates what was
+written after the checkpoint and resumes from its cursor and block, so
+no message is written twice. Compressed
+output is written as one compressed stream per checkpoint, which gzip,
+bzip2 and xz read back as a single file.
+
+The state is listed in address order, every page at the block that was
+the chain head when the export started, resumed exports included: the
+export is a snapshot, which leaves out the messages created since.
+"""
+import bz2
+import collections
+import csv
+import gzip
+import io
+import json
+import logging
+import lzma
+import os
+import sys
+import time
+
+from sawtooth_coo.coo_exceptions import CoOException
+from sawtooth_coo.coo_import import FIELDS
+
+LOGGER = logging.getLogger(__name__)
+
+
+def write_csv(stream, messages, header=False):
+    """Write messages as CSV rows of FIELDS, after a header row of FIELDS
+    if header.
+    """
+    writer = csv.writer(stream, lineterminator='\n')
+    if header:
+        writer.writerow(FIELDS)
+    for message in messages:
+        writer.writerow([getattr(message, field) for field in FIELDS])
+
+
+def write_jsonl(stream, messages, header=False):
+    """Write messages as JSON objects with the FIELDS keys, one per line.
+    """
+    for message in messages:
+        stream.write(json.dumps(
+            collections.OrderedDict(
+                (field, getattr(message, field)) for field in FIELDS),
+            ensure_ascii=False))
+        stream.write('\n')
+
+
+WRITERS = collections.OrderedDict([
+    ('csv', write_csv),
+    ('jsonl', write_jsonl),
+])
+
+# compression name keys, (file extension, compress function) values
+COMPRESSORS = collections.OrderedDict([
+    ('gzip', ('.gz', gzip.compress)),
+    ('bz2', ('.bz2', bz2.compress)),
+    ('xz', ('.xz', lzma.compress)),
+])
+
+
+def compression_for(path):
+    """Returns:
+        (str): the COMPRESSORS name path's extension stands for, or None.
+    """
+    for name, (extension, _) in COMPRESSORS.items():
+        if path.lower().endswith(extension):
+            return name
+    return None
+
+
+class Exporter:
+
+    # pages written between checkpoints
+    CHECKPOINT_PAGES = 10
+
+    def __init__(self, client, path, file_format='jsonl', compression=None,
+                 checkpoint_path=None, page_size=None,
+                 checkpoint_pages=None, progress=None, progress_interval=5):
+        """Constructor.
+
+        Args:
+            client (GDMClient): reads the namespace.
+            path (str): the file to write, - for stdout.
+            file_format (str): a WRITERS key.
+            compression (str): a COMPRESSORS key; none by default.
+            checkpoint_path (str): the checkpoint to write and resume
+                from, path + '.checkpoint' by default. Exports to stdout
+                are not checkpointed.
+            page_size (int): state entries per request, the client's
+                PAGE_SIZE by default.
+            checkpoint_pages (int): pages written between checkpoints,
+                CHECKPOINT_PAGES by default.
+            progress (file): where to write a progress line every
+                progress_interval seconds; nowhere by default.
+        """
+        if file_format not in WRITERS:
+            raise CoOException(
+                'Unknown export format: {}'.format(file_format))
+        if compression is not None and compression not in COMPRESSORS:
+            raise CoOException(
+                'Unknown compression: {}'.format(compression))
+
+        self._client = client
+        self._path = path
+        self._format = file_format
+        self._compression = compression
+        self._page_size = page_size
+        self._checkpoint_pages = checkpoint_pages or self.CHECKPOINT_PAGES
+        self._progress = progress
+        self._progress_interval = progress_interval
+
+        if path == '-':
+            self._checkpoint_path = None
+        elif checkpoint_path is None:
+            self._checkpoint_path = path + '.checkpoint'
+        else:
+            self._checkpoint_path = checkpoint_path
+
+        self.exported = 0
+
+    def run(self):
+        """Export every message, resuming from the checkpoint if there is
+        one, and remove the checkpoint once done.
+
+        Returns:
+            (int): the messages exported, including those exported
+                before resuming.
+        """
+        checkpoint = self._read_checkpoint()
+
+        if self._path == '-':
+            self._export(sys.stdout.buffer, None)
+        elif checkpoint is None:
+            with open(self._path, 'wb') as output:
+                self._export(output, None)
+        else:
+            with open(self._path, 'r+b') as output:
+                output.truncate(checkpoint['offset'])
+                output.seek(checkpoint['offset'])
+                self._export(output, checkpoint)
+
+        if self._checkpoint_path is not None:
+            os.remove(self._checkpoint_path)
+
+        return self.exported
+
+    def _export(self, output, checkpoint):
+        if checkpoint is None:
+            start = None
+            head = None
+            header = True
+        else:
+            start = checkpoint['position']
+            # checkpoints written before heads were recorded have none
+            head = checkpoint.get('head')
+            self.exported = checkpoint['exported']
+            header = False
+            if start is None:
+                # finished, but for removing the checkpoint
+                return
+            LOGGER.info("Resuming after %s messages, from %s",
+                        self.exported, start)
+
+        buffer = io.StringIO()
+        pages = 0
+        last_progress = time.monotonic()
+
+        for messages, start, head in self._client.list_pages(
+                page_size=self._page_size, start=start, head=head):
+            WRITERS[self._format](buffer, messages, header=header)
+            header = False
+            self.exported += len(messages)
+            pages += 1
+
+            checkpoint = start is None or \
+                pages % self._checkpoint_pages == 0
+            # compressed output is written a stream per checkpoint, plain
+            # output as each page arrives
+            if checkpoint or self._compression is None:
+                self._flush(output, buffer.getvalue())
+                buffer = io.StringIO()
+            if checkpoint:
+                self._write_checkpoint(output, start, head)
+
+            if self._progress is not None and \
+                    time.monotonic() - last_progress >= \
+                    self._progress_interval:
+                last_progress = time.monotonic()
+                print('exported {}'.format(self.exported),
+                      file=self._progress)
+                self._progress.flush()
+
+    def _flush(self, output, text):
+        data = text.encode('utf-8')
+        if data and self._compression is not None:
+            data = COMPRESSORS[self._compression][1](data)
+        output.write(data)
+        output.flush()
+
+    def _read_checkpoint(self):
+        if self._checkpoint_path is None or \
+                not os.path.exists(self._checkpoint_path):
+            return None
+
+        try:
+            with open(self._checkpoint_path) as stream:
+                checkpoint = json.load(stream)
+        except ValueError as err:
+            raise CoOException('Invalid checkpoint {}: {}'.format(
+                self._checkpoint_path, err))
+
+        if (checkpoint.get('format'), checkpoint.get('compression')) != (
+                self._format, self._compression):
+            raise CoOException(
+                'Checkpoint {} is for a {} export, compressed with {}'.format(
+                    self._checkpoint_path, checkpoint.get('format'),
+                    checkpoint.get('compression')))
+        if not os.path.exists(self._path) or \
+                os.path.getsize(self._path) < checkpoint['offset']:
+            raise CoOException(
+                'Checkpoint {} is ahead of {}'.format(
+                    self._checkpoint_path, self._path))
+
+        return checkpoint
+
+    def _write_checkpoint(self, output, position, head):
+        if self._checkpoint_path is None:
+            return
+
+        # the output must be on disk before the checkpoint that covers it
+        os.fsync(output.fileno())
+
+        temp_path = self._checkpoint_path + '.tmp'
+        with open(temp_path, 'w') as stream:
+            json.dump({
+                'format': self._format,
+                'compression': self._compression,
+                'position': position,
+                'head': head,
+                'offset': output.tell(),
+                'exported': self.exported,
+            }, stream)
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(temp_path, self._checkpoint_path)
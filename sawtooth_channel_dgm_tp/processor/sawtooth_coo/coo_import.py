@@ -0,0 +1,492 @@
+"""Stream messages from CSV or JSONL into the GDM namespace.
+
+An Importer reads records lazily and builds and signs them a chunk at a
+time on the calling thread, while the batches of the chunks before it
+are posted by a SubmissionQueue, which keeps as many in flight as the
+validator takes and posts again, after a backoff, the ones turned away
+with 429 or 503, and are waited on by the client's BatchStatusWaiter.
+Memory stays flat however long the input is: reading pauses while too
+many chunks are unresolved.
+
+Every record's fate is appended to a result log, one tab separated line
+per event:
+
+    record  status  sender_ref  batch_id  transaction_id  detail
+
+where status is SUBMITTED, then COMMITTED, INVALID (the transaction was
+rejected, e.g. as a duplicate) or FAILED (its batch was rejected for
+another transaction, or could not be submitted). Run again with the
+same log, an import skips the records that were committed or invalid,
+checks the ones only submitted with bulk status queries, and retries
+the rest.
+"""
+import collections
+import csv
+import io
+import json
+import logging
+import threading
+import time
+
+from sawtooth_coo.coo_exceptions import CoOException
+from sawtooth_coo.coo_submitter import SubmissionQueue
+from sawtooth_coo.coo_waiter import BatchStatus
+from sawtooth_coo.processor.coo_message import Message
+
+LOGGER = logging.getLogger(__name__)
+
+
+FIELDS = ('sender_ref', 'subject', 'predicate', 'object', 'sender',
+          'receiver')
+
+SUBMITTED = 'SUBMITTED'
+COMMITTED = 'COMMITTED'
+INVALID = 'INVALID'
+FAILED = 'FAILED'
+
+
+def read_csv(stream):
+    """Read messages from CSV rows of FIELDS, in that order, skipping a
+    header row if there is one.
+
+    Yields:
+        (int, Message): the line each record ends on, and its message.
+    """
+    reader = csv.reader(stream)
+    for row in reader:
+        if reader.line_num == 1 and tuple(row) == FIELDS:
+            continue
+        if not row:
+            continue
+        if len(row) != len(FIELDS):
+            raise CoOException(
+                'Line {}: expected {} fields, got {}'.format(
+                    reader.line_num, len(FIELDS), len(row)))
+        yield reader.line_num, Message(*row)
+
+
+def read_jsonl(stream):
+    """Read messages from JSON objects with the FIELDS keys, one per
+    line.
+
+    Yields:
+        (int, Message): the line of each record, and its message.
+    """
+    for line_num, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            yield line_num, Message(*[record[field] for field in FIELDS])
+        except (ValueError, KeyError, TypeError) as err:
+            raise CoOException('Line {}: {}'.format(line_num, err))
+
+
+READERS = collections.OrderedDict([
+    ('csv', read_csv),
+    ('jsonl', read_jsonl),
+])
+
+
+def percentile(values, fraction):
+    """The value below which fraction (0 to 1) of values fall, by the
+    nearest rank, or None if there are none.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ImportStats:
+    """Counts and latencies of an import, updated from several threads."""
+
+    # latencies kept for the percentiles, the most recent ones
+    SAMPLES = 10000
+
+    def __init__(self):
+        self.read = 0
+        self.skipped = 0
+        self.submitted = 0
+        self.committed = 0
+        self.invalid = 0
+        self.failed = 0
+        self.submit_seconds = collections.deque(maxlen=self.SAMPLES)
+        self.commit_seconds = collections.deque(maxlen=self.SAMPLES)
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def add_latency(self, submit=None, commit=None):
+        with self._lock:
+            if submit is not None:
+                self.submit_seconds.append(submit)
+            if commit is not None:
+                self.commit_seconds.append(commit)
+
+    def summary(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at
+            submit = list(self.submit_seconds)
+            commit = list(self.commit_seconds)
+            counts = (self.read, self.skipped, self.submitted,
+                      self.committed, self.invalid, self.failed)
+
+        return (
+            'read {} skipped {} submitted {} committed {} invalid {} '
+            'failed {} | {:.1f} msg/s | submit p50 {} p95 {} | '
+            'commit p50 {} p95 {}'.format(
+                *counts,
+                counts[3] / elapsed if elapsed else 0,
+                _ms(percentile(submit, 0.5)), _ms(percentile(submit, 0.95)),
+                _ms(percentile(commit, 0.5)), _ms(percentile(commit, 0.95))))
+
+
+def _log_line(record, status, sender_ref, batch_id, transaction_id,
+              detail=''):
+    return '\t'.join([
+        str(record), status, sender_ref, batch_id, transaction_id,
+        ' '.join(detail.split()),
+    ]) + '\n'
+
+
+def _ms(seconds):
+    return '-' if seconds is None else '{:.0f}ms'.format(seconds * 1000)
+
+
+class _Chunk:
+
+    __slots__ = ('records', 'batch_ids', 'transaction_ids', 'remaining',
+                 'queued_at')
+
+    def __init__(self, records, batch_ids, transaction_ids):
+        self.records = records
+        self.batch_ids = batch_ids
+        self.transaction_ids = transaction_ids
+        self.remaining = len(set(batch_ids))
+        self.queued_at = None
+
+
+class Importer:
+
+    CHUNK_SIZE = 500
+    CONCURRENCY = 4
+
+    def __init__(self, client, log_path=None, binary=False,
+                 chunk_size=None, max_batch_size=None, concurrency=None,
+                 rate=None, max_pending=None, wait=None, progress=None,
+                 progress_interval=5):
+        """Constructor.
+
+        Args:
+            client (GDMClient): signs, submits and waits.
+            log_path (str): the result log, appended to and resumed from;
+                none by default.
+            binary (bool): send family version 1.1 transactions; records
+                with a field holding ",", "|" or a newline, which 1.0 can
+                not carry, are always sent as 1.1.
+            chunk_size (int): messages built and signed together,
+                CHUNK_SIZE by default.
+            max_batch_size (int): transactions per batch, the client's
+                MAX_BATCH_SIZE by default.
+            concurrency (int): batches in flight at most, CONCURRENCY by
+                default; fewer while the validator turns batches away.
+            rate (float): messages per second to submit at most; as fast
+                as possible by default.
+            max_pending (int): chunks submitted but not yet resolved
+                before reading pauses, 4 * concurrency by default.
+            wait (float): seconds to wait for each batch to resolve; its
+                records stay SUBMITTED in the log after that. Forever by
+                default.
+            progress (file): where to write a progress line every
+                progress_interval seconds; nowhere by default.
+        """
+        self._client = client
+        self._log_path = log_path
+        self._binary = binary
+        self._chunk_size = chunk_size or self.CHUNK_SIZE
+        self._max_batch_size = max_batch_size or client.MAX_BATCH_SIZE
+        self._concurrency = concurrency or self.CONCURRENCY
+        self._rate = rate
+        self._wait = wait
+        self._progress = progress
+        self._progress_interval = progress_interval
+
+        self._queue = None
+        self._pending = threading.BoundedSemaphore(
+            max_pending or 4 * self._concurrency)
+        self._unresolved = 0
+        self._resolved = threading.Condition()
+
+        self._log = None
+        self._log_lock = threading.Lock()
+        self.stats = ImportStats()
+
+    def run(self, records):
+        """Import records, blocking until every submitted batch resolves
+        or times out.
+
+        Args:
+            records (iterable of (int, Message)): record numbers, unique
+                and stable from one run to the next, and messages; e.g.
+                from read_csv.
+
+        Returns:
+            (ImportStats): the counts and latencies of the import.
+        """
+        if self._log_path is not None:
+            done = self._resume()
+            self._log = io.open(self._log_path, 'a', encoding='utf-8')
+        else:
+            done = set()
+
+        stop = threading.Event()
+        reporter = None
+        if self._progress is not None:
+            reporter = threading.Thread(
+                target=self._report, args=(stop,), name='gdm-import-progress',
+                daemon=True)
+            reporter.start()
+
+        self._queue = SubmissionQueue(
+            self._client, max_window=self._concurrency, wait=self._wait)
+        try:
+            next_at = time.monotonic()
+            chunk = []
+            for record, message in records:
+                self.stats.add(read=1)
+                if record in done:
+                    self.stats.add(skipped=1)
+                    continue
+
+                chunk.append((record, message))
+                if len(chunk) == self._chunk_size:
+                    next_at = self._submit_chunk(chunk, next_at)
+                    chunk = []
+            if chunk:
+                self._submit_chunk(chunk, next_at)
+
+            with self._resolved:
+                while self._unresolved:
+                    self._resolved.wait()
+        finally:
+            self._queue.close()
+            self._queue = None
+            stop.set()
+            if reporter is not None:
+                reporter.join()
+                self._print_progress()
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+        return self.stats
+
+    def _submit_chunk(self, records, next_at):
+        """Build and sign a chunk, and queue its batches, pacing them to
+        the rate.
+
+        Returns:
+            (float): the earliest the next chunk may be queued.
+        """
+        self._pending.acquire()
+
+        batches, batch_ids, transaction_ids = self._client.sign_batches(
+            [message for _, message in records], self._binary,
+            self._max_batch_size)
+        chunk = _Chunk(records, batch_ids, transaction_ids)
+
+        if self._rate:
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_at = max(next_at, time.monotonic()) + \
+                len(records) / self._rate
+
+        with self._resolved:
+            self._unresolved += 1
+
+        # logged first, so that a crash mid-request leaves the records to
+        # be checked rather than blindly resubmitted
+        self._write(chunk, range(len(chunk.records)), SUBMITTED)
+        chunk.queued_at = time.monotonic()
+
+        indexes = collections.OrderedDict()
+        for i, batch_id in enumerate(chunk.batch_ids):
+            indexes.setdefault(batch_id, []).append(i)
+        futures = self._queue.put_batches(batches)
+        first = 0
+        for batch in batches:
+            # the futures of a batch resolve together: follow its first
+            futures[first].add_done_callback(
+                lambda future, batch_id=batch.header_signature:
+                self._batch_resolved(chunk, indexes[batch_id], future))
+            first += len(batch.transactions)
+
+        return next_at
+
+    def _batch_resolved(self, chunk, indexes, future):
+        err = future.exception()
+        if err is not None:
+            LOGGER.warning("Failed to submit %s messages: %s",
+                           len(indexes), err)
+            self._write(chunk, indexes, FAILED, str(err))
+            self.stats.add(failed=len(indexes))
+            self._batch_done(chunk)
+            return
+
+        _, status, submitted_at = future.result()
+        self.stats.add(submitted=len(indexes))
+        self.stats.add_latency(submit=submitted_at - chunk.queued_at)
+        if status.status == 'COMMITTED':
+            self._write(chunk, indexes, COMMITTED)
+            self.stats.add(committed=len(indexes))
+            self.stats.add_latency(commit=time.monotonic() - submitted_at)
+        elif status.status == 'INVALID':
+            invalid = {
+                transaction['id']: transaction.get('message', '')
+                for transaction in status.invalid_transactions
+            }
+            for i in indexes:
+                transaction_id = chunk.transaction_ids[i]
+                if transaction_id in invalid:
+                    self._write(chunk, [i], INVALID, invalid[transaction_id])
+                    self.stats.add(invalid=1)
+                else:
+                    self._write(chunk, [i], FAILED, 'batch rejected')
+                    self.stats.add(failed=1)
+        else:
+            LOGGER.warning("Batch %s still %s after %ss", status.batch_id,
+                           status.status, self._wait)
+
+        self._batch_done(chunk)
+
+    def _batch_done(self, chunk):
+        with self._resolved:
+            chunk.remaining -= 1
+            if chunk.remaining:
+                return
+        self._chunk_resolved()
+
+    def _chunk_resolved(self):
+        self._pending.release()
+        with self._resolved:
+            self._unresolved -= 1
+            self._resolved.notify_all()
+
+    def _write(self, chunk, indexes, status, detail=''):
+        if self._log is None:
+            return
+
+        lines = []
+        for i in indexes:
+            record, message = chunk.records[i]
+            lines.append(_log_line(
+                record, status, message.sender_ref, chunk.batch_ids[i],
+                chunk.transaction_ids[i], detail))
+
+        with self._log_lock:
+            self._log.writelines(lines)
+            self._log.flush()
+
+    def _resume(self):
+        """Read the result log of earlier runs, checking the records that
+        were only submitted with bulk status queries, and logging what
+        became of them.
+
+        Returns:
+            (set of int): the records to skip: committed, invalid, or
+                still pending.
+        """
+        done = set()
+        submitted = {}
+        try:
+            with io.open(self._log_path, encoding='utf-8') as log:
+                for line in log:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) < 5:
+                        continue
+                    record, status = int(fields[0]), fields[1]
+                    if status == SUBMITTED:
+                        submitted[record] = fields[2:5]
+                    else:
+                        submitted.pop(record, None)
+                        if status in (COMMITTED, INVALID):
+                            done.add(record)
+                        else:
+                            done.discard(record)
+        except FileNotFoundError:
+            return done
+
+        if not submitted:
+            return done
+
+        # queried once in bulk, as reconcile does: only the batches still
+        # PENDING are waited on, as an UNKNOWN one was dropped, and its
+        # records are retried
+        batch_ids = list(collections.OrderedDict.fromkeys(
+            batch_id for _, batch_id, _ in submitted.values()))
+        chunk_size = self._client.waiter.CHUNK_SIZE
+        statuses = {}
+        for start in range(0, len(batch_ids), chunk_size):
+            chunk = batch_ids[start:start + chunk_size]
+            found = self._client.get_statuses(chunk)
+            for batch_id in chunk:
+                status = found.get(batch_id, {})
+                statuses[batch_id] = BatchStatus(
+                    batch_id, status.get('status', 'UNKNOWN'),
+                    status.get('invalid_transactions', []))
+
+        pending_ids = [
+            batch_id for batch_id, status in statuses.items()
+            if status.status == 'PENDING'
+        ]
+        if pending_ids:
+            statuses.update(
+                self._client.waiter.wait(pending_ids, timeout=self._wait))
+
+        lines = []
+        pending = 0
+        for record, (sender_ref, batch_id, transaction_id) in \
+                submitted.items():
+            status = statuses[batch_id]
+            invalid = {
+                transaction['id']: transaction.get('message', '')
+                for transaction in status.invalid_transactions
+            }
+            if status.status == 'COMMITTED':
+                lines.append(_log_line(
+                    record, COMMITTED, sender_ref, batch_id, transaction_id))
+            elif transaction_id in invalid:
+                lines.append(_log_line(
+                    record, INVALID, sender_ref, batch_id, transaction_id,
+                    invalid[transaction_id]))
+            elif status.status == 'PENDING':
+                # may yet commit, so it is left to a later run to check
+                pending += 1
+            else:
+                lines.append(_log_line(
+                    record, FAILED, sender_ref, batch_id, transaction_id,
+                    status.status))
+                continue
+            done.add(record)
+
+        with io.open(self._log_path, 'a', encoding='utf-8') as log:
+            log.writelines(lines)
+
+        LOGGER.info("Checked %s submitted records: %s still pending",
+                    len(submitted), pending)
+
+        return done
+
+    def _report(self, stop):
+        while not stop.wait(self._progress_interval):
+            self._print_progress()
+
+    def _print_progress(self):
+        print(self.stats.summary(), file=self._progress)
+        self._progress.flush()
@@ -0,0 +1,397 @@
+"""Generate synthetic load on the GDM family, and measure what it takes.
+
+A LoadGenerator submits batches of synthetic messages, with sender_refs
+unique to the run, in one of two ways:
+
+- open loop, at a target rate of messages per second, whatever the
+  REST API does, so that a validator falling behind shows up as growing
+  latency rather than as less load;
+- closed loop, from a number of workers that each submit their next
+  batch once the last one is resolved.
+
+Every batch is posted in a request of its own and followed through to
+COMMITTED or INVALID with the client's BatchStatusWaiter. Latencies are
+measured from when a batch was due to be sent, so that time spent
+queued behind slow requests counts: submit latency to the POST's
+answer, commit latency to the status poll that saw it COMMITTED (which
+makes commit latency as coarse as the waiter's poll interval).
+
+The results, totals, latency percentiles and counts per interval of the
+run, are returned as a dict that serialises to JSON.
+"""
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+import uuid
+
+from sawtooth_coo.coo_exceptions import CoOException
+from sawtooth_coo.coo_import import percentile
+from sawtooth_coo.processor.coo_message import Message
+
+LOGGER = logging.getLogger(__name__)
+
+
+PERCENTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+
+
+class _Batch:
+
+    __slots__ = ('size', 'due', 'answered_at', 'resolved_at', 'status',
+                 'done')
+
+    def __init__(self, size, due):
+        self.size = size
+        self.due = due
+        self.answered_at = None
+        self.resolved_at = None
+        # REJECTED if the REST API refused it, else its last BatchStatus
+        self.status = None
+        self.done = threading.Event()
+
+
+class LoadGenerator:
+
+    BATCH_SIZE = 1
+    DURATION = 10
+    MAX_IN_FLIGHT = 64
+    # seconds per entry of the results' timeline
+    INTERVAL = 1.0
+
+    def __init__(self, client, rate=None, concurrency=None, duration=None,
+                 batches=None, batch_size=None, binary=False, wait=30,
+                 max_in_flight=None, sender='AU', receiver='SG',
+                 interval=None, progress=None):
+        """Constructor.
+
+        Args:
+            client (GDMClient): signs, submits and waits; its pool_size
+                should be at least max_in_flight, or concurrency.
+            rate (float): messages per second to offer, open loop.
+            concurrency (int): batches in flight at once, closed loop;
+                the default, with 1, if there is no rate.
+            duration (float): seconds to submit for, DURATION by default,
+                or until batches have been submitted if there are.
+            batches (int): batches to submit at most.
+            batch_size (int): messages per batch, BATCH_SIZE by default.
+            binary (bool): send family version 1.1 transactions.
+            wait (float): seconds to wait for each batch to resolve,
+                after which it counts as unresolved.
+            max_in_flight (int): open loop, requests posting at once;
+                batches due while that many are in flight queue up, and
+                their submit latency grows. MAX_IN_FLIGHT by default.
+            sender (str): the sender of every message.
+            receiver (str): the receiver of every message.
+            interval (float): seconds per entry of the timeline,
+                INTERVAL by default.
+            progress (file): where to write a line of counts every
+                interval; nowhere by default.
+        """
+        if rate is not None and concurrency is not None:
+            raise CoOException('Give a rate or a concurrency, not both')
+        if rate is not None and rate <= 0:
+            raise CoOException('The rate must be positive')
+
+        self._client = client
+        self._rate = rate
+        self._concurrency = concurrency or 1
+        self._duration = duration if duration is not None else (
+            None if batches else self.DURATION)
+        self._max_batches = batches
+        self._batch_size = batch_size or self.BATCH_SIZE
+        self._binary = binary
+        self._wait = wait
+        self._max_in_flight = max_in_flight or self.MAX_IN_FLIGHT
+        self._sender = sender
+        self._receiver = receiver
+        self._interval = interval or self.INTERVAL
+        self._progress = progress
+
+        self._run_id = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._count = 0
+        self._batches = []
+        self._started_at = None
+        # when the last batch was due
+        self._finished_at = None
+
+    def run(self):
+        """Submit load until the duration passes or the batches are
+        submitted, then wait for the batches in flight to resolve.
+
+        Returns:
+            (dict): the results; see results().
+        """
+        stop = threading.Event()
+        reporter = None
+        self._started_at = time.monotonic()
+        if self._progress is not None:
+            reporter = threading.Thread(
+                target=self._report, args=(stop,),
+                name='gdm-loadgen-progress', daemon=True)
+            reporter.start()
+
+        try:
+            if self._rate is not None:
+                self._run_open()
+            else:
+                self._run_closed()
+
+            for batch in list(self._batches):
+                batch.done.wait()
+        finally:
+            stop.set()
+            if reporter is not None:
+                reporter.join()
+
+        return self.results()
+
+    def _run_open(self):
+        interval = self._batch_size / self._rate
+        with concurrent.futures.ThreadPoolExecutor(
+                self._max_in_flight,
+                thread_name_prefix='gdm-loadgen-submit') as executor:
+            due = self._started_at
+            while True:
+                built = self._build(due)
+                if built is None:
+                    return
+                batch, batches = built
+
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self._post, batch, batches)
+                due += interval
+
+    def _run_closed(self):
+        workers = [
+            threading.Thread(target=self._work, name='gdm-loadgen-worker',
+                             daemon=True)
+            for _ in range(self._concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def _work(self):
+        while True:
+            built = self._build(None)
+            if built is None:
+                return
+            batch, batches = built
+
+            batch.due = time.monotonic()
+            self._post(batch, batches)
+            batch.done.wait()
+
+    def _build(self, due):
+        """Sign the next batch, if the run is not over.
+
+        Returns:
+            (_Batch, list of Batch): the batch, and the signed batches to
+                post for it; or None.
+        """
+        with self._lock:
+            now = time.monotonic() if due is None else due
+            if self._finished_at is not None:
+                return None
+            if (self._duration is not None and
+                    now - self._started_at >= self._duration) or (
+                        self._max_batches is not None and
+                        len(self._batches) >= self._max_batches):
+                self._finished_at = now
+                return None
+
+            start = self._count
+            self._count += self._batch_size
+            batch = _Batch(self._batch_size, due)
+            self._batches.append(batch)
+
+        messages = [
+            Message('load-{}-{:09d}'.format(self._run_id, n), 'subject',
+                    'predicate', 'object', self._sender, self._receiver)
+            for n in range(start, start + self._batch_size)
+        ]
+        batches, _, _ = self._client.sign_batches(
+            messages, self._binary, self._batch_size)
+
+        return batch, batches
+
+    def _post(self, batch, batches):
+        try:
+            self._client.submit_batches(batches)
+        except CoOException as err:
+            LOGGER.debug("Batch rejected on submission: %s", err)
+            batch.answered_at = time.monotonic()
+            batch.status = 'REJECTED'
+            batch.done.set()
+            return
+
+        batch.answered_at = time.monotonic()
+        self._client.waiter.add(
+            batches[0].header_signature,
+            timeout=self._wait,
+            callback=lambda status: self._resolved(batch, status))
+
+    @staticmethod
+    def _resolved(batch, status):
+        batch.resolved_at = time.monotonic()
+        batch.status = status.status
+        batch.done.set()
+
+    def results(self):
+        """Returns:
+            (dict): the run's configuration; totals in messages and in
+                batches; throughput; the percentiles of submit and commit
+                latency in milliseconds; and a timeline of the batches
+                submitted, committed and rejected in each interval.
+                Batches are accepted once the REST API takes them, and
+                rejected if it refuses them or they turn out INVALID.
+        """
+        batches = list(self._batches)
+        started_at = self._started_at
+        finished_at = self._finished_at or time.monotonic()
+        elapsed = finished_at - started_at
+
+        totals = collections.OrderedDict(
+            (name, 0) for name in (
+                'offered', 'accepted', 'rejected', 'committed', 'invalid',
+                'unresolved'))
+        submit = []
+        commit = []
+        timeline = collections.OrderedDict()
+
+        def tally(at, name, count):
+            entry = timeline.setdefault(
+                int((at - started_at) // self._interval),
+                collections.Counter())
+            entry[name] += count
+
+        for batch in batches:
+            totals['offered'] += 1
+            if batch.answered_at is None:
+                totals['unresolved'] += 1
+                continue
+            submit.append(batch.answered_at - batch.due)
+
+            if batch.status == 'REJECTED':
+                totals['rejected'] += 1
+                tally(batch.answered_at, 'rejected', batch.size)
+                continue
+
+            totals['accepted'] += 1
+            tally(batch.answered_at, 'submitted', batch.size)
+            if batch.status == 'COMMITTED':
+                totals['committed'] += 1
+                commit.append(batch.resolved_at - batch.due)
+                tally(batch.resolved_at, 'committed', batch.size)
+            elif batch.status == 'INVALID':
+                totals['invalid'] += 1
+                totals['rejected'] += 1
+                tally(batch.resolved_at, 'rejected', batch.size)
+            else:
+                totals['unresolved'] += 1
+
+        committed = sum(
+            batch.size for batch in batches
+            if batch.status == 'COMMITTED')
+        last_commit = max(
+            [batch.resolved_at for batch in batches
+             if batch.status == 'COMMITTED'] or [started_at])
+
+        return collections.OrderedDict([
+            ('config', collections.OrderedDict([
+                ('mode', 'open' if self._rate is not None else 'closed'),
+                ('rate', self._rate),
+                ('concurrency',
+                 None if self._rate is not None else self._concurrency),
+                ('duration', self._duration),
+                ('batches', self._max_batches),
+                ('batch_size', self._batch_size),
+                ('binary', self._binary),
+                ('interval', self._interval),
+            ])),
+            ('elapsed', elapsed),
+            ('batches', totals),
+            ('messages', collections.OrderedDict(
+                (name, count * self._batch_size)
+                for name, count in totals.items())),
+            ('throughput', collections.OrderedDict([
+                ('offered_per_second',
+                 len(batches) * self._batch_size / elapsed
+                 if elapsed else 0),
+                ('committed_per_second',
+                 committed / (last_commit - started_at)
+                 if last_commit > started_at else 0),
+            ])),
+            ('latency_ms', collections.OrderedDict([
+                ('submit', _latencies(submit)),
+                ('commit', _latencies(commit)),
+            ])),
+            ('timeline', [
+                collections.OrderedDict([
+                    ('start', index * self._interval),
+                    ('submitted', counts['submitted']),
+                    ('committed', counts['committed']),
+                    ('rejected', counts['rejected']),
+                ])
+                for index, counts in sorted(timeline.items())
+            ]),
+        ])
+
+    def _report(self, stop):
+        while not stop.wait(self._interval):
+            with self._lock:
+                batches = list(self._batches)
+            statuses = collections.Counter(
+                batch.status for batch in batches)
+            rejected = statuses['REJECTED'] + statuses['INVALID']
+            print('{:.0f}s offered {} in flight {} committed {} '
+                  'rejected {}'.format(
+                      time.monotonic() - self._started_at,
+                      len(batches),
+                      len(batches) - statuses['COMMITTED'] - rejected,
+                      statuses['COMMITTED'],
+                      rejected),
+                  file=self._progress)
+            self._progress.flush()
+
+
+def summary(results):
+    """Returns:
+        (str): a few lines describing results, for people.
+    """
+    lines = []
+    messages = results['messages']
+    lines.append(
+        'messages offered {offered} accepted {accepted} rejected '
+        '{rejected} (invalid {invalid}) committed {committed} '
+        'unresolved {unresolved}'.format(**messages))
+    lines.append(
+        'throughput offered {:.1f} msg/s committed {:.1f} msg/s '
+        'over {:.1f}s'.format(
+            results['throughput']['offered_per_second'],
+            results['throughput']['committed_per_second'],
+            results['elapsed']))
+    for name, latencies in results['latency_ms'].items():
+        lines.append('{} latency {}'.format(name, ' '.join(
+            '{} {}'.format(key, '-' if value is None else
+                           '{:.0f}ms'.format(value))
+            for key, value in latencies.items() if key != 'count')))
+    return '\n'.join(lines)
+
+
+def _latencies(seconds):
+    latencies = collections.OrderedDict(
+        (name, _ms(percentile(seconds, fraction)))
+        for name, fraction in PERCENTILES)
+    latencies['max'] = _ms(max(seconds) if seconds else None)
+    latencies['count'] = len(seconds)
+    return latencies
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
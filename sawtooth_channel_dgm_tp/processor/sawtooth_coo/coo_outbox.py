@@ -0,0 +1,191 @@
+"""Durable journal of what a GDMClient has signed and submitted.
+
+An Outbox is a SQLite file that a client records every batch in before
+it is posted: the signed batch itself, and the sender_ref and
+transaction id of each of its messages. The batch's status follows as
+it progresses:
+
+    SIGNED -> SUBMITTED -> COMMITTED or INVALID
+
+SIGNED is synced to disk before the batch is posted, so that a crash at
+any point leaves the batch either unknown to the validator and in the
+journal, or known to both. Statuses are recorded as the client's
+BatchStatusWaiter sees them, on its own thread, so submitting more does
+not wait on confirming what came before.
+
+After a restart, GDMClient.reconcile queries the statuses of the
+unresolved batches, those still SIGNED or SUBMITTED, in bulk, and posts
+again the ones the validator does not know, from the journal: the same
+signed batches, so a message that did land is never sent as a second,
+duplicate transaction. Finding out what became of a message is a
+lookup by sender_ref in the journal, not a state read.
+"""
+import collections
+import json
+import sqlite3
+import threading
+import time
+
+
+SIGNED = 'SIGNED'
+SUBMITTED = 'SUBMITTED'
+COMMITTED = 'COMMITTED'
+INVALID = 'INVALID'
+
+UNRESOLVED = (SIGNED, SUBMITTED)
+
+
+Journaled = collections.namedtuple(
+    'Journaled', ['sender_ref', 'transaction_id', 'batch_id', 'status',
+                  'detail'])
+
+
+class Outbox:
+    """Journal of batches in a SQLite file, shared by the threads using
+    a client.
+    """
+
+    def __init__(self, path):
+        """Constructor.
+
+        Args:
+            path (str): the SQLite file, created if need be.
+        """
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        # a batch must be on disk before it is posted
+        self._db.execute('PRAGMA synchronous=FULL')
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS batches ('
+                'batch_id TEXT PRIMARY KEY, '
+                'data BLOB NOT NULL, '
+                'status TEXT NOT NULL, '
+                'detail TEXT NOT NULL DEFAULT \'\', '
+                'updated_at REAL NOT NULL)')
+            self._db.execute(
+                'CREATE INDEX IF NOT EXISTS batches_status '
+                'ON batches (status, batch_id)')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS transactions ('
+                'transaction_id TEXT PRIMARY KEY, '
+                'sender_ref TEXT NOT NULL, '
+                'batch_id TEXT NOT NULL)')
+            self._db.execute(
+                'CREATE INDEX IF NOT EXISTS transactions_sender_ref '
+                'ON transactions (sender_ref)')
+
+    def record(self, messages, batches, batch_ids, transaction_ids):
+        """Journal signed batches as SIGNED, in one transaction.
+
+        Args:
+            messages (list of Message): the messages in the batches.
+            batches (list of Batch): the batches.
+            batch_ids (list of str): the id of the batch holding each
+                message.
+            transaction_ids (list of str): the id of each message's
+                transaction.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR IGNORE INTO batches '
+                '(batch_id, data, status, updated_at) VALUES (?, ?, ?, ?)',
+                [(batch.header_signature, batch.SerializeToString(), SIGNED,
+                  now) for batch in batches])
+            self._db.executemany(
+                'INSERT OR IGNORE INTO transactions VALUES (?, ?, ?)',
+                [(transaction_id, message.sender_ref, batch_id)
+                 for message, batch_id, transaction_id in zip(
+                     messages, batch_ids, transaction_ids)])
+
+    def mark(self, batch_ids, status, detail=''):
+        """Record the status of batches. A batch COMMITTED or INVALID
+        keeps that status.
+        """
+        now = time.time()
+        with self._lock:
+            if self._db is None:
+                # closed while the waiter followed the batch; reconcile
+                # finds it unresolved
+                return
+            with self._db:
+                self._db.executemany(
+                    'UPDATE batches SET status = ?, detail = ?, '
+                    'updated_at = ? WHERE batch_id = ? AND status IN (?, ?)',
+                    [(status, detail, now, batch_id) + UNRESOLVED
+                     for batch_id in batch_ids])
+
+    def mark_status(self, batch_status):
+        """Record a BatchStatus, if it is final; the batch stays as it was
+        otherwise.
+        """
+        if batch_status.status == COMMITTED:
+            self.mark([batch_status.batch_id], COMMITTED)
+        elif batch_status.status == INVALID:
+            self.mark([batch_status.batch_id], INVALID,
+                      json.dumps(batch_status.invalid_transactions))
+
+    def unresolved(self, page_size=1000):
+        """Iterate over the batches neither COMMITTED nor INVALID, a page
+        at a time.
+
+        Yields:
+            (str, str, bytes): the id, status and serialized Batch of
+                each.
+        """
+        start = ''
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    'SELECT batch_id, status, data FROM batches '
+                    'WHERE status IN (?, ?) AND batch_id > ? '
+                    'ORDER BY batch_id LIMIT ?',
+                    UNRESOLVED + (start, page_size)).fetchall()
+            for batch_id, status, data in rows:
+                yield batch_id, status, bytes(data)
+            if len(rows) < page_size:
+                return
+            start = rows[-1][0]
+
+    def lookup(self, sender_ref):
+        """Returns:
+            (list of Journaled): what became of each transaction sent for
+                sender_ref, in the order they were journaled.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT t.sender_ref, t.transaction_id, t.batch_id, '
+                'b.status, b.detail FROM transactions t '
+                'JOIN batches b ON b.batch_id = t.batch_id '
+                'WHERE t.sender_ref = ? ORDER BY t.rowid',
+                (sender_ref,)).fetchall()
+        return [Journaled(*row) for row in rows]
+
+    def counts(self):
+        """Returns:
+            (dict): status keys, values the number of transactions in
+                batches with that status.
+        """
+        counts = collections.OrderedDict(
+            (status, 0) for status in UNRESOLVED + (COMMITTED, INVALID))
+        with self._lock:
+            for status, count in self._db.execute(
+                    'SELECT b.status, COUNT(*) FROM transactions t '
+                    'JOIN batches b ON b.batch_id = t.batch_id '
+                    'GROUP BY b.status'):
+                counts[status] = count
+        return counts
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,106 @@
+"""Sign transaction and batch headers across cores.
+
+secp256k1 signing dominates the cost of building transactions in bulk.
+A SigningPool signs in worker processes, each of which loads the private
+key once when it starts, and hands the signatures back in the order the
+headers were given. Headers are read, sent and signed a chunk at a time,
+with a few chunks per worker in flight, so signatures come back while
+later headers are still being built.
+
+The workers are spawned, so a script that starts a pool must do so under
+an `if __name__ == '__main__':` guard.
+"""
+import collections
+import concurrent.futures
+import multiprocessing
+import os
+
+from sawtooth_signing import create_context
+from sawtooth_signing import CryptoFactory
+from sawtooth_signing.secp256k1 import Secp256k1PrivateKey
+
+
+# the signer of a worker process, set by _init_worker
+_SIGNER = None
+
+
+def _init_worker(private_key_hex):
+    global _SIGNER  # pylint: disable=global-statement
+    _SIGNER = CryptoFactory(create_context('secp256k1')).new_signer(
+        Secp256k1PrivateKey.from_hex(private_key_hex))
+
+
+def _sign_chunk(headers):
+    return [_SIGNER.sign(header) for header in headers]
+
+
+class SigningPool:
+
+    # headers sent to a worker at a time; amortises the round trip
+    CHUNK_SIZE = 64
+    # chunks in flight per worker, enough to keep each one busy
+    CHUNKS_PER_WORKER = 2
+
+    def __init__(self, private_key_hex, workers=None, chunk_size=None):
+        """Constructor.
+
+        Args:
+            private_key_hex (str): the key to sign with.
+            workers (int): worker processes, one per core by default.
+            chunk_size (int): headers per task, CHUNK_SIZE by default.
+        """
+        self._chunk_size = chunk_size or self.CHUNK_SIZE
+        self._max_pending = self.CHUNKS_PER_WORKER * (
+            workers or os.cpu_count() or 1)
+        # spawned, as forking would copy the caller's threads and locks
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(private_key_hex,))
+
+    def sign_iter(self, headers):
+        """Sign headers as they are read, a chunk at a time, with at most
+        CHUNKS_PER_WORKER chunks per worker in flight. headers is read no
+        further ahead than that, so it can depend on the signatures
+        already yielded.
+
+        Args:
+            headers (iterable of bytes): serialized headers.
+
+        Yields:
+            (str): the signature of each header, in order, as soon as the
+                chunk holding it is signed.
+        """
+        pending = collections.deque()
+        chunk = []
+        for header in headers:
+            chunk.append(header)
+            if len(chunk) < self._chunk_size:
+                continue
+
+            pending.append(self._executor.submit(_sign_chunk, chunk))
+            chunk = []
+            while pending and (len(pending) >= self._max_pending
+                               or pending[0].done()):
+                yield from pending.popleft().result()
+
+        if chunk:
+            pending.append(self._executor.submit(_sign_chunk, chunk))
+        while pending:
+            yield from pending.popleft().result()
+
+    def sign(self, headers):
+        """Returns:
+            (list of str): the signature of each header, in order.
+        """
+        return list(self.sign_iter(headers))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,442 @@
+"""Submit messages as fast as the validator takes them, and no faster.
+
+A SubmissionQueue takes messages from any number of threads and submits
+them from one dispatching thread, a batch per request, with a window of
+batches in flight. Both the size of the batches and the window adapt to
+what the validator takes, additive increase and multiplicative
+decrease, like TCP's congestion window:
+
+- every round of a window's worth of batches committed within
+  target_latency grows the window by one batch, and the batches by
+  BATCH_STEP messages;
+- a batch turned away with 429 or 503, or committed later than
+  target_latency, halves both, at most once per target_latency.
+
+A batch turned away is put back at the head of the queue, and nothing
+is submitted until a backoff passes: the Retry-After the REST API asked
+for, else exponential in the refusals in a row, with full jitter so that
+clients backing off together do not come back together.
+
+    with SubmissionQueue(client) as queue:
+        futures = queue.put_many(messages)
+    for future in futures:
+        submitted = future.result()
+
+Batches signed beforehand, e.g. to journal them before they are posted
+as the importer does, are queued with put_batches and submitted as they
+are: only the window adapts for them.
+"""
+import collections
+import concurrent.futures
+import itertools
+import logging
+import random
+import threading
+import time
+
+from sawtooth_coo.coo_exceptions import CoOBackpressureException
+from sawtooth_coo.coo_exceptions import CoOException
+
+LOGGER = logging.getLogger(__name__)
+
+
+Submitted = collections.namedtuple(
+    'Submitted', ['transaction_id', 'batch_status', 'submitted_at'])
+
+
+class _Batch:
+
+    __slots__ = ('batch', 'futures', 'transaction_ids', 'posted_at')
+
+    def __init__(self, batch, futures, transaction_ids):
+        self.batch = batch
+        self.futures = futures
+        self.transaction_ids = transaction_ids
+        self.posted_at = None
+
+
+class SubmissionQueue:
+
+    # messages per batch: to start with, the least, the most, and the
+    # increase per round
+    BATCH_SIZE = 10
+    MIN_BATCH_SIZE = 1
+    MAX_BATCH_SIZE = 100
+    BATCH_STEP = 5
+
+    # batches in flight: to start with, the least and the most
+    WINDOW = 4
+    MIN_WINDOW = 1
+    MAX_WINDOW = 64
+
+    # seconds from submission to commit above which the validator is
+    # taken to be overloaded
+    TARGET_LATENCY = 5.0
+
+    # seconds of the first backoff, and the longest one
+    BACKOFF = 0.25
+    MAX_BACKOFF = 30.0
+
+    # seconds of commits the rate is measured over
+    RATE_PERIOD = 10.0
+
+    def __init__(self, client, binary=False, batch_size=None,
+                 min_batch_size=None, max_batch_size=None, window=None,
+                 min_window=None, max_window=None, target_latency=None,
+                 wait=None, max_queue=None):
+        """Constructor.
+
+        Args:
+            client (GDMClient): signs, submits and waits; its pool_size
+                should be at least max_window.
+            binary (bool): send family version 1.1 transactions.
+            batch_size (int): messages per batch to start with,
+                BATCH_SIZE by default; it adapts between min_batch_size
+                and max_batch_size, MIN_BATCH_SIZE and MAX_BATCH_SIZE by
+                default.
+            window (int): batches in flight to start with, WINDOW by
+                default; it adapts between min_window and max_window,
+                MIN_WINDOW and MAX_WINDOW by default.
+            target_latency (float): TARGET_LATENCY by default.
+            wait (float): seconds to wait for each batch to resolve,
+                after which its futures resolve with its last status;
+                forever by default.
+            max_queue (int): messages queued at most; put blocks while
+                the queue is full. No limit by default.
+        """
+        self._client = client
+        self._binary = binary
+        self._min_batch_size = min_batch_size or self.MIN_BATCH_SIZE
+        self._max_batch_size = max_batch_size or self.MAX_BATCH_SIZE
+        self._batch_size = min(self._max_batch_size, max(
+            self._min_batch_size, batch_size or self.BATCH_SIZE))
+        self._min_window = min_window or self.MIN_WINDOW
+        self._max_window = max_window or self.MAX_WINDOW
+        self._window = min(self._max_window, max(
+            self._min_window, window or self.WINDOW))
+        self._target_latency = target_latency or self.TARGET_LATENCY
+        self._wait = wait
+        self._max_queue = max_queue
+
+        # (Message, Future) of the messages not yet in a batch
+        self._queue = collections.deque()
+        # _Batch queued already signed
+        self._signed = collections.deque()
+        # _Batch turned away, to submit again first
+        self._refused = collections.deque()
+        self._in_flight = 0
+        self._acks = 0
+        self._refusals = 0
+        self._resume_at = 0
+        self._decreased_at = None
+        # (time, messages) of recent commits
+        self._commits = collections.deque()
+        self._counts = collections.Counter()
+        self._closed = False
+
+        self._condition = threading.Condition()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            self._max_window, thread_name_prefix='gdm-submit')
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._dispatch, name='gdm-submit-dispatch', daemon=True)
+        self._thread.start()
+
+    @property
+    def queue_depth(self):
+        """The number of messages waiting to be submitted."""
+        with self._condition:
+            return len(self._queue) + sum(
+                len(batch.futures)
+                for batch in itertools.chain(self._refused, self._signed))
+
+    @property
+    def in_flight(self):
+        """The number of batches submitted and not yet resolved."""
+        with self._condition:
+            return self._in_flight
+
+    @property
+    def window(self):
+        with self._condition:
+            return self._window
+
+    @property
+    def batch_size(self):
+        with self._condition:
+            return self._batch_size
+
+    @property
+    def rate(self):
+        """Messages committed per second, over the last RATE_PERIOD
+        seconds.
+        """
+        with self._condition:
+            now = time.monotonic()
+            self._expire_commits(now)
+            period = min(self.RATE_PERIOD, now - self._started_at)
+            if period <= 0:
+                return 0.0
+            return sum(count for _, count in self._commits) / period
+
+    def stats(self):
+        """Returns:
+            (dict): the current rate, queue_depth, in_flight, window and
+                batch_size, and the messages submitted, committed,
+                invalid, unresolved (still pending after wait) and failed
+                so far, and the refusals.
+        """
+        stats = collections.OrderedDict([
+            ('rate', self.rate),
+            ('queue_depth', self.queue_depth),
+        ])
+        with self._condition:
+            stats['in_flight'] = self._in_flight
+            stats['window'] = self._window
+            stats['batch_size'] = self._batch_size
+            for name in ('submitted', 'committed', 'invalid', 'unresolved',
+                         'failed', 'refused'):
+                stats[name] = self._counts[name]
+        return stats
+
+    def put(self, message):
+        """Queue a message, blocking while the queue is full.
+
+        Returns:
+            (concurrent.futures.Future): resolves with a Submitted once
+                the message's batch is resolved, or with the CoOException
+                it could not be submitted for. Its submitted_at is the
+                time.monotonic() the batch was accepted at.
+        """
+        return self.put_many([message])[0]
+
+    def put_many(self, messages):
+        """Queue messages, like put.
+
+        Returns:
+            (list of concurrent.futures.Future): one for each message.
+        """
+        futures = []
+        with self._condition:
+            if self._closed:
+                raise CoOException('The submission queue is closed')
+            for message in messages:
+                while self._max_queue is not None and \
+                        len(self._queue) >= self._max_queue:
+                    self._condition.wait()
+                future = concurrent.futures.Future()
+                self._queue.append((message, future))
+                futures.append(future)
+                self._condition.notify_all()
+        return futures
+
+    def put_batches(self, batches):
+        """Queue signed batches, each to be posted in a request of its
+        own, ahead of the messages queued with put. They do not count
+        towards max_queue.
+
+        Args:
+            batches (list of Batch): e.g. from client.sign_batches.
+
+        Returns:
+            (list of concurrent.futures.Future): one for each transaction
+                of the batches, in order, like put's; those of a batch
+                resolve together.
+        """
+        signed = []
+        for batch in batches:
+            transaction_ids = [
+                transaction.header_signature
+                for transaction in batch.transactions
+            ]
+            signed.append(_Batch(
+                batch,
+                [concurrent.futures.Future() for _ in transaction_ids],
+                transaction_ids))
+
+        with self._condition:
+            if self._closed:
+                raise CoOException('The submission queue is closed')
+            self._signed.extend(signed)
+            self._condition.notify_all()
+
+        return [future for batch in signed for future in batch.futures]
+
+    def join(self):
+        """Block until every message queued is resolved."""
+        with self._condition:
+            while self._queue or self._refused or self._signed or \
+                    self._in_flight:
+                self._condition.wait()
+
+    def close(self):
+        """Resolve every message queued, then stop."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                while True:
+                    idle = not (self._queue or self._refused or
+                                self._signed)
+                    if idle and self._closed and not self._in_flight:
+                        return
+                    delay = self._resume_at - time.monotonic()
+                    if not idle and delay <= 0 and \
+                            self._in_flight < self._window:
+                        break
+                    self._condition.wait(
+                        delay if not idle and delay > 0 else None)
+
+                if self._refused:
+                    batches = [self._refused.popleft()]
+                    entries = None
+                elif self._signed:
+                    batches = [self._signed.popleft()]
+                    entries = None
+                else:
+                    entries = [
+                        self._queue.popleft()
+                        for _ in range(min(self._batch_size,
+                                           len(self._queue)))
+                    ]
+                    batch_size = self._batch_size
+                    self._condition.notify_all()
+                # counted now, so the window holds while signing
+                self._in_flight += 1
+
+            if entries is not None:
+                batches = self._build(entries, batch_size)
+                with self._condition:
+                    self._in_flight += len(batches) - 1
+
+            for batch in batches:
+                self._executor.submit(self._post, batch)
+
+    def _build(self, entries, batch_size):
+        try:
+            batches, batch_ids, transaction_ids = self._client.sign_batches(
+                [message for message, _ in entries], self._binary,
+                batch_size)
+        except CoOException as err:
+            for _, future in entries:
+                future.set_exception(err)
+            with self._condition:
+                self._counts['failed'] += len(entries)
+            return []
+
+        indexes = collections.OrderedDict(
+            (batch.header_signature, []) for batch in batches)
+        for i, batch_id in enumerate(batch_ids):
+            indexes[batch_id].append(i)
+
+        return [
+            _Batch(batch,
+                   [entries[i][1] for i in indexes[batch.header_signature]],
+                   [transaction_ids[i]
+                    for i in indexes[batch.header_signature]])
+            for batch in batches
+        ]
+
+    def _post(self, batch):
+        try:
+            self._client.submit_batches([batch.batch])
+        except CoOBackpressureException as err:
+            self._turned_away(batch, err)
+            return
+        except CoOException as err:
+            LOGGER.warning("Failed to submit %s messages: %s",
+                           len(batch.futures), err)
+            for future in batch.futures:
+                future.set_exception(err)
+            with self._condition:
+                self._counts['failed'] += len(batch.futures)
+                self._in_flight -= 1
+                self._condition.notify_all()
+            return
+
+        batch.posted_at = time.monotonic()
+        with self._condition:
+            self._refusals = 0
+            self._counts['submitted'] += len(batch.futures)
+
+        self._client.waiter.add(
+            batch.batch.header_signature, timeout=self._wait,
+            callback=lambda status: self._resolved(batch, status))
+
+    def _turned_away(self, batch, err):
+        with self._condition:
+            self._refusals += 1
+            self._counts['refused'] += 1
+            if err.retry_after is not None:
+                delay = err.retry_after
+            else:
+                delay = random.uniform(0, min(
+                    self.MAX_BACKOFF,
+                    self.BACKOFF * 2 ** (self._refusals - 1)))
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+            self._decrease()
+
+            self._refused.appendleft(batch)
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+        LOGGER.debug("Submission turned away (%s), backing off %.2fs",
+                     err, delay)
+
+    def _resolved(self, batch, status):
+        now = time.monotonic()
+        with self._condition:
+            if status.status == 'COMMITTED':
+                self._counts['committed'] += len(batch.futures)
+                self._commits.append((now, len(batch.futures)))
+                self._expire_commits(now)
+                if now - batch.posted_at > self._target_latency:
+                    self._decrease()
+                else:
+                    self._increase()
+            elif status.status == 'INVALID':
+                self._counts['invalid'] += len(batch.futures)
+            else:
+                self._counts['unresolved'] += len(batch.futures)
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+        for future, transaction_id in zip(
+                batch.futures, batch.transaction_ids):
+            future.set_result(
+                Submitted(transaction_id, status, batch.posted_at))
+
+    def _increase(self):
+        self._acks += 1
+        if self._acks >= self._window:
+            self._acks = 0
+            self._window = min(self._max_window, self._window + 1)
+            self._batch_size = min(
+                self._max_batch_size, self._batch_size + self.BATCH_STEP)
+
+    def _decrease(self):
+        now = time.monotonic()
+        if self._decreased_at is not None and \
+                now - self._decreased_at < self._target_latency:
+            return
+        self._decreased_at = now
+        self._acks = 0
+        self._window = max(self._min_window, self._window // 2)
+        self._batch_size = max(self._min_batch_size, self._batch_size // 2)
+        LOGGER.debug("Window down to %s batches of %s messages",
+                     self._window, self._batch_size)
+
+    def _expire_commits(self, now):
+        while self._commits and self._commits[0][0] < now - self.RATE_PERIOD:
+            self._commits.popleft()
@@ -0,0 +1,280 @@
+"""Follow messages as they are committed, from the validator's event
+stream.
+
+A GDMSubscriber subscribes to the validator's component endpoint (the
+one transaction processors connect to, tcp://validator:4004) for the
+MESSAGE_CREATED events the handler emits, filtered by receiver and/or
+sender, and to the block commits they belong to. The validator pushes
+the events of each block as it is committed, so messages arrive without
+any polling of the REST API.
+
+Every block is reported, even one with no matching messages, so that a
+caller can keep the id of the last block it has seen. Subscribing again
+with that id as a known block makes the validator replay the events of
+every block committed since:
+
+    with GDMSubscriber(url, receiver='SG',
+                       last_known_block_ids=[checkpoint]) as subscriber:
+        for block in subscriber.blocks():
+            handle(block.messages)
+            checkpoint = block.block_id
+"""
+import collections
+import logging
+import uuid
+
+import zmq
+
+from sawtooth_sdk.protobuf.client_event_pb2 import ClientEventsSubscribeRequest
+from sawtooth_sdk.protobuf.client_event_pb2 import \
+    ClientEventsSubscribeResponse
+from sawtooth_sdk.protobuf.client_event_pb2 import \
+    ClientEventsUnsubscribeRequest
+from sawtooth_sdk.protobuf.events_pb2 import EventFilter
+from sawtooth_sdk.protobuf.events_pb2 import EventList
+from sawtooth_sdk.protobuf.events_pb2 import EventSubscription
+from sawtooth_sdk.protobuf.network_pb2 import PingResponse
+from sawtooth_sdk.protobuf.validator_pb2 import Message as ValidatorMessage
+
+from sawtooth_coo.coo_exceptions import CoOException
+from sawtooth_coo.processor.coo_events import MESSAGE_CREATED
+from sawtooth_coo.processor.coo_events import RECEIVER_ATTRIBUTE
+from sawtooth_coo.processor.coo_events import SENDER_ATTRIBUTE
+from sawtooth_coo.processor.coo_events import decode_event_data
+
+LOGGER = logging.getLogger(__name__)
+
+
+BLOCK_COMMIT = 'sawtooth/block-commit'
+
+DEFAULT_URL = 'tcp://127.0.0.1:4004'
+
+
+CommittedBlock = collections.namedtuple(
+    'CommittedBlock', ['block_id', 'block_num', 'messages'])
+
+
+class GDMSubscriber:
+
+    # seconds to wait for the validator to answer a (un)subscribe request
+    RESPONSE_TIMEOUT = 10
+
+    def __init__(self, url=DEFAULT_URL, receiver=None, sender=None,
+                 last_known_block_ids=None, zmq_context=None):
+        """Constructor.
+
+        Args:
+            url (str): the validator's component endpoint.
+            receiver (str): only follow messages sent to receiver.
+            sender (str): only follow messages sent by sender.
+            last_known_block_ids (list of str): blocks already seen, most
+                recent first; the events of the blocks committed since the
+                most recent of them that is still on the chain are
+                replayed before new ones. Only new blocks by default.
+            zmq_context (zmq.Context): the process's context by default.
+        """
+        self._url = url
+        self._receiver = receiver
+        self._sender = sender
+        self._last_known_block_ids = list(last_known_block_ids or [])
+        self._zmq_context = zmq_context or zmq.Context.instance()
+
+        self._socket = None
+        # events received while waiting for a response
+        self._pending = collections.deque()
+
+        self.last_block_id = (
+            self._last_known_block_ids[0]
+            if self._last_known_block_ids else None)
+
+    def subscribe(self):
+        """Connect to the validator and subscribe.
+
+        Raises:
+            CoOException: the validator does not know any of the known
+                blocks, or did not answer.
+        """
+        if self._socket is not None:
+            return
+
+        self._socket = self._zmq_context.socket(zmq.DEALER)
+        self._socket.setsockopt(zmq.LINGER, 0)
+        self._socket.connect(self._url)
+
+        filters = []
+        if self._receiver is not None:
+            filters.append(EventFilter(
+                key=RECEIVER_ATTRIBUTE,
+                match_string=self._receiver,
+                filter_type=EventFilter.SIMPLE_ALL))
+        if self._sender is not None:
+            filters.append(EventFilter(
+                key=SENDER_ATTRIBUTE,
+                match_string=self._sender,
+                filter_type=EventFilter.SIMPLE_ALL))
+
+        request = ClientEventsSubscribeRequest(
+            subscriptions=[
+                EventSubscription(event_type=BLOCK_COMMIT),
+                EventSubscription(
+                    event_type=MESSAGE_CREATED, filters=filters),
+            ],
+            last_known_block_ids=self._last_known_block_ids)
+
+        response = ClientEventsSubscribeResponse()
+        try:
+            response.ParseFromString(self._request(
+                ValidatorMessage.CLIENT_EVENTS_SUBSCRIBE_REQUEST,
+                ValidatorMessage.CLIENT_EVENTS_SUBSCRIBE_RESPONSE,
+                request))
+        except CoOException:
+            self._close_socket()
+            raise
+
+        if response.status != ClientEventsSubscribeResponse.OK:
+            self._close_socket()
+            raise CoOException(
+                'Failed to subscribe to {}: {} {}'.format(
+                    self._url,
+                    ClientEventsSubscribeResponse.Status.Name(
+                        response.status),
+                    response.response_message))
+
+    def unsubscribe(self):
+        """Unsubscribe and disconnect; the subscriber can subscribe again,
+        from the last block it saw.
+        """
+        if self._socket is None:
+            return
+
+        try:
+            self._request(
+                ValidatorMessage.CLIENT_EVENTS_UNSUBSCRIBE_REQUEST,
+                ValidatorMessage.CLIENT_EVENTS_UNSUBSCRIBE_RESPONSE,
+                ClientEventsUnsubscribeRequest())
+        except CoOException as err:
+            LOGGER.warning("Failed to unsubscribe: %s", err)
+        finally:
+            self._close_socket()
+            if self.last_block_id is not None:
+                self._last_known_block_ids = [self.last_block_id]
+
+    def __enter__(self):
+        self.subscribe()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.unsubscribe()
+
+    def blocks(self, timeout=None):
+        """Iterate over the blocks committed, as they are committed.
+
+        Args:
+            timeout (float): stop once no block has been committed for
+                timeout seconds; never by default.
+
+        Yields:
+            (CommittedBlock): each block, with the messages it created
+                that match the subscription, in order.
+        """
+        self.subscribe()
+
+        while True:
+            if self._pending:
+                content = self._pending.popleft()
+            else:
+                content = self._receive(
+                    ValidatorMessage.CLIENT_EVENTS, timeout)
+                if content is None:
+                    return
+
+            block = _decode_block(content)
+            if block is None:
+                continue
+
+            self.last_block_id = block.block_id
+            yield block
+
+    def messages(self, timeout=None):
+        """Iterate over the messages committed, as they are committed,
+        like blocks().
+        """
+        for block in self.blocks(timeout=timeout):
+            for message in block.messages:
+                yield message
+
+    def _request(self, message_type, response_type, request):
+        correlation_id = uuid.uuid4().hex
+        self._socket.send(ValidatorMessage(
+            message_type=message_type,
+            correlation_id=correlation_id,
+            content=request.SerializeToString()).SerializeToString())
+
+        content = self._receive(
+            response_type, self.RESPONSE_TIMEOUT, correlation_id)
+        if content is None:
+            raise CoOException(
+                'No response from {} in {}s'.format(
+                    self._url, self.RESPONSE_TIMEOUT))
+
+        return content
+
+    def _receive(self, message_type, timeout, correlation_id=None):
+        """Wait for a message of message_type, answering pings and keeping
+        any events that arrive meanwhile.
+
+        Returns:
+            (bytes): its content, or None once timeout seconds pass.
+        """
+        poll_timeout = None if timeout is None else int(timeout * 1000)
+        while True:
+            if not self._socket.poll(poll_timeout):
+                return None
+
+            message = ValidatorMessage()
+            message.ParseFromString(self._socket.recv())
+
+            if message.message_type == ValidatorMessage.PING_REQUEST:
+                self._socket.send(ValidatorMessage(
+                    message_type=ValidatorMessage.PING_RESPONSE,
+                    correlation_id=message.correlation_id,
+                    content=PingResponse().SerializeToString()
+                ).SerializeToString())
+
+            elif message.message_type == message_type and (
+                    correlation_id is None
+                    or message.correlation_id == correlation_id):
+                return message.content
+
+            elif message.message_type == ValidatorMessage.CLIENT_EVENTS:
+                self._pending.append(message.content)
+
+    def _close_socket(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+def _decode_block(content):
+    """Returns:
+        (CommittedBlock): the block an EventList is for, or None if it
+            has no block commit event.
+    """
+    event_list = EventList()
+    event_list.ParseFromString(content)
+
+    block_id = None
+    block_num = None
+    messages = []
+    for event in event_list.events:
+        if event.event_type == BLOCK_COMMIT:
+            attributes = {a.key: a.value for a in event.attributes}
+            block_id = attributes.get('block_id')
+            block_num = int(attributes.get('block_num', 0))
+        elif event.event_type == MESSAGE_CREATED:
+            messages.extend(decode_event_data(event.data))
+
+    if block_id is None:
+        return None
+
+    return CommittedBlock(block_id, block_num, messages)
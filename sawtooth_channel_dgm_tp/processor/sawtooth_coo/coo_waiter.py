@@ -0,0 +1,418 @@
+"""Wait for many submitted batches with a few batch_statuses queries.
+
+A BatchStatusWaiter collects the ids of every batch that is being
+waited on and polls their statuses together, from one thread, in
+chunked multi-id queries. Each batch gets a future, resolved once the
+batch is COMMITTED or INVALID, or with its last status once its timeout
+passes. The poll interval starts short, doubles while nothing resolves
+and drops back as soon as something does.
+
+UNKNOWN is not final either, as a validator may not know a batch it
+accepted moments ago, but a batch that stays UNKNOWN for UNKNOWN_POLLS
+polls in a row has been dropped, and resolves as UNKNOWN rather than
+keeping its waiters blocked until their timeout.
+
+AsyncBatchStatusWaiter does the same for AsyncGDMClient, polling from a
+task on the event loop.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+
+from sawtooth_coo.coo_exceptions import CoOException
+
+LOGGER = logging.getLogger(__name__)
+
+
+BatchStatus = collections.namedtuple(
+    'BatchStatus', ['batch_id', 'status', 'invalid_transactions'])
+
+FINAL_STATUSES = ('COMMITTED', 'INVALID')
+
+
+class _Waiting:
+
+    __slots__ = ('future', 'deadline', 'status', 'unknown_polls')
+
+    def __init__(self, batch_id, deadline, future):
+        self.future = future
+        self.deadline = deadline
+        self.status = BatchStatus(batch_id, 'PENDING', [])
+        self.unknown_polls = 0
+
+
+class _BaseWaiter:
+
+    CHUNK_SIZE = 100
+    MIN_INTERVAL = 0.05
+    MAX_INTERVAL = 2.0
+    UNKNOWN_POLLS = 5
+
+    def __init__(self, client, chunk_size=None, min_interval=None,
+                 max_interval=None, unknown_polls=None):
+        """Constructor.
+
+        Args:
+            client (GDMClient): queries the statuses, with get_statuses.
+            chunk_size (int): batch ids per query, CHUNK_SIZE by default.
+            min_interval (float): seconds between polls while batches
+                are resolving, MIN_INTERVAL by default.
+            max_interval (float): the longest the interval grows to while
+                nothing resolves, MAX_INTERVAL by default.
+            unknown_polls (int): polls in a row a batch is UNKNOWN for
+                before it resolves as UNKNOWN, UNKNOWN_POLLS by default.
+        """
+        self._client = client
+        self._chunk_size = chunk_size or self.CHUNK_SIZE
+        self._min_interval = min_interval or self.MIN_INTERVAL
+        self._max_interval = max_interval or self.MAX_INTERVAL
+        self._unknown_polls = unknown_polls or self.UNKNOWN_POLLS
+
+        self._waiting = collections.OrderedDict()
+        self._interval = self._min_interval
+        self._closed = False
+
+    def _start_waiting(self, batch_id, timeout, new_future):
+        if self._closed:
+            raise CoOException('The batch status waiter is closed')
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        waiting = self._waiting.get(batch_id)
+        if waiting is None:
+            waiting = _Waiting(batch_id, deadline, new_future())
+            self._waiting[batch_id] = waiting
+        elif waiting.deadline is not None and (
+                deadline is None or deadline > waiting.deadline):
+            waiting.deadline = deadline
+
+        return waiting
+
+    def _chunks(self, batch_ids):
+        for start in range(0, len(batch_ids), self._chunk_size):
+            yield batch_ids[start:start + self._chunk_size]
+
+    def _update(self, chunk, statuses):
+        """Record the statuses of a chunk of batch ids.
+
+        Returns:
+            (list of str): the ids of the batches now resolved.
+        """
+        resolved = []
+        for batch_id in chunk:
+            waiting = self._waiting.get(batch_id)
+            status = statuses.get(batch_id)
+            if waiting is None or status is None:
+                continue
+            waiting.status = BatchStatus(
+                batch_id,
+                status.get('status'),
+                status.get('invalid_transactions', []))
+            if waiting.status.status in FINAL_STATUSES:
+                resolved.append(batch_id)
+            elif waiting.status.status == 'UNKNOWN':
+                waiting.unknown_polls += 1
+                if waiting.unknown_polls >= self._unknown_polls:
+                    resolved.append(batch_id)
+            else:
+                waiting.unknown_polls = 0
+
+        return resolved
+
+    def _back_off(self, resolved):
+        if resolved:
+            self._interval = self._min_interval
+        else:
+            self._interval = min(self._interval * 2, self._max_interval)
+
+    def _expired(self):
+        now = time.monotonic()
+        return [
+            batch_id for batch_id, waiting in self._waiting.items()
+            if waiting.deadline is not None and waiting.deadline <= now
+        ]
+
+    def _pop(self, batch_ids):
+        return [self._waiting.pop(batch_id) for batch_id in batch_ids
+                if batch_id in self._waiting]
+
+    def _next_wait(self):
+        deadlines = [waiting.deadline for waiting in self._waiting.values()
+                     if waiting.deadline is not None]
+        if not deadlines:
+            return self._interval
+
+        return max(0, min(self._interval,
+                          min(deadlines) - time.monotonic()))
+
+
+class BatchStatusWaiter(_BaseWaiter):
+
+    def __init__(self, client, chunk_size=None, min_interval=None,
+                 max_interval=None, unknown_polls=None):
+        super().__init__(client, chunk_size=chunk_size,
+                         min_interval=min_interval,
+                         max_interval=max_interval,
+                         unknown_polls=unknown_polls)
+
+        self._condition = threading.Condition()
+        self._thread = None
+
+    @property
+    def outstanding(self):
+        """The number of batches being waited on."""
+        with self._condition:
+            return len(self._waiting)
+
+    def add(self, batch_id, timeout=None, callback=None):
+        """Start waiting on a batch.
+
+        Args:
+            batch_id (str): the batch's header signature.
+            timeout (float): seconds after which the future resolves with
+                the batch's last known status, PENDING if none; never by
+                default.
+            callback (callable): called with the BatchStatus once the
+                future resolves, from the waiter's thread.
+
+        Returns:
+            (concurrent.futures.Future): resolves with a BatchStatus.
+
+        Raises:
+            CoOException: the waiter is closed.
+        """
+        with self._condition:
+            waiting = self._start_waiting(
+                batch_id, timeout, concurrent.futures.Future)
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='gdm-batch-waiter', daemon=True)
+                self._thread.start()
+            elif self._interval > self._min_interval:
+                # cut a backed off wait short for the new batch
+                self._interval = self._min_interval
+                self._condition.notify()
+
+        if callback is not None:
+            waiting.future.add_done_callback(
+                lambda future: callback(future.result()))
+
+        return waiting.future
+
+    def wait(self, batch_ids, timeout=None):
+        """Block until every batch is resolved, or timeout seconds pass,
+        however long the waiter already follows them for; the batches
+        still unresolved then get their last known status.
+
+        Returns:
+            (dict): batch id (str) keys, BatchStatus values.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        futures = collections.OrderedDict(
+            (batch_id, self.add(batch_id, timeout=timeout))
+            for batch_id in batch_ids)
+
+        statuses = collections.OrderedDict()
+        for batch_id, future in futures.items():
+            try:
+                statuses[batch_id] = future.result(
+                    None if deadline is None
+                    else max(0, deadline - time.monotonic()))
+            except concurrent.futures.TimeoutError:
+                with self._condition:
+                    waiting = self._waiting.get(batch_id)
+                statuses[batch_id] = _last_status(waiting, future)
+
+        return statuses
+
+    def close(self):
+        """Stop polling, and resolve the batches still waited on with
+        their last known status.
+        """
+        with self._condition:
+            self._closed = True
+            thread = self._thread
+            self._condition.notify()
+
+        # a callback may close the client from the waiter's thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+        with self._condition:
+            done = self._pop(list(self._waiting))
+        _set_results(done)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                done = self._pop(self._expired())
+                batch_ids = list(self._waiting)
+                if not batch_ids or self._closed:
+                    self._thread = None
+            _set_results(done)
+            if not batch_ids or self._closed:
+                return
+
+            resolved = self._poll(batch_ids)
+
+            with self._condition:
+                done = self._pop(resolved)
+                self._back_off(resolved)
+            _set_results(done)
+
+            with self._condition:
+                if self._waiting and not self._closed:
+                    self._condition.wait(self._next_wait())
+
+    def _poll(self, batch_ids):
+        """Query the statuses of batch_ids.
+
+        Returns:
+            (list of str): the ids of the batches now resolved.
+        """
+        resolved = []
+        for chunk in self._chunks(batch_ids):
+            try:
+                statuses = self._client.get_statuses(chunk)
+            except CoOException as err:
+                LOGGER.warning("Failed to query batch statuses: %s", err)
+                break
+
+            with self._condition:
+                resolved.extend(self._update(chunk, statuses))
+
+        return resolved
+
+
+class AsyncBatchStatusWaiter(_BaseWaiter):
+    """A BatchStatusWaiter for an AsyncGDMClient, which polls from a task
+    on the running event loop; all its calls are made from that loop.
+    """
+
+    def __init__(self, client, chunk_size=None, min_interval=None,
+                 max_interval=None, unknown_polls=None):
+        super().__init__(client, chunk_size=chunk_size,
+                         min_interval=min_interval,
+                         max_interval=max_interval,
+                         unknown_polls=unknown_polls)
+
+        self._task = None
+        # created with the task, inside the running event loop
+        self._wakeup = None
+
+    @property
+    def outstanding(self):
+        """The number of batches being waited on."""
+        return len(self._waiting)
+
+    def add(self, batch_id, timeout=None):
+        """Start waiting on a batch, like BatchStatusWaiter.add.
+
+        Returns:
+            (asyncio.Future): resolves with a BatchStatus.
+
+        Raises:
+            CoOException: the waiter is closed.
+        """
+        loop = asyncio.get_event_loop()
+        waiting = self._start_waiting(batch_id, timeout, loop.create_future)
+
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        elif self._interval > self._min_interval:
+            self._interval = self._min_interval
+            self._wakeup.set()
+
+        return waiting.future
+
+    async def wait(self, batch_ids, timeout=None):
+        """Wait until every batch is resolved, or timeout seconds pass,
+        like BatchStatusWaiter.wait.
+
+        Returns:
+            (dict): batch id (str) keys, BatchStatus values.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        futures = collections.OrderedDict(
+            (batch_id, self.add(batch_id, timeout=timeout))
+            for batch_id in batch_ids)
+
+        statuses = collections.OrderedDict()
+        for batch_id, future in futures.items():
+            try:
+                # shielded, as the future is shared with other waits
+                statuses[batch_id] = await asyncio.wait_for(
+                    asyncio.shield(future),
+                    None if deadline is None
+                    else max(0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                statuses[batch_id] = _last_status(
+                    self._waiting.get(batch_id), future)
+
+        return statuses
+
+    async def close(self):
+        """Stop polling, and resolve the batches still waited on with
+        their last known status.
+        """
+        self._closed = True
+        task = self._task
+        if task is not None and task is not asyncio.current_task():
+            self._wakeup.set()
+            await task
+
+        _set_results(self._pop(list(self._waiting)))
+
+    async def _run(self):
+        while True:
+            _set_results(self._pop(self._expired()))
+            batch_ids = list(self._waiting)
+            if not batch_ids or self._closed:
+                self._task = None
+                return
+
+            resolved = await self._poll(batch_ids)
+
+            _set_results(self._pop(resolved))
+            self._back_off(resolved)
+
+            if self._waiting and not self._closed:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), self._next_wait())
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _poll(self, batch_ids):
+        resolved = []
+        for chunk in self._chunks(batch_ids):
+            try:
+                statuses = await self._client.get_statuses(chunk)
+            except CoOException as err:
+                LOGGER.warning("Failed to query batch statuses: %s", err)
+                break
+
+            resolved.extend(self._update(chunk, statuses))
+
+        return resolved
+
+
+def _last_status(waiting, future):
+    # the status of a batch a wait gave up on: its last known one, or its
+    # result if it has just resolved
+    if waiting is not None and waiting.future is future:
+        return waiting.status
+    return future.result()
+
+
+def _set_results(done):
+    # outside the condition, as the futures' callbacks run here
+    for waiting in done:
+        if not waiting.future.done():
+            waiting.future.set_result(waiting.status)
@@ -16,6 +16,7 @@ def load_default_coo_config():
     """
     return GDMConfig(
         connect='tcp://localhost:4004',
+        workers=1,
     )
 
 
@@ -53,14 +54,29 @@ def load_toml_coo_config(filename):
 
     toml_config = toml.loads(raw_config)
     invalid_keys = set(toml_config.keys()).difference(
-        ['connect'])
+        ['connect', 'workers', 'metrics_port'])
     if invalid_keys:
         raise LocalConfigurationError(
             "Invalid keys in transaction processor config: "
             "{}".format(", ".join(sorted(list(invalid_keys)))))
 
+    workers = toml_config.get("workers", None)
+    if workers is not None and (
+            not isinstance(workers, int) or workers < 1):
+        raise LocalConfigurationError(
+            "Invalid workers in transaction processor config: "
+            "{}".format(workers))
+
+    metrics_port = toml_config.get("metrics_port", None)
+    if metrics_port is not None and not isinstance(metrics_port, int):
+        raise LocalConfigurationError(
+            "Invalid metrics_port in transaction processor config: "
+            "{}".format(metrics_port))
+
     config = GDMConfig(
-        connect=toml_config.get("connect", None)
+        connect=toml_config.get("connect", None),
+        workers=workers,
+        metrics_port=metrics_port
     )
 
     return config
@@ -81,35 +97,57 @@ def merge_coo_config(configs):
             passed in configs.
     """
     connect = None
+    workers = None
+    metrics_port = None
 
     for config in reversed(configs):
         if config.connect is not None:
             connect = config.connect
+        if config.workers is not None:
+            workers = config.workers
+        if config.metrics_port is not None:
+            metrics_port = config.metrics_port
 
     return GDMConfig(
-        connect=connect
+        connect=connect,
+        workers=workers,
+        metrics_port=metrics_port
     )
 
 
 # FIXME: xo
 class GDMConfig:
-    def __init__(self, connect=None):
+    def __init__(self, connect=None, workers=None, metrics_port=None):
         self._connect = connect
+        self._workers = workers
+        self._metrics_port = metrics_port
 
     @property
     def connect(self):
         return self._connect
 
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def metrics_port(self):
+        return self._metrics_port
+
     def __repr__(self):
         return \
-            "{}(connect={})".format(
+            "{}(connect={}, workers={}, metrics_port={})".format(
                 self.__class__.__name__,
                 repr(self._connect),
+                repr(self._workers),
+                repr(self._metrics_port),
             )
 
     def to_dict(self):
         return collections.OrderedDict([
             ('connect', self._connect),
+            ('workers', self._workers),
+            ('metrics_port', self._metrics_port),
         ])
 
     def to_toml_string(self):
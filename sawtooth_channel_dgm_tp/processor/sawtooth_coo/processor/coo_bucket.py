@@ -0,0 +1,348 @@
+"""Indexed layout for the state entry stored at one address.
+
+Several sender_refs can hash to the same address (a collision bucket).
+The indexed layout lets a single message be found, and a new message be
+spliced in, without parsing the other messages in the bucket:
+
+    INDEXED_ENTRY_PREFIX | count | offset * count | record * count
+
+count and the offsets are big-endian uint32. Records are sorted by
+sender_ref and offset i is where record i starts, relative to the first
+record. Each record is
+
+    key length (uint32) | sender_ref (utf-8) | Message (protobuf)
+
+with sender_ref left unset in the protobuf Message.
+
+Index entries (see coo_address) use the same layout under their own
+prefix, INDEX_ENTRY_PREFIX, so they can be told apart from message
+buckets by their data alone.
+
+Registry entries (see coo_address), at legacy addresses, hold no
+messages, only the channel layout address each of their sender_refs is
+stored at:
+
+    REGISTRY_ENTRY_PREFIX | count | record * count
+
+where each record is
+
+    key length (uint32) | sender_ref (utf-8)
+        | address length (uint32) | address (ascii)
+
+sorted by sender_ref.
+"""
+import hashlib
+import struct
+
+from google.protobuf.message import DecodeError
+
+from sawtooth_sdk.processor.exceptions import InternalError
+
+from sawtooth_coo.processor.coo_message import Message
+from sawtooth_coo.protobuf.generic_discrete_message_pb2 import \
+    Message as MessagePb
+
+
+INDEXED_ENTRY_PREFIX = b'\x00\x02'
+INDEX_ENTRY_PREFIX = b'\x00\x03'
+REGISTRY_ENTRY_PREFIX = b'\x00\x04'
+
+_UINT32 = struct.Struct('>I')
+
+
+def _encode_record(message):
+    key = message.sender_ref.encode('utf-8')
+    body = MessagePb(
+        subject=message.subject,
+        predicate=message.predicate,
+        object=message.object,
+        sender=message.sender,
+        recipient=message.receiver).SerializeToString()
+
+    return _UINT32.pack(len(key)) + key + body
+
+
+def record_hash(message):
+    """The sha256 of message's record, as stored in transaction receipts.
+
+    The record is the one the indexed layout stores, whatever the layout
+    the message is actually stored in, so that it can be recomputed from
+    the message alone.
+
+    Returns:
+        (bytes): the digest.
+    """
+    return hashlib.sha256(_encode_record(message)).digest()
+
+
+def encode_registry_entry(addresses):
+    """Encode a registry entry.
+
+    Args:
+        addresses (dict): sender_ref (str) keys, values the address (str)
+            each one's message is stored at.
+
+    Returns:
+        (bytes): the registry entry.
+    """
+    records = [REGISTRY_ENTRY_PREFIX, _UINT32.pack(len(addresses))]
+    for sender_ref in sorted(addresses):
+        for value in (sender_ref.encode('utf-8'),
+                      addresses[sender_ref].encode('ascii')):
+            records.append(_UINT32.pack(len(value)))
+            records.append(value)
+
+    return b''.join(records)
+
+
+def decode_registry_entry(data):
+    """Decode a registry entry written by encode_registry_entry.
+
+    Returns:
+        (dict): sender_ref (str) keys, address (str) values.
+
+    Raises:
+        InternalError: data is not a valid registry entry.
+    """
+    if not data.startswith(REGISTRY_ENTRY_PREFIX):
+        raise InternalError('Failed to deserialize registry data')
+
+    addresses = {}
+    try:
+        (count,) = _UINT32.unpack_from(data, len(REGISTRY_ENTRY_PREFIX))
+        position = len(REGISTRY_ENTRY_PREFIX) + _UINT32.size
+        for _ in range(count):
+            values = []
+            for _ in range(2):
+                (length,) = _UINT32.unpack_from(data, position)
+                position += _UINT32.size
+                if position + length > len(data):
+                    raise InternalError('Failed to deserialize registry data')
+                values.append(data[position:position + length])
+                position += length
+            addresses[values[0].decode('utf-8')] = values[1].decode('ascii')
+    except (struct.error, UnicodeDecodeError):
+        raise InternalError('Failed to deserialize registry data')
+
+    return addresses
+
+
+def _pack_entry(prefix, offsets, records):
+    return b''.join([
+        prefix,
+        _UINT32.pack(len(offsets)),
+        struct.pack('>{}I'.format(len(offsets)), *offsets),
+        records,
+    ])
+
+
+class IndexedBucket:
+    """Immutable view of a state entry in the indexed layout.
+
+    Only the header and the offset directory are decoded up front;
+    records are decoded on demand.
+    """
+
+    PREFIX = INDEXED_ENTRY_PREFIX
+
+    __slots__ = ('_data', '_offsets', '_records_start')
+
+    def __init__(self, data=None):
+        """Constructor.
+
+        Args:
+            data (bytes): An indexed state entry, or None for an empty
+                bucket.
+
+        Raises:
+            InternalError: data is not a valid indexed state entry.
+        """
+        if data is None:
+            data = _pack_entry(self.PREFIX, (), b'')
+
+        if not data.startswith(self.PREFIX):
+            raise InternalError('Failed to deserialize message data')
+
+        header_size = len(self.PREFIX) + _UINT32.size
+        try:
+            (count,) = _UINT32.unpack_from(data, len(self.PREFIX))
+            offsets = struct.unpack_from(
+                '>{}I'.format(count), data, header_size)
+        except struct.error:
+            raise InternalError('Failed to deserialize message data')
+
+        self._data = data
+        self._offsets = offsets
+        self._records_start = header_size + _UINT32.size * count
+
+    @classmethod
+    def from_messages(cls, messages):
+        """Build an indexed bucket holding the given messages.
+
+        Args:
+            messages (dict): sender_ref (str) keys, Message values.
+
+        Returns:
+            (IndexedBucket): the new bucket, of the class it is called on.
+        """
+        offsets = []
+        records = []
+        position = 0
+        # code point order is utf-8 byte order, which is what _search uses
+        for sender_ref in sorted(messages):
+            record = _encode_record(messages[sender_ref])
+            offsets.append(position)
+            records.append(record)
+            position += len(record)
+
+        return cls(_pack_entry(cls.PREFIX, offsets, b''.join(records)))
+
+    @property
+    def data(self):
+        """The bytes to store in state."""
+        return self._data
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __contains__(self, sender_ref):
+        return self._search(sender_ref.encode('utf-8'))[1]
+
+    def get(self, sender_ref, default=None):
+        """Decode the single message stored for sender_ref.
+
+        Args:
+            sender_ref (str): The sender_ref to look up.
+            default: Returned when sender_ref is not in the bucket.
+
+        Returns:
+            (Message): the stored message.
+        """
+        index, found = self._search(sender_ref.encode('utf-8'))
+        if not found:
+            return default
+
+        return self._decode(index)
+
+    def position(self, sender_ref):
+        """Returns:
+            (int): the index of sender_ref in the bucket, or None.
+        """
+        index, found = self._search(sender_ref.encode('utf-8'))
+        return index if found else None
+
+    def keys(self):
+        return [self._key(index).decode('utf-8')
+                for index in range(len(self))]
+
+    def to_dict(self):
+        """Decode every message in the bucket.
+
+        Returns:
+            (dict): sender_ref (str) keys, Message values.
+        """
+        messages = {}
+        for index in range(len(self)):
+            message = self._decode(index)
+            messages[message.sender_ref] = message
+
+        return messages
+
+    def insert(self, message):
+        """Splice a message into the bucket, replacing any message already
+        stored for its sender_ref.
+
+        Args:
+            message (Message): The message to store.
+
+        Returns:
+            (IndexedBucket): a new bucket; this one is unchanged.
+        """
+        record = _encode_record(message)
+        index, found = self._search(message.sender_ref.encode('utf-8'))
+
+        start, end = self._bounds(index) if index < len(self) else (
+            len(self._data), len(self._data))
+        if not found:
+            end = start
+        shift = len(record) - (end - start)
+
+        offsets = self._offsets
+        position = start - self._records_start
+        if found:
+            new_offsets = offsets[:index + 1] + tuple(
+                offset + shift for offset in offsets[index + 1:])
+        else:
+            new_offsets = offsets[:index] + (position,) + tuple(
+                offset + shift for offset in offsets[index:])
+
+        records = b''.join([
+            self._data[self._records_start:start],
+            record,
+            self._data[end:],
+        ])
+
+        return self.__class__(
+            _pack_entry(self.PREFIX, new_offsets, records))
+
+    def _bounds(self, index):
+        start = self._records_start + self._offsets[index]
+        if index + 1 < len(self._offsets):
+            end = self._records_start + self._offsets[index + 1]
+        else:
+            end = len(self._data)
+
+        return start, end
+
+    def _key(self, index):
+        start, _ = self._bounds(index)
+        (length,) = _UINT32.unpack_from(self._data, start)
+        key_start = start + _UINT32.size
+
+        return self._data[key_start:key_start + length]
+
+    def _search(self, key):
+        """Binary search the directory for key.
+
+        Returns:
+            (tuple): the index of key, or where it would be inserted, and
+                whether key was found.
+        """
+        low, high = 0, len(self._offsets)
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        found = low < len(self._offsets) and self._key(low) == key
+        return low, found
+
+    def _decode(self, index):
+        start, end = self._bounds(index)
+        try:
+            (length,) = _UINT32.unpack_from(self._data, start)
+            key_end = start + _UINT32.size + length
+            sender_ref = self._data[start + _UINT32.size:key_end].decode(
+                'utf-8')
+
+            pb = MessagePb()
+            pb.ParseFromString(self._data[key_end:end])
+        except (struct.error, UnicodeDecodeError, DecodeError):
+            raise InternalError('Failed to deserialize message data')
+
+        return Message(sender_ref=sender_ref,
+                       subject=pb.subject,
+                       predicate=pb.predicate,
+                       object_=pb.object,
+                       sender=pb.sender,
+                       receiver=pb.recipient)
+
+
+class IndexEntryBucket(IndexedBucket):
+    """The messages of one party copied under one index entry address."""
+
+    PREFIX = INDEX_ENTRY_PREFIX
+
+    __slots__ = ()
@@ -0,0 +1,117 @@
+"""Process-wide cache of decoded state entries.
+
+A GDMState only lives for one transaction, but hot addresses are read by
+many transactions. The cache maps the sha256 of a state entry's bytes to
+its decoded, immutable bucket, so the same bytes are only decoded once
+however many transactions read them. Keying by content rather than by
+address means a cached bucket can never be stale, whichever fork or
+context it is read from.
+"""
+import collections
+import hashlib
+import threading
+
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class DecodeCache:
+    """Size-bounded LRU of decoded state entries.
+
+    The bound is on the total size of the encoded entries, which is a
+    reasonable proxy for the memory held by their decoded form.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self._max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def evictions(self):
+        return self._evictions
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return collections.OrderedDict([
+                ('hits', self._hits),
+                ('misses', self._misses),
+                ('evictions', self._evictions),
+                ('entries', len(self._entries)),
+                ('bytes', self._size),
+            ])
+
+    def get(self, data, decode):
+        """Return the decoded form of data, decoding it on a miss.
+
+        Args:
+            data (bytes): A state entry.
+            decode (callable): Decodes data into an immutable bucket.
+
+        Returns:
+            The cached or newly decoded bucket.
+        """
+        key = hashlib.sha256(data).digest()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return cached[0]
+
+            self._misses += 1
+
+        bucket = decode(data)
+        self._put(key, bucket, len(data))
+
+        return bucket
+
+    def put(self, data, bucket):
+        """Store an already decoded bucket, e.g. one that has just been
+        encoded for a set_state call.
+        """
+        self._put(hashlib.sha256(data).digest(), bucket, len(data))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def _put(self, key, bucket, size):
+        if size > self._max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+
+            self._entries[key] = (bucket, size)
+            self._size += size
+
+            while self._size > self._max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self._evictions += 1
+
+
+DECODE_CACHE = DecodeCache()
@@ -0,0 +1,82 @@
+"""The events the handler emits as messages are created.
+
+Each transaction emits one MESSAGE_CREATED event for every (sender,
+receiver) pair it carries messages for, which is one event for a single
+message. The event's attributes are the sender, the receiver and each
+sender_ref, so that subscribers can filter on any of them, and its data
+is the messages themselves as a MessageList, so that a subscriber needs
+no state read to show them.
+"""
+import collections
+
+from sawtooth_coo.processor.coo_message import Message
+from sawtooth_coo.protobuf.generic_discrete_message_pb2 import MessageList
+
+
+MESSAGE_CREATED = 'generic-discrete-message/created'
+
+SENDER_ATTRIBUTE = 'sender'
+RECEIVER_ATTRIBUTE = 'receiver'
+SENDER_REF_ATTRIBUTE = 'sender_ref'
+
+
+def add_created_events(context, messages, timeout=None):
+    """Emit the MESSAGE_CREATED events for messages.
+
+    Args:
+        context (sawtooth_sdk.processor.context.Context): the context of
+            the transaction that created the messages.
+        messages (list of Message): the created messages.
+    """
+    channels = collections.OrderedDict()
+    for message in messages:
+        channels.setdefault(
+            (message.sender, message.receiver), []).append(message)
+
+    for (sender, receiver), channel_messages in channels.items():
+        attributes = [
+            (SENDER_ATTRIBUTE, sender),
+            (RECEIVER_ATTRIBUTE, receiver),
+        ]
+        attributes.extend(
+            (SENDER_REF_ATTRIBUTE, message.sender_ref)
+            for message in channel_messages)
+
+        context.add_event(
+            MESSAGE_CREATED,
+            attributes=attributes,
+            data=encode_event_data(channel_messages),
+            timeout=timeout)
+
+
+def encode_event_data(messages):
+    message_list = MessageList()
+    for message in messages:
+        message_list.messages.add(
+            sender_ref=message.sender_ref,
+            subject=message.subject,
+            predicate=message.predicate,
+            object=message.object,
+            sender=message.sender,
+            recipient=message.receiver)
+
+    return message_list.SerializeToString()
+
+
+def decode_event_data(data):
+    """Returns:
+        (list of Message): the messages carried by a MESSAGE_CREATED
+            event, in the order they were created.
+    """
+    message_list = MessageList()
+    message_list.ParseFromString(data)
+
+    return [
+        Message(sender_ref=m.sender_ref,
+                subject=m.subject,
+                predicate=m.predicate,
+                object_=m.object,
+                sender=m.sender,
+                receiver=m.recipient)
+        for m in message_list.messages
+    ]
@@ -0,0 +1,8 @@
+class Message:
+    def __init__(self, sender_ref, subject, predicate, object_, sender, receiver):
+        self.sender_ref = sender_ref
+        self.subject = subject
+        self.predicate = predicate
+        self.object = object_
+        self.sender = sender
+        self.receiver = receiver
@@ -1,39 +1,49 @@
 import logging
 
-from sawtooth_sdk.processor.exceptions import InvalidTransaction
+from google.protobuf.message import DecodeError
+
+from sawtooth_coo.coo_exceptions import CoOInvalidTransaction
+from sawtooth_coo.protobuf.generic_discrete_message_pb2 import MessageList
 
 LOGGER = logging.getLogger(__name__)
 
 
-class GDMPayload:
+# separate the messages of a csv state entry, and those of a version 2.0
+# payload; no field stored as csv can hold them
+CSV_SEPARATORS = ('|', '\n')
 
-    def __init__(self, payload):
-        try:
-            # The payload is csv utf-8 encoded string
-            sender_ref, subject, predicate, object_, sender, receiver = payload.decode().split(",")  # noqa
-        except ValueError:
-            raise InvalidTransaction("Invalid payload serialization")
 
+class GDMPayload:
+
+    def __init__(self, sender_ref, subject, predicate, object_, sender,
+                 receiver):
         if not sender_ref:
-            raise InvalidTransaction('sender_ref is required')
+            raise CoOInvalidTransaction(
+                'missing_field', 'sender_ref is required')
 
         if '|' in sender_ref:
-            raise InvalidTransaction('sender_ref cannot contain "|"')
+            raise CoOInvalidTransaction(
+                'invalid_sender_ref', 'sender_ref cannot contain "|"')
 
         if not subject:
-            raise InvalidTransaction('subject is required')
+            raise CoOInvalidTransaction(
+                'missing_field', 'subject is required')
 
         if not predicate:
-            raise InvalidTransaction('predicate is required')
+            raise CoOInvalidTransaction(
+                'missing_field', 'predicate is required')
 
         if not object_:
-            raise InvalidTransaction('object_ is required')
+            raise CoOInvalidTransaction(
+                'missing_field', 'object_ is required')
 
         if not sender:
-            raise InvalidTransaction('sender is required')
+            raise CoOInvalidTransaction(
+                'missing_field', 'sender is required')
 
         if not receiver:
-            raise InvalidTransaction('receiver is required')
+            raise CoOInvalidTransaction(
+                'missing_field', 'receiver is required')
 
         self._sender_ref = sender_ref
         self._subject = subject
@@ -44,7 +54,42 @@ class GDMPayload:
 
     @staticmethod
     def from_bytes(payload):
-        return GDMPayload(payload=payload)
+        try:
+            # The payload is csv utf-8 encoded string
+            sender_ref, subject, predicate, object_, sender, receiver = payload.decode().split(",")  # noqa
+        except ValueError:
+            raise CoOInvalidTransaction(
+                'invalid_payload', "Invalid payload serialization")
+
+        message = GDMPayload(sender_ref=sender_ref,
+                             subject=subject,
+                             predicate=predicate,
+                             object_=object_,
+                             sender=sender,
+                             receiver=receiver)
+
+        # stored as csv, where they would split the message
+        for name, value in (('sender_ref', sender_ref),
+                            ('subject', subject),
+                            ('predicate', predicate),
+                            ('object_', object_),
+                            ('sender', sender),
+                            ('receiver', receiver)):
+            if any(separator in value for separator in CSV_SEPARATORS):
+                raise CoOInvalidTransaction(
+                    'invalid_field',
+                    '{} cannot contain "|" or a newline'.format(name))
+
+        return message
+
+    @staticmethod
+    def from_pb(message):
+        return GDMPayload(sender_ref=message.sender_ref,
+                          subject=message.subject,
+                          predicate=message.predicate,
+                          object_=message.object,
+                          sender=message.sender,
+                          receiver=message.recipient)
 
     @property
     def sender_ref(self):
@@ -69,3 +114,74 @@ class GDMPayload:
     @property
     def receiver(self):
         return self._receiver
+
+
+class GDMBatchPayload:
+    """Payload carrying many messages (family version 2.0).
+
+    Each line of the payload is one message, serialized exactly like a
+    version 1.0 payload.
+    """
+
+    def __init__(self, messages):
+        _check_unique(messages)
+
+        self._messages = messages
+
+    @staticmethod
+    def from_bytes(payload):
+        # utf-8 never uses the newline byte inside a multi-byte sequence,
+        # so the records can be split before they are decoded
+        records = payload.split(b"\n")
+
+        return GDMBatchPayload(
+            messages=[GDMPayload.from_bytes(record) for record in records])
+
+    @property
+    def messages(self):
+        return self._messages
+
+
+class GDMProtobufPayload:
+    """Payload encoded as a protobuf MessageList (family version 1.1).
+
+    Fields are carried as protobuf strings, so unlike the csv payloads
+    they may contain commas and newlines.
+    """
+
+    def __init__(self, messages):
+        if not messages:
+            raise CoOInvalidTransaction(
+                'no_messages', 'At least one message is required')
+
+        _check_unique(messages)
+
+        self._messages = messages
+
+    @staticmethod
+    def from_bytes(payload):
+        message_list = MessageList()
+        try:
+            message_list.ParseFromString(payload)
+        except DecodeError:
+            raise CoOInvalidTransaction(
+                'invalid_payload', "Invalid payload serialization")
+
+        return GDMProtobufPayload(
+            messages=[GDMPayload.from_pb(message)
+                      for message in message_list.messages])
+
+    @property
+    def messages(self):
+        return self._messages
+
+
+def _check_unique(messages):
+    sender_refs = set()
+    for message in messages:
+        if message.sender_ref in sender_refs:
+            raise CoOInvalidTransaction(
+                'duplicate_in_payload',
+                'Duplicate sender_ref in payload: {}'.format(
+                    message.sender_ref))
+        sender_refs.add(message.sender_ref)
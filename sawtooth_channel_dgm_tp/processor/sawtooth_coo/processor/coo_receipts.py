@@ -0,0 +1,54 @@
+"""The receipt data the handler attaches to each transaction.
+
+A transaction's receipt says where each of its messages was stored: the
+address, the sha256 of the message's record (coo_bucket.record_hash)
+and the message's position in the bucket there. A submitter can confirm
+what was stored from the receipts, which the REST API serves by
+transaction id in bulk, instead of reading back every address.
+"""
+import collections
+
+from sawtooth_coo.processor.coo_bucket import record_hash
+from sawtooth_coo.protobuf.generic_discrete_message_pb2 import ReceiptList
+
+
+Receipt = collections.namedtuple(
+    'Receipt', ['sender_ref', 'address', 'record_hash', 'position'])
+
+
+def add_receipt(context, messages, stored, timeout=None):
+    """Attach the receipt for messages to the transaction, with a single
+    add_receipt_data call.
+
+    Args:
+        context (sawtooth_sdk.processor.context.Context): the context of
+            the transaction that stored the messages.
+        messages (list of Message): the stored messages.
+        stored (dict): sender_ref (str) keys, (address, position) values,
+            as returned by GDMState.set_messages.
+    """
+    receipt_list = ReceiptList()
+    for message in messages:
+        address, position = stored[message.sender_ref]
+        receipt_list.receipts.add(
+            sender_ref=message.sender_ref,
+            address=address,
+            record_hash=record_hash(message),
+            position=position)
+
+    context.add_receipt_data(
+        receipt_list.SerializeToString(), timeout=timeout)
+
+
+def decode_receipt_data(data):
+    """Returns:
+        (list of Receipt): the receipts in one transaction's receipt
+            data, in the order of its messages.
+    """
+    receipt_list = ReceiptList()
+    receipt_list.ParseFromString(data)
+
+    return [
+        Receipt(r.sender_ref, r.address, r.record_hash, r.position)
+        for r in receipt_list.receipts
+    ]
@@ -1,41 +1,107 @@
-import hashlib
+import types
 
-from sawtooth_sdk.processor.exceptions import InternalError
+from google.protobuf.message import DecodeError
 
+from sawtooth_sdk.processor.exceptions import InternalError
 
-GDM_NAMESPACE = hashlib.sha512('generic-discrete-message'.encode("utf-8")).hexdigest()[0:6]
+from sawtooth_coo.coo_address import GDM_NAMESPACE
+from sawtooth_coo.coo_address import make_channel_message_address
+from sawtooth_coo.coo_address import make_index_addresses
+from sawtooth_coo.coo_address import make_message_address
+from sawtooth_coo.coo_address import make_message_addresses
+from sawtooth_coo.coo_exceptions import CoOInvalidTransaction
+from sawtooth_coo.processor.coo_bucket import INDEX_ENTRY_PREFIX
+from sawtooth_coo.processor.coo_bucket import INDEXED_ENTRY_PREFIX
+from sawtooth_coo.processor.coo_bucket import REGISTRY_ENTRY_PREFIX
+from sawtooth_coo.processor.coo_bucket import IndexEntryBucket
+from sawtooth_coo.processor.coo_bucket import IndexedBucket
+from sawtooth_coo.processor.coo_bucket import decode_registry_entry
+from sawtooth_coo.processor.coo_bucket import encode_registry_entry
+from sawtooth_coo.processor.coo_cache import DECODE_CACHE
+from sawtooth_coo.processor.coo_message import Message
+from sawtooth_coo.processor.metrics import METRICS
+from sawtooth_coo.protobuf.generic_discrete_message_pb2 import MessageList
+
+
+# Binary state entries start with a NUL byte, which never begins a csv
+# entry (its first sender_ref), followed by the binary format version.
+# Version 1 is a plain MessageList; it is still read, but binary buckets
+# are now written in the indexed layout (coo_bucket.INDEXED_ENTRY_PREFIX).
+PROTOBUF_ENTRY_PREFIX = b'\x00\x01'
+
+# hex characters in a full state address; shorter ones are prefixes
+ADDRESS_LENGTH = 70
 
 
-#TODO: fix address construction
 def _make_coo_address(sender_ref):
-    return GDM_NAMESPACE + \
-        hashlib.sha512(sender_ref.encode('utf-8')).hexdigest()[:64]
+    return make_message_address(sender_ref)
+
+
+def decode_state_entry(data):
+    """Decode a state entry of any layout.
+
+    Args:
+        data (bytes): The data stored at a message or index address.
 
+    Returns:
+        (dict): sender_ref (str) keys, Message values.
+    """
+    return GDMState(context=None, decode_cache=None)._deserialize(data)
 
-class Message:
-    def __init__(self, sender_ref, subject, predicate, object_, sender, receiver):
-        self.sender_ref = sender_ref
-        self.subject = subject
-        self.predicate = predicate
-        self.object = object_
-        self.sender = sender
-        self.receiver = receiver
+
+def _positions(messages, buckets, message_address):
+    positions = {}
+    sorted_keys = {}
+    for message in messages:
+        address = message_address(message)
+        bucket = buckets[address]
+        if isinstance(bucket, IndexedBucket):
+            position = bucket.position(message.sender_ref)
+        else:
+            if address not in sorted_keys:
+                sorted_keys[address] = {
+                    sender_ref: index
+                    for index, sender_ref in enumerate(sorted(bucket))
+                }
+            position = sorted_keys[address][message.sender_ref]
+        positions[message.sender_ref] = (address, position)
+
+    return positions
 
 
 class GDMState:
 
     TIMEOUT = 3
 
-    def __init__(self, context):
+    def __init__(self, context, binary=False, index_parties=False,
+                 channel_layout=False, decode_cache=DECODE_CACHE,
+                 defer_writes=False):
         """Constructor.
 
         Args:
             context (sawtooth_sdk.processor.context.Context): Access to
                 validator state from within the transaction processor.
+            binary (bool): Store buckets in the indexed binary layout
+                (family version 1.1) rather than as csv text. Buckets
+                that are already binary stay binary either way.
+            index_parties (bool): Also copy every message stored to its
+                receiver and sender index entries (see coo_address).
+            channel_layout (bool): Store messages at their channel layout
+                address rather than the legacy one (see coo_address).
+            decode_cache (DecodeCache): Decoded buckets shared between
+                transactions, or None to decode on every read.
+            defer_writes (bool): Keep the entries stored until flush(),
+                which writes them all with a single set_state call.
         """
 
         self._context = context
+        self._binary = binary
+        self._index_parties = index_parties
+        self._channel_layout = channel_layout
+        self._decode_cache = decode_cache
+        self._defer_writes = defer_writes
         self._address_cache = {}
+        self._pending_entries = {}
 
     # TODO: do we need to be able to delete messages?
     # def delete_certificate(self, certificate_name):
@@ -58,6 +124,37 @@ class GDMState:
     #     else:
     #         self._delete_certificate(certificate_name)
 
+    def prefetch(self, addresses):
+        """Read the state entries at every address in the namespace that
+        is not cached yet, with a single get_state call, so that the
+        reads that follow are served from the cache. Address prefixes
+        are skipped, as only full addresses can be read.
+
+        Args:
+            addresses (list of str): e.g. the inputs of the transaction's
+                header.
+        """
+        self._fetch(sorted({
+            address for address in addresses
+            if len(address) == ADDRESS_LENGTH
+            and address.startswith(GDM_NAMESPACE)
+            and address not in self._address_cache
+        }))
+
+    def flush(self):
+        """Write the entries stored since the last flush with a single
+        set_state call, with defer_writes.
+        """
+        if not self._pending_entries:
+            return
+
+        state_entries = self._pending_entries
+        self._pending_entries = {}
+        with METRICS.set_state_seconds.time():
+            self._context.set_state(
+                state_entries,
+                timeout=self.TIMEOUT)
+
     def set_message(self, message):
         """Store the certificate in the validator state.
 
@@ -65,12 +162,72 @@ class GDMState:
             certificate_name (str): The name.
             certificate (Certificate): info specifying the current certificate.
         """
-        sender_ref = message.sender_ref
-        messages = self._load_messages(sender_ref=sender_ref)
+        self.set_messages([message])
+
+    def set_messages(self, messages):
+        """Store several messages in the validator state with a single
+        set_state call. In the channel layout, where each is stored is
+        recorded in the registry entry at its legacy address.
 
-        messages[sender_ref] = message
+        Args:
+            messages (list of Message): the messages to store.
 
-        self._store_message(sender_ref, messages=messages)
+        Returns:
+            (dict): sender_ref (str) keys, values (address, position): the
+                address each message is stored at, and its index among
+                the sender_refs there, in code point order.
+        """
+        index_entries = {}
+        if self._index_parties:
+            for message in messages:
+                for address in make_index_addresses(
+                        message.sender_ref, message.sender,
+                        message.receiver):
+                    index_entries.setdefault(address, []).append(message)
+
+        buckets = self._load_entries(
+            {self._message_address(message) for message in messages}
+            | set(index_entries))
+        registries = self._load_registries(
+            {_make_coo_address(message.sender_ref) for message in messages})
+        self._check_legacy_entries(messages)
+
+        with METRICS.serialize_seconds.time():
+            for message in messages:
+                address = self._message_address(message)
+                bucket = buckets[address]
+
+                if isinstance(bucket, IndexedBucket):
+                    buckets[address] = bucket.insert(message)
+                elif self._binary or self._is_binary(address):
+                    bucket = IndexedBucket.from_messages(bucket)
+                    buckets[address] = bucket.insert(message)
+                else:
+                    # decoded buckets are shared read-only views
+                    bucket = dict(bucket)
+                    bucket[message.sender_ref] = message
+                    buckets[address] = bucket
+
+            for address, indexed_messages in index_entries.items():
+                bucket = buckets[address]
+                if not isinstance(bucket, IndexEntryBucket):
+                    bucket = IndexEntryBucket.from_messages(bucket)
+                for message in indexed_messages:
+                    bucket = bucket.insert(message)
+                buckets[address] = bucket
+
+            state_entries = self._encode_buckets(buckets)
+
+            if self._channel_layout:
+                for message in messages:
+                    registries[_make_coo_address(message.sender_ref)][
+                        message.sender_ref] = self._message_address(message)
+                for address, registry in registries.items():
+                    state_entries[address] = encode_registry_entry(registry)
+
+        self._store_entries(state_entries)
+
+        return _positions(messages, buckets, self._message_address)
 
     def get_message(self, sender_ref):
         """Get the certificate associated with certificate_name.
@@ -84,16 +241,141 @@ class GDMState:
 
         return self._load_messages(sender_ref=sender_ref).get(sender_ref)
 
-    def _store_message(self, sender_ref, messages):
-        address = _make_coo_address(sender_ref)
+    def get_messages(self, sender_refs):
+        """Get the messages for several sender_refs, reading every address
+        that is not yet cached with a single get_state call.
+
+        Args:
+            sender_refs (list of str): the sender_refs to look up.
 
-        state_data = self._serialize(messages)
+        Returns:
+            (dict): sender_ref (str) keys, Message (or None) values.
+        """
+        buckets = self._load_buckets(sender_refs)
 
-        self._address_cache[address] = state_data
+        return {
+            sender_ref: buckets[_make_coo_address(sender_ref)].get(sender_ref)
+            for sender_ref in sender_refs
+        }
 
-        self._context.set_state(
-            {address: state_data},
-            timeout=self.TIMEOUT)
+    def find_messages(self, messages):
+        """Get the stored messages with the same sender_refs as messages,
+        under either address layout, reading every address that is not
+        yet cached with a single get_state call.
+
+        Args:
+            messages (list of Message): the messages to look up.
+
+        Returns:
+            (dict): sender_ref (str) keys, Message (or None) values.
+        """
+        if not self._channel_layout:
+            return self.get_messages(
+                [message.sender_ref for message in messages])
+
+        candidates = {
+            message.sender_ref: make_message_addresses(
+                message.sender_ref, message.sender, message.receiver)
+            for message in messages
+        }
+        buckets = self._load_entries(
+            {address for addresses in candidates.values()
+             for address in addresses})
+
+        found = {}
+        for sender_ref, addresses in candidates.items():
+            found[sender_ref] = None
+            for address in addresses:
+                message = buckets[address].get(sender_ref)
+                if message is not None:
+                    found[sender_ref] = message
+                    break
+
+        return found
+
+    def find_registered(self, sender_refs):
+        """Get the addresses the messages with the given sender_refs are
+        stored at, from the registry entries at their legacy addresses,
+        whatever their parties, reading every entry that is not yet
+        cached with a single get_state call.
+
+        Args:
+            sender_refs (list of str): the sender_refs to look up.
+
+        Returns:
+            (dict): sender_ref (str) keys, address (str, or None) values.
+        """
+        registries = self._load_registries(
+            {_make_coo_address(sender_ref) for sender_ref in sender_refs})
+
+        return {
+            sender_ref: registries[_make_coo_address(sender_ref)].get(
+                sender_ref)
+            for sender_ref in sender_refs
+        }
+
+    def _check_legacy_entries(self, messages):
+        """Reject messages whose legacy address holds an entry of the
+        other kind, which the new message can not be added to: a registry
+        entry, for a message stored at its legacy address, or a message
+        bucket, for a message recorded in a registry entry there. Only a
+        hash collision puts another sender_ref at the address.
+
+        Raises:
+            CoOInvalidTransaction: a legacy address collides.
+        """
+        for message in messages:
+            address = _make_coo_address(message.sender_ref)
+            data = self._address_cache[address]
+            if not data:
+                continue
+            if data.startswith(REGISTRY_ENTRY_PREFIX) != \
+                    self._channel_layout:
+                raise CoOInvalidTransaction(
+                    'address_collision',
+                    'Invalid action: address {} of {} is taken'.format(
+                        address, message.sender_ref))
+
+    def _message_address(self, message):
+        if self._channel_layout:
+            return make_channel_message_address(
+                message.sender_ref, message.sender, message.receiver)
+        return _make_coo_address(message.sender_ref)
+
+    def _encode_buckets(self, buckets):
+        state_entries = {}
+        for address, bucket in buckets.items():
+            if isinstance(bucket, IndexedBucket):
+                state_data = bucket.data
+            else:
+                state_data = self._serialize(bucket)
+                bucket = types.MappingProxyType(bucket)
+
+            if self._decode_cache is not None:
+                self._decode_cache.put(state_data, bucket)
+
+            METRICS.bucket_messages.observe(len(bucket))
+            METRICS.bucket_bytes.observe(len(state_data))
+
+            state_entries[address] = state_data
+
+        return state_entries
+
+    def _store_entries(self, state_entries):
+        self._address_cache.update(state_entries)
+
+        if self._defer_writes:
+            self._pending_entries.update(state_entries)
+            return
+
+        with METRICS.set_state_seconds.time():
+            self._context.set_state(
+                state_entries,
+                timeout=self.TIMEOUT)
+
+    def _is_binary(self, address):
+        stored = self._address_cache.get(address)
+        return bool(stored) and stored.startswith(PROTOBUF_ENTRY_PREFIX)
 
     def _delete_certificate(self, certificate_name):
         address = _make_coo_address(certificate_name)
@@ -107,27 +389,90 @@ class GDMState:
     def _load_messages(self, sender_ref):
         address = _make_coo_address(sender_ref)
 
-        if address in self._address_cache:
-            if self._address_cache[address]:
-                serialized_messages = self._address_cache[address]
-                messages = self._deserialize(serialized_messages)
+        return self._load_buckets([sender_ref])[address]
+
+    def _load_buckets(self, sender_refs):
+        """Load the collision buckets holding the given sender_refs.
+
+        Args:
+            sender_refs (list of str): the sender_refs to load.
+
+        Returns:
+            (dict): address (str) keys, IndexedBucket values for indexed
+                entries, otherwise read-only mappings of sender_ref (str)
+                to Message.
+        """
+        return self._load_entries({_make_coo_address(sender_ref)
+                                   for sender_ref in sender_refs})
+
+    def _load_entries(self, addresses):
+        """Load and decode the state entries at the given addresses,
+        fetching the ones not yet cached with a single get_state call.
+        """
+        self._fetch([address for address in sorted(addresses)
+                     if address not in self._address_cache])
+
+        buckets = {}
+        for address in addresses:
+            data = self._address_cache[address]
+            if not data:
+                buckets[address] = {}
+            elif self._decode_cache is not None:
+                buckets[address] = self._decode_cache.get(
+                    data, self._decode_bucket)
             else:
-                messages = {}
-        else:
+                buckets[address] = self._decode_bucket(data)
+
+        return buckets
+
+    def _load_registries(self, addresses):
+        """Load and decode the registry entries at the given legacy
+        addresses, like _load_entries; an address holding messages has
+        no registry entry.
+
+        Returns:
+            (dict): address (str) keys, values dicts of sender_ref (str)
+                to the address (str) its message is stored at.
+        """
+        self._fetch([address for address in sorted(addresses)
+                     if address not in self._address_cache])
+
+        registries = {}
+        for address in addresses:
+            data = self._address_cache[address]
+            if data and data.startswith(REGISTRY_ENTRY_PREFIX):
+                registries[address] = decode_registry_entry(data)
+            else:
+                registries[address] = {}
+
+        return registries
+
+    def _fetch(self, addresses):
+        """Read addresses into the cache with a single get_state call,
+        remembering the ones with no entry as None.
+        """
+        if not addresses:
+            return
+
+        with METRICS.get_state_seconds.time():
             state_entries = self._context.get_state(
-                [address],
+                addresses,
                 timeout=self.TIMEOUT)
-            if state_entries:
 
-                self._address_cache[address] = state_entries[0].data
+        for address in addresses:
+            self._address_cache[address] = None
+        for entry in state_entries:
+            self._address_cache[entry.address] = entry.data
 
-                messages = self._deserialize(data=state_entries[0].data)
+    def _decode_bucket(self, data):
+        with METRICS.deserialize_seconds.time():
+            if data.startswith(INDEXED_ENTRY_PREFIX):
+                return IndexedBucket(data)
 
-            else:
-                self._address_cache[address] = None
-                messages = {}
+            if data.startswith(INDEX_ENTRY_PREFIX):
+                return IndexEntryBucket(data)
 
-        return messages
+            return types.MappingProxyType(self._deserialize(data=data))
 
     def _deserialize(self, data):
         """Take bytes stored in state and deserialize them into Python
@@ -140,17 +485,30 @@ class GDMState:
             (dict): certificate name (str) keys, Certificate values.
         """
 
+        if data.startswith(INDEXED_ENTRY_PREFIX):
+            return IndexedBucket(data).to_dict()
+
+        if data.startswith(INDEX_ENTRY_PREFIX):
+            return IndexEntryBucket(data).to_dict()
+
+        if data.startswith(REGISTRY_ENTRY_PREFIX):
+            # registry entries hold no messages
+            return {}
+
+        if data.startswith(PROTOBUF_ENTRY_PREFIX):
+            return self._deserialize_protobuf(data)
+
         messages = {}
         try:
             for message in data.decode().split('|'):
                 sender_ref, subject, object_, predicate, sender, receiver = message.split(',')  # noqa
 
-                messages[sender_ref] = Message(sender_ref,
-                                               subject,
-                                               object_,
-                                               predicate,
-                                               sender,
-                                               receiver)
+                messages[sender_ref] = Message(sender_ref=sender_ref,
+                                               subject=subject,
+                                               predicate=predicate,
+                                               object_=object_,
+                                               sender=sender,
+                                               receiver=receiver)
         except ValueError:
             raise InternalError('Failed to deserialize message data')
 
@@ -180,3 +538,30 @@ class GDMState:
             message_strs.append(message_str)
 
         return '|'.join(sorted(message_strs)).encode()
+
+    def _deserialize_protobuf(self, data):
+        """Deserialize a binary state entry in the MessageList layout that
+        family version 1.1 wrote before the indexed layout replaced it.
+
+        Args:
+            data (bytes): PROTOBUF_ENTRY_PREFIX and a serialized MessageList.
+
+        Returns:
+            (dict): sender_ref (str) keys, Message values.
+        """
+
+        message_list = MessageList()
+        try:
+            message_list.ParseFromString(data[len(PROTOBUF_ENTRY_PREFIX):])
+        except DecodeError:
+            raise InternalError('Failed to deserialize message data')
+
+        return {
+            m.sender_ref: Message(sender_ref=m.sender_ref,
+                                  subject=m.subject,
+                                  predicate=m.predicate,
+                                  object_=m.object,
+                                  sender=m.sender,
+                                  receiver=m.recipient)
+            for m in message_list.messages
+        }
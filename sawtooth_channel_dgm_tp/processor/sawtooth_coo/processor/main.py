@@ -17,6 +17,8 @@ from sawtooth_coo.processor.config.gdm import \
     load_toml_coo_config
 from sawtooth_coo.processor.config.gdm import \
     merge_coo_config
+from sawtooth_coo.processor.metrics import start_metrics_server
+from sawtooth_coo.processor.supervisor import WorkerSupervisor
 
 
 DISTRIBUTION_NAME = 'sawtooth-coo'
@@ -30,6 +32,17 @@ def parse_args(args):
         '-C', '--connect',
         help='Endpoint for the validator connection')
 
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        help='Number of transaction processor processes to run')
+
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        help='Serve Prometheus metrics on this port (worker N of several '
+        'uses this port + N)')
+
     parser.add_argument('-v', '--verbose',
                         action='count',
                         default=0,
@@ -63,17 +76,17 @@ def load_coo_config(first_config):
 
 def create_coo_config(args):
     # FIXME: rename this class
-    return GDMConfig(connect=args.connect)
+    return GDMConfig(connect=args.connect,
+                     workers=args.workers,
+                     metrics_port=args.metrics_port)
 
 
-def main(args=None):
-    if args is None:
-        args = sys.argv[1:]
-    opts = parse_args(args)
+def run_processor(gdm_config, verbose, worker_index=0):
     processor = None
     try:
-        arg_config = create_coo_config(opts)
-        gdm_config = load_coo_config(arg_config)
+        if gdm_config.metrics_port is not None:
+            start_metrics_server(gdm_config.metrics_port + worker_index)
+
         processor = TransactionProcessor(url=gdm_config.connect)
         log_config = get_log_config(filename="gdm_log_config.toml")
 
@@ -88,7 +101,7 @@ def main(args=None):
                 log_dir=log_dir,
                 name="gdm-" + str(processor.zmq_id)[2:-1])  # FIXME; xo-...
 
-        init_console_logging(verbose_level=opts.verbose)
+        init_console_logging(verbose_level=verbose)
 
         handler = CoOTransactionHandler()
 
@@ -102,3 +115,31 @@ def main(args=None):
     finally:
         if processor is not None:
             processor.stop()
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    opts = parse_args(args)
+    try:
+        arg_config = create_coo_config(opts)
+        gdm_config = load_coo_config(arg_config)
+    except Exception as e:  # pylint: disable=broad-except
+        print("Error: {}".format(e))
+        return
+
+    if gdm_config.workers < 1:
+        print("Error: --workers must be at least 1")
+        return
+
+    if gdm_config.workers == 1:
+        run_processor(gdm_config, opts.verbose)
+        return
+
+    # each worker sets up its own log files, named after its zmq identity
+    init_console_logging(verbose_level=opts.verbose)
+
+    WorkerSupervisor(
+        target=run_processor,
+        args=(gdm_config, opts.verbose),
+        workers=gdm_config.workers).run()
@@ -0,0 +1,308 @@
+"""Hot path metrics for the transaction processor.
+
+Metrics are recorded into the process-wide METRICS registry and served in
+the Prometheus text format by start_metrics_server. Until the registry is
+enabled every timer is a shared no-op and every observation returns
+straight away, so instrumented code costs next to nothing when the
+endpoint is off.
+"""
+import bisect
+import collections
+import http.server
+import logging
+import threading
+import time
+
+from sawtooth_coo.processor.coo_cache import DECODE_CACHE
+
+LOGGER = logging.getLogger(__name__)
+
+
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+SIZE_BUCKETS = (
+    1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536,
+    262144, 1048576,
+)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, _escape(value)) for name, value in pairs) + '}'
+
+
+class _NullTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+
+    __slots__ = ('_histogram', '_labels', '_start')
+
+    def __init__(self, histogram, labels):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._histogram.observe(
+            time.perf_counter() - self._start, *self._labels)
+        return False
+
+
+class Counter:
+
+    def __init__(self, registry, name, documentation, labels=()):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self._label_names = tuple(labels)
+        self._values = collections.defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._values[labels] += amount
+
+    def expose(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} counter'.format(self.name),
+        ]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append('{}{} {}'.format(
+                    self.name,
+                    _format_labels(self._label_names, labels),
+                    repr(value)))
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, registry, name, documentation, buckets,
+                 labels=()):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self._buckets = tuple(buckets)
+        self._label_names = tuple(labels)
+        # labels -> [per bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        if not self._registry.enabled:
+            return
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            values = self._values.get(labels)
+            if values is None:
+                values = [0] * (len(self._buckets) + 1) + [0.0]
+                self._values[labels] = values
+            values[index] += 1
+            values[-1] += value
+
+    def time(self, *labels):
+        """Time a block of code:
+
+            with METRICS.get_state_seconds.time():
+                ...
+        """
+        if not self._registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def expose(self):
+        lines = [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} histogram'.format(self.name),
+        ]
+        with self._lock:
+            items = sorted(
+                (labels, list(values))
+                for labels, values in self._values.items())
+
+        for labels, values in items:
+            cumulative = 0
+            bounds = [repr(float(b)) for b in self._buckets] + ['+Inf']
+            for bound, count in zip(bounds, values[:-1]):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    self.name,
+                    _format_labels(
+                        self._label_names, labels, [('le', bound)]),
+                    cumulative))
+            formatted = _format_labels(self._label_names, labels)
+            lines.append('{}_sum{} {}'.format(
+                self.name, formatted, repr(values[-1])))
+            lines.append('{}_count{} {}'.format(
+                self.name, formatted, cumulative))
+        return lines
+
+
+class CallbackMetric:
+    """A value read from a callback when the metrics are scraped."""
+
+    def __init__(self, name, documentation, callback, metric_type):
+        self.name = name
+        self.documentation = documentation
+        self._callback = callback
+        self._metric_type = metric_type
+
+    def expose(self):
+        return [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} {}'.format(self.name, self._metric_type),
+            '{} {}'.format(self.name, repr(float(self._callback()))),
+        ]
+
+
+class GDMMetrics:
+    """The metrics recorded by the handler and GDMState."""
+
+    def __init__(self):
+        self.enabled = False
+
+        self.apply_total = Counter(
+            self, 'gdm_apply_total',
+            'Transactions applied, by family version.',
+            labels=('family_version',))
+        self.rejected_total = Counter(
+            self, 'gdm_rejected_total',
+            'Transactions rejected as invalid, by reason.',
+            labels=('reason',))
+        self.messages_total = Counter(
+            self, 'gdm_messages_total',
+            'Messages created.')
+        self.apply_seconds = Histogram(
+            self, 'gdm_apply_seconds',
+            'Time spent in apply, by family version.',
+            LATENCY_BUCKETS, labels=('family_version',))
+        self.payload_decode_seconds = Histogram(
+            self, 'gdm_payload_decode_seconds',
+            'Time spent decoding payloads, by family version.',
+            LATENCY_BUCKETS, labels=('family_version',))
+        self.get_state_seconds = Histogram(
+            self, 'gdm_get_state_seconds',
+            'Latency of context.get_state calls.',
+            LATENCY_BUCKETS)
+        self.set_state_seconds = Histogram(
+            self, 'gdm_set_state_seconds',
+            'Latency of context.set_state calls.',
+            LATENCY_BUCKETS)
+        self.deserialize_seconds = Histogram(
+            self, 'gdm_deserialize_seconds',
+            'Time spent decoding state entries (decode cache misses).',
+            LATENCY_BUCKETS)
+        self.serialize_seconds = Histogram(
+            self, 'gdm_serialize_seconds',
+            'Time spent encoding state entries.',
+            LATENCY_BUCKETS)
+        self.bucket_messages = Histogram(
+            self, 'gdm_bucket_messages',
+            'Messages in each state entry written.',
+            SIZE_BUCKETS)
+        self.bucket_bytes = Histogram(
+            self, 'gdm_bucket_bytes',
+            'Size of each state entry written.',
+            SIZE_BUCKETS)
+
+        self._collectors = [
+            self.apply_total,
+            self.rejected_total,
+            self.messages_total,
+            self.apply_seconds,
+            self.payload_decode_seconds,
+            self.get_state_seconds,
+            self.set_state_seconds,
+            self.deserialize_seconds,
+            self.serialize_seconds,
+            self.bucket_messages,
+            self.bucket_bytes,
+        ]
+
+    def add_callback(self, name, documentation, callback,
+                     metric_type='gauge'):
+        self._collectors.append(
+            CallbackMetric(name, documentation, callback, metric_type))
+
+    def expose(self):
+        lines = []
+        for collector in self._collectors:
+            lines.extend(collector.expose())
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = GDMMetrics()
+METRICS.add_callback(
+    'gdm_decode_cache_hits_total', 'Decode cache hits.',
+    lambda: DECODE_CACHE.hits, 'counter')
+METRICS.add_callback(
+    'gdm_decode_cache_misses_total', 'Decode cache misses.',
+    lambda: DECODE_CACHE.misses, 'counter')
+METRICS.add_callback(
+    'gdm_decode_cache_evictions_total', 'Decode cache evictions.',
+    lambda: DECODE_CACHE.evictions, 'counter')
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+
+        body = METRICS.expose().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        LOGGER.debug(format, *args)
+
+
+def start_metrics_server(port, host=''):
+    """Enable METRICS and serve them on http://host:port/metrics from a
+    daemon thread.
+
+    Returns:
+        (http.server.ThreadingHTTPServer): the running server.
+    """
+    METRICS.enabled = True
+
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(
+        target=server.serve_forever, name='gdm-metrics', daemon=True)
+    thread.start()
+
+    LOGGER.info("Serving metrics on port %s", port)
+
+    return server
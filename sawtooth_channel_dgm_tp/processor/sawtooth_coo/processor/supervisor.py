@@ -0,0 +1,130 @@
+"""Run several transaction processor processes side by side.
+
+A TransactionProcessor handles one transaction at a time under the GIL.
+The validator's parallel scheduler can spread transactions over every
+processor registered for the family, so the supervisor starts one
+processor per worker process, each with its own zmq identity and log
+file, restarts workers that die, and stops them all on SIGTERM.
+"""
+import logging
+import multiprocessing
+import signal
+import time
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class WorkerSupervisor:
+
+    POLL_INTERVAL = 1
+    STOP_TIMEOUT = 10
+
+    # a worker that crashes sooner than this after starting is restarted
+    # after an increasing delay, up to MAX_RESTART_DELAY seconds
+    MIN_UPTIME = 60
+    MAX_RESTART_DELAY = 30
+
+    def __init__(self, target, args, workers):
+        """Constructor.
+
+        Args:
+            target (callable): Runs one transaction processor until it
+                is stopped; called in each worker process with the
+                worker's index as the worker_index keyword argument.
+            args (tuple): Arguments for target.
+            workers (int): The number of worker processes to keep running.
+        """
+        self._target = target
+        self._args = args
+        self._workers = workers
+        self._processes = {}
+        self._started = {}
+        self._failures = {}
+        self._restart_at = {}
+        self._stopping = False
+
+    def run(self):
+        """Start the workers and supervise them until SIGTERM or SIGINT."""
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+
+        for index in range(self._workers):
+            self._start(index)
+
+        try:
+            while not self._stopping:
+                self._check()
+                time.sleep(self.POLL_INTERVAL)
+        finally:
+            self._stop()
+
+    def _on_signal(self, signum, frame):
+        LOGGER.info("Received signal %s, stopping workers", signum)
+        self._stopping = True
+
+    def _start(self, index):
+        # spawn, not fork: workers must not inherit the supervisor's log
+        # handlers or signal handlers
+        process = multiprocessing.get_context('spawn').Process(
+            target=_run_worker,
+            args=(self._target, self._args, index),
+            name='gdm-worker-{}'.format(index))
+        process.start()
+
+        LOGGER.info("Started worker %s (pid %s)", index, process.pid)
+
+        self._processes[index] = process
+        self._started[index] = time.monotonic()
+        self._restart_at.pop(index, None)
+
+    def _check(self):
+        now = time.monotonic()
+        for index, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+
+            if index not in self._restart_at:
+                process.join()
+                if now - self._started[index] < self.MIN_UPTIME:
+                    self._failures[index] = self._failures.get(index, 0) + 1
+                else:
+                    self._failures[index] = 1
+
+                delay = min(2 ** (self._failures[index] - 1),
+                            self.MAX_RESTART_DELAY)
+                LOGGER.warning(
+                    "Worker %s (pid %s) exited with %s, restarting in %ss",
+                    index, process.pid, process.exitcode, delay)
+                self._restart_at[index] = now + delay
+
+            if now >= self._restart_at[index]:
+                self._start(index)
+
+    def _stop(self):
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + self.STOP_TIMEOUT
+        for index, process in self._processes.items():
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                LOGGER.warning(
+                    "Worker %s (pid %s) did not stop, killing it",
+                    index, process.pid)
+                process.kill()
+                process.join()
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt()
+
+
+def _run_worker(target, args, index):
+    # The processor already shuts down cleanly on KeyboardInterrupt;
+    # SIGINT is left to the supervisor, which terminates its workers.
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    target(*args, worker_index=index)
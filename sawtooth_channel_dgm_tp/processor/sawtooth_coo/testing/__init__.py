@@ -0,0 +1,6 @@
+__all__ = [
+    'context',
+    'events',
+    'rest_api',
+    'validator',
+]
@@ -0,0 +1,156 @@
+"""In-memory stand-in for the sawtooth_sdk Context, for driving
+CoOTransactionHandler.apply without a validator.
+"""
+import time
+
+from sawtooth_sdk.processor.exceptions import AuthorizationException
+from sawtooth_sdk.protobuf.events_pb2 import Event
+from sawtooth_sdk.protobuf.processor_pb2 import TpProcessRequest
+from sawtooth_sdk.protobuf.state_context_pb2 import TpStateEntry
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+
+
+class MemoryContext:
+    """Implements the Context methods the handler uses against a dict.
+
+    Writes are buffered until commit(), so the changes of a rejected
+    transaction can be thrown away with discard(), as the validator
+    would. Given the transaction's inputs and outputs, reads and writes
+    of any other address raise AuthorizationException, as they do on a
+    validator. Each call can be slowed down by a fixed latency to
+    simulate the round trip to the validator.
+    """
+
+    def __init__(self, state=None, get_latency=0, set_latency=0,
+                 inputs=None, outputs=None):
+        """Constructor.
+
+        Args:
+            state (dict): address (str) keys, data (bytes) values; shared
+                with the caller and updated by commit().
+            get_latency (float): seconds each get_state call takes.
+            set_latency (float): seconds each set_state call takes.
+            inputs (list of str): the addresses, or address prefixes, the
+                transaction may read; any by default.
+            outputs (list of str): the addresses, or address prefixes,
+                the transaction may write and delete; any by default.
+        """
+        self.state = {} if state is None else state
+        self.get_latency = get_latency
+        self.set_latency = set_latency
+        self.inputs = None if inputs is None else list(inputs)
+        self.outputs = None if outputs is None else list(outputs)
+
+        self.get_calls = 0
+        self.set_calls = 0
+
+        self._changes = {}
+        self.events = []
+        self.receipt_data = []
+
+    def get_state(self, addresses, timeout=None):
+        self.get_calls += 1
+        if self.get_latency:
+            time.sleep(self.get_latency)
+        _authorize('get', addresses, self.inputs)
+
+        entries = []
+        for address in addresses:
+            data = self._changes.get(address, self.state.get(address))
+            if data:
+                entries.append(TpStateEntry(address=address, data=data))
+
+        return entries
+
+    def set_state(self, entries, timeout=None):
+        self.set_calls += 1
+        if self.set_latency:
+            time.sleep(self.set_latency)
+        _authorize('set', entries, self.outputs)
+
+        self._changes.update(entries)
+
+        return list(entries)
+
+    def delete_state(self, addresses, timeout=None):
+        self.set_calls += 1
+        if self.set_latency:
+            time.sleep(self.set_latency)
+        _authorize('delete', addresses, self.outputs)
+
+        for address in addresses:
+            self._changes[address] = b''
+
+        return list(addresses)
+
+    def add_receipt_data(self, data, timeout=None):
+        self.receipt_data.append(data)
+
+    def add_event(self, event_type, attributes=None, data=None, timeout=None):
+        self.events.append(Event(
+            event_type=event_type,
+            attributes=[
+                Event.Attribute(key=key, value=value)
+                for key, value in attributes or []
+            ],
+            data=data))
+
+    def commit(self):
+        """Apply the buffered writes to state.
+
+        Returns:
+            (dict): the committed changes; deleted addresses map to b''.
+        """
+        changes = self._changes
+        for address, data in changes.items():
+            if data:
+                self.state[address] = data
+            else:
+                self.state.pop(address, None)
+
+        self._reset()
+
+        return changes
+
+    def discard(self):
+        """Throw away the buffered writes, events and receipt data."""
+        self._reset()
+
+    def _reset(self):
+        self._changes = {}
+        self.events = []
+        self.receipt_data = []
+
+
+def _authorize(action, addresses, declared):
+    if declared is None:
+        return
+
+    unauthorized = [
+        address for address in addresses
+        if not any(address.startswith(prefix) for prefix in declared)
+    ]
+    if unauthorized:
+        raise AuthorizationException(
+            'Tried to {} unauthorized address: {}'.format(
+                action, unauthorized))
+
+
+def make_process_request(payload, family_version='1.0', inputs=(),
+                         outputs=(), signer_public_key='0' * 66,
+                         signature=''):
+    """Build the TpProcessRequest the validator would send the handler
+    for a transaction, without signing anything.
+    """
+    header = TransactionHeader(
+        family_name='generic-discrete-message',
+        family_version=family_version,
+        inputs=list(inputs),
+        outputs=list(outputs),
+        signer_public_key=signer_public_key,
+        batcher_public_key=signer_public_key)
+
+    return TpProcessRequest(
+        header=header,
+        payload=payload,
+        signature=signature)
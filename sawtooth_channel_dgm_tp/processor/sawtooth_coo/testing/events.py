@@ -0,0 +1,288 @@
+"""In-memory stand-in for the validator's event stream, for driving
+GDMSubscriber without a validator.
+
+Serves client event subscriptions over ZMQ, as the validator's component
+endpoint does, and publishes blocks of events handed to it, e.g. the
+events a MemoryContext collected while the handler applied a block's
+transactions. Every published block is kept, so that subscriptions
+with known block ids are caught up as the validator would.
+"""
+import hashlib
+import re
+import threading
+
+import zmq
+
+from sawtooth_sdk.protobuf.client_event_pb2 import ClientEventsSubscribeRequest
+from sawtooth_sdk.protobuf.client_event_pb2 import \
+    ClientEventsSubscribeResponse
+from sawtooth_sdk.protobuf.client_event_pb2 import \
+    ClientEventsUnsubscribeResponse
+from sawtooth_sdk.protobuf.events_pb2 import Event
+from sawtooth_sdk.protobuf.events_pb2 import EventFilter
+from sawtooth_sdk.protobuf.events_pb2 import EventList
+from sawtooth_sdk.protobuf.validator_pb2 import Message as ValidatorMessage
+
+
+BLOCK_COMMIT = 'sawtooth/block-commit'
+
+NULL_BLOCK_ID = '0000000000000000'
+
+
+class MemoryEventStream:
+    """Serves subscriptions on tcp://host:port from a daemon thread."""
+
+    def __init__(self, host='127.0.0.1', port=0, zmq_context=None):
+        """Constructor.
+
+        Args:
+            host (str): interface to listen on.
+            port (int): port to listen on, any free port by default.
+            zmq_context (zmq.Context): the process's context by default.
+        """
+        self._zmq_context = zmq_context or zmq.Context.instance()
+
+        self._socket = self._zmq_context.socket(zmq.ROUTER)
+        self._socket.setsockopt(zmq.LINGER, 0)
+        if port:
+            self._socket.bind('tcp://{}:{}'.format(host, port))
+        else:
+            port = self._socket.bind_to_random_port('tcp://{}'.format(host))
+        self._address = (host, port)
+
+        # publish_block hands blocks to the serving thread through here,
+        # as ZMQ sockets must not be shared between threads
+        self._inbox_url = 'inproc://gdm-event-stream-{}'.format(id(self))
+        self._inbox = self._zmq_context.socket(zmq.PULL)
+        self._inbox.bind(self._inbox_url)
+        self._outbox = self._zmq_context.socket(zmq.PUSH)
+        self._outbox.connect(self._inbox_url)
+        self._outbox_lock = threading.Lock()
+
+        # (block id, EventList) of each block, kept by the serving thread
+        self.blocks = []
+        self._block_ids = []
+        # connection identity (bytes) keys, lists of EventSubscription
+        self.subscribers = {}
+
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'tcp://{}:{}'.format(*self._address)
+
+    @property
+    def block_id(self):
+        """The id of the last published block."""
+        with self._outbox_lock:
+            return self._last_block_id()
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._serve, name='gdm-event-stream', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._outbox_lock:
+            self._outbox.send_multipart([b'stop'])
+        self._thread.join()
+        self._outbox.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def publish_block(self, events=()):
+        """Commit a block holding events and send them to the matching
+        subscribers.
+
+        Args:
+            events (list of Event): the events of the block's
+                transactions.
+
+        Returns:
+            (str): the id of the block.
+        """
+        with self._outbox_lock:
+            block_num = len(self._block_ids)
+            previous_block_id = self._last_block_id()
+            block_id = hashlib.sha512('{}{}'.format(
+                previous_block_id, block_num).encode()).hexdigest()
+            self._block_ids.append(block_id)
+
+            block_commit = Event(
+                event_type=BLOCK_COMMIT,
+                attributes=[
+                    Event.Attribute(key='block_id', value=block_id),
+                    Event.Attribute(key='block_num', value=str(block_num)),
+                    Event.Attribute(key='state_root_hash', value=''),
+                    Event.Attribute(
+                        key='previous_block_id', value=previous_block_id),
+                ])
+
+            # sent under the lock, so blocks arrive in order
+            self._outbox.send_multipart([
+                b'block',
+                EventList(
+                    events=[block_commit] + list(events)
+                ).SerializeToString(),
+            ])
+
+        return block_id
+
+    def _last_block_id(self):
+        return self._block_ids[-1] if self._block_ids else NULL_BLOCK_ID
+
+    def _serve(self):
+        poller = zmq.Poller()
+        poller.register(self._socket, zmq.POLLIN)
+        poller.register(self._inbox, zmq.POLLIN)
+
+        try:
+            while True:
+                ready = dict(poller.poll())
+
+                if self._inbox in ready:
+                    frames = self._inbox.recv_multipart()
+                    if frames[0] == b'stop':
+                        return
+                    self._commit(frames[1])
+
+                if self._socket in ready:
+                    identity, data = self._socket.recv_multipart()
+                    self._handle(identity, data)
+        finally:
+            self._inbox.close()
+            self._socket.close()
+
+    def _commit(self, data):
+        event_list = EventList()
+        event_list.ParseFromString(data)
+        block_id = {
+            a.key: a.value for a in event_list.events[0].attributes
+        }['block_id']
+        self.blocks.append((block_id, event_list))
+
+        for identity, subscriptions in self.subscribers.items():
+            self._send_block(identity, subscriptions, event_list)
+
+    def _handle(self, identity, data):
+        message = ValidatorMessage()
+        message.ParseFromString(data)
+
+        if message.message_type == \
+                ValidatorMessage.CLIENT_EVENTS_SUBSCRIBE_REQUEST:
+            request = ClientEventsSubscribeRequest()
+            request.ParseFromString(message.content)
+            self._subscribe(identity, message.correlation_id, request)
+
+        elif message.message_type == \
+                ValidatorMessage.CLIENT_EVENTS_UNSUBSCRIBE_REQUEST:
+            self.subscribers.pop(identity, None)
+            self._send(
+                identity,
+                ValidatorMessage.CLIENT_EVENTS_UNSUBSCRIBE_RESPONSE,
+                ClientEventsUnsubscribeResponse(
+                    status=ClientEventsUnsubscribeResponse.OK),
+                message.correlation_id)
+
+    def _subscribe(self, identity, correlation_id, request):
+        subscriptions = list(request.subscriptions)
+
+        for subscription in subscriptions:
+            for event_filter in subscription.filters:
+                if event_filter.filter_type not in (
+                        EventFilter.SIMPLE_ANY, EventFilter.SIMPLE_ALL,
+                        EventFilter.REGEX_ANY, EventFilter.REGEX_ALL):
+                    self._send(
+                        identity,
+                        ValidatorMessage.CLIENT_EVENTS_SUBSCRIBE_RESPONSE,
+                        ClientEventsSubscribeResponse(
+                            status=ClientEventsSubscribeResponse
+                            .INVALID_FILTER,
+                            response_message='Invalid filter type'),
+                        correlation_id)
+                    return
+
+        catch_up = []
+        if request.last_known_block_ids:
+            block_ids = [block_id for block_id, _ in self.blocks]
+            known = [
+                block_ids.index(block_id)
+                for block_id in request.last_known_block_ids
+                if block_id in block_ids
+            ]
+            if not known and NULL_BLOCK_ID not in \
+                    request.last_known_block_ids:
+                self._send(
+                    identity,
+                    ValidatorMessage.CLIENT_EVENTS_SUBSCRIBE_RESPONSE,
+                    ClientEventsSubscribeResponse(
+                        status=ClientEventsSubscribeResponse.UNKNOWN_BLOCK,
+                        response_message='Unknown block'),
+                    correlation_id)
+                return
+            start = max(known) + 1 if known else 0
+            catch_up = [event_list for _, event_list in self.blocks[start:]]
+
+        self._send(
+            identity,
+            ValidatorMessage.CLIENT_EVENTS_SUBSCRIBE_RESPONSE,
+            ClientEventsSubscribeResponse(
+                status=ClientEventsSubscribeResponse.OK),
+            correlation_id)
+
+        for event_list in catch_up:
+            self._send_block(identity, subscriptions, event_list)
+        self.subscribers[identity] = subscriptions
+
+    def _send_block(self, identity, subscriptions, event_list):
+        events = [
+            event for event in event_list.events
+            if any(_matches(subscription, event)
+                   for subscription in subscriptions)
+        ]
+        if events:
+            self._send(identity, ValidatorMessage.CLIENT_EVENTS,
+                       EventList(events=events))
+
+    def _send(self, identity, message_type, content, correlation_id=''):
+        self._socket.send_multipart([
+            identity,
+            ValidatorMessage(
+                message_type=message_type,
+                correlation_id=correlation_id,
+                content=content.SerializeToString()).SerializeToString(),
+        ])
+
+
+def _matches(subscription, event):
+    """Whether event matches the subscription, as the validator decides:
+    the event type must be the same, and every filter must match.
+    """
+    if subscription.event_type != event.event_type:
+        return False
+
+    for event_filter in subscription.filters:
+        values = [a.value for a in event.attributes
+                  if a.key == event_filter.key]
+
+        if event_filter.filter_type in (
+                EventFilter.SIMPLE_ANY, EventFilter.SIMPLE_ALL):
+            matched = [value == event_filter.match_string
+                       for value in values]
+        else:
+            pattern = re.compile(event_filter.match_string)
+            matched = [bool(pattern.match(value)) for value in values]
+
+        if event_filter.filter_type in (
+                EventFilter.SIMPLE_ANY, EventFilter.REGEX_ANY):
+            if not any(matched):
+                return False
+        elif not matched or not all(matched):
+            return False
+
+    return True
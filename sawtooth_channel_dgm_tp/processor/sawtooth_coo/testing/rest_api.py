@@ -0,0 +1,288 @@
+"""In-memory stand-in for the Sawtooth REST API, for driving GDMClient
+without a validator.
+
+Serves the endpoints the client uses (state, state/{address}, batches,
+batch_statuses and receipts) over HTTP/1.1 with keep-alive, from a dict
+of state entries and one of receipt data. Submitted batches are recorded
+and reported as PENDING for commit_delay seconds, then as COMMITTED;
+they are not applied to state (see validator.MemoryValidator for that).
+"""
+import base64
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+
+from sawtooth_sdk.protobuf.batch_pb2 import BatchList
+
+
+DEFAULT_LIMIT = 1000
+
+
+class MemoryRestApi:
+    """Serves state from a dict on http://host:port from a daemon thread.
+
+    Counts the requests and connections it served, so callers can tell
+    how many connections a client opened.
+    """
+
+    def __init__(self, state=None, host='127.0.0.1', port=0, latency=0,
+                 commit_delay=0):
+        """Constructor.
+
+        Args:
+            state (dict): address (str) keys, data (bytes) values; shared
+                with the caller.
+            host (str): interface to listen on.
+            port (int): port to listen on, any free port by default.
+            latency (float): seconds added to every response.
+            commit_delay (float): seconds a submitted batch stays PENDING.
+        """
+        self.state = {} if state is None else state
+        # the block id list_state reports reading at; the state is only
+        # ever served as it is now, whatever head a query asks for
+        self.head = '0' * 128
+        self.latency = latency
+        self.commit_delay = commit_delay
+
+        self.batches = {}
+        # transaction id (str) keys, lists of receipt data (bytes)
+        self.receipts = {}
+        self.requests = 0
+        self.connections = 0
+
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer(
+            (host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name='gdm-rest-api',
+            daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.connections = 0
+
+    def _count(self, requests=0, connections=0):
+        with self._lock:
+            self.requests += requests
+            self.connections += connections
+
+    def get_state(self, address):
+        data = self.state.get(address)
+        if data is None:
+            return 404, _error(75, 'State Not Found')
+
+        return 200, {
+            'data': base64.b64encode(data).decode(),
+            'link': '{}/state/{}'.format(self.url, address),
+        }
+
+    def list_state(self, query):
+        prefix = query.get('address', [''])[0]
+        start = query.get('start', [''])[0]
+        head = query.get('head', [self.head])[0]
+        limit = min(int(query.get('limit', [DEFAULT_LIMIT])[0]),
+                    DEFAULT_LIMIT)
+
+        addresses = sorted(
+            address for address in list(self.state)
+            if address.startswith(prefix) and address >= start)
+
+        page = addresses[:limit]
+        paging = {'start': start or None, 'limit': limit}
+        if len(addresses) > limit:
+            next_position = addresses[limit]
+            paging['next_position'] = next_position
+            paging['next'] = '{}/state?{}'.format(
+                self.url, urllib.parse.urlencode([
+                    ('address', prefix),
+                    ('start', next_position),
+                    ('limit', limit),
+                    ('head', head),
+                ]))
+
+        return 200, {
+            'data': [
+                {
+                    'address': address,
+                    'data': base64.b64encode(self.state[address]).decode(),
+                }
+                for address in page
+            ],
+            'head': head,
+            'paging': paging,
+            'link': '{}/state?address={}'.format(self.url, prefix),
+        }
+
+    def submit_batches(self, body):
+        batch_list = BatchList()
+        try:
+            batch_list.ParseFromString(body)
+        except Exception:  # pylint: disable=broad-except
+            return 400, _error(35, 'Submitted Batches Invalid')
+
+        ids = [batch.header_signature for batch in batch_list.batches]
+        committed_at = time.monotonic() + self.commit_delay
+        with self._lock:
+            for batch_id in ids:
+                self.batches[batch_id] = committed_at
+
+        return 202, {
+            'link': '{}/batch_statuses?id={}'.format(
+                self.url, ','.join(ids)),
+        }
+
+    def batch_statuses(self, ids):
+        if not ids:
+            return 400, _error(66, 'Id Query Invalid or Missing')
+
+        data = []
+        for batch_id in ids:
+            status, invalid_transactions = self._batch_status(batch_id)
+            data.append({
+                'id': batch_id,
+                'status': status,
+                'invalid_transactions': invalid_transactions,
+            })
+
+        return 200, {'data': data}
+
+    def get_receipts(self, ids):
+        if not ids:
+            return 400, _error(66, 'Id Query Invalid or Missing')
+
+        if any(transaction_id not in self.receipts for transaction_id in ids):
+            return 404, _error(80, 'Receipt Not Found')
+
+        return 200, {
+            'data': [
+                {
+                    'transaction_id': transaction_id,
+                    'state_changes': [],
+                    'events': [],
+                    'data': [
+                        base64.b64encode(data).decode()
+                        for data in self.receipts[transaction_id]
+                    ],
+                }
+                for transaction_id in ids
+            ],
+        }
+
+    def _batch_status(self, batch_id):
+        """Returns:
+            (str, list of dict): the batch's status, and the id and
+                message of each of its invalid transactions.
+        """
+        committed_at = self.batches.get(batch_id)
+        if committed_at is None:
+            return 'UNKNOWN', []
+        if committed_at > time.monotonic():
+            return 'PENDING', []
+        return 'COMMITTED', []
+
+
+def _error(code, title):
+    return {'error': {'code': code, 'title': title}}
+
+
+def _ids(query):
+    return [
+        id_
+        for value in query.get('id', [])
+        for id_ in value.split(',') if id_
+    ]
+
+
+def _make_handler(api):
+
+    class _Handler(http.server.BaseHTTPRequestHandler):
+
+        protocol_version = 'HTTP/1.1'
+        # headers and body are written separately; without this, delayed
+        # ACKs stall every response on a kept-alive connection
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            api._count(connections=1)  # pylint: disable=protected-access
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            url = urllib.parse.urlsplit(self.path)
+            query = urllib.parse.parse_qs(url.query)
+            path = url.path.strip('/')
+
+            if path == 'state':
+                self._respond(*api.list_state(query))
+            elif path.startswith('state/'):
+                self._respond(*api.get_state(path[len('state/'):]))
+            elif path == 'batch_statuses':
+                self._respond(*api.batch_statuses(_ids(query)))
+            elif path == 'receipts':
+                self._respond(*api.get_receipts(_ids(query)))
+            else:
+                self._respond(404, _error(404, 'Not Found'))
+
+        def do_POST(self):  # pylint: disable=invalid-name
+            length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(length)
+
+            path = urllib.parse.urlsplit(self.path).path.strip('/')
+            if path == 'batches':
+                self._respond(*api.submit_batches(body))
+            elif path in ('batch_statuses', 'receipts'):
+                try:
+                    ids = json.loads(body.decode('utf-8'))
+                except ValueError:
+                    ids = None
+                if not isinstance(ids, list):
+                    self._respond(400, _error(
+                        42, 'Bad Request: expected a JSON array'))
+                elif path == 'receipts':
+                    self._respond(*api.get_receipts(ids))
+                else:
+                    self._respond(*api.batch_statuses(ids))
+            else:
+                self._respond(404, _error(404, 'Not Found'))
+
+        def _respond(self, status, document, headers=None):
+            api._count(requests=1)  # pylint: disable=protected-access
+            if api.latency:
+                time.sleep(api.latency)
+
+            body = json.dumps(document).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return _Handler
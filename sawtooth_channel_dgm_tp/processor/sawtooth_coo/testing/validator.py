@@ -0,0 +1,266 @@
+"""In-process stand-in for a validator and its REST API, for running the
+whole client -> REST API -> validator -> transaction processor path on
+one machine, with no network and no Docker.
+
+A MemoryValidator serves the endpoints GDMClient uses, like
+MemoryRestApi, but applies what is submitted: batches are queued, and
+every block interval the queued batches are run through
+CoOTransactionHandler.apply, each transaction with a MemoryContext over
+the state dict, and committed as a block. As on a validator:
+
+- a batch is atomic: one invalid transaction makes the whole batch
+  INVALID and none of its changes are committed;
+- a transaction sees the changes of the transactions before it in its
+  block, and may only read the addresses its header declares as inputs
+  and write those it declares as outputs;
+- a transaction that fails with InternalError is not final: its batch
+  stays PENDING and is applied again in the next block;
+- receipt data is served from receipts once the block is committed, and
+  the events of the block are published to a MemoryEventStream if there
+  is one;
+- a full queue answers submissions with 429 Unable to Accept Batches,
+  with a Retry-After header if retry_after is set.
+
+Signatures are not checked, and transactions are applied one at a time
+on the block thread, so the stand-in measures the handler and the
+client rather than a validator's scheduler.
+"""
+import collections
+import logging
+import threading
+import time
+
+from sawtooth_sdk.processor.exceptions import AuthorizationException
+from sawtooth_sdk.processor.exceptions import InternalError
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+from sawtooth_sdk.protobuf.batch_pb2 import BatchList
+from sawtooth_sdk.protobuf.processor_pb2 import TpProcessRequest
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+
+from sawtooth_coo.processor.handler import CoOTransactionHandler
+from sawtooth_coo.testing.context import MemoryContext
+from sawtooth_coo.testing.rest_api import MemoryRestApi
+from sawtooth_coo.testing.rest_api import _error
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _Overlay(collections.ChainMap):
+    """The state as the changes of a block so far see it: reads fall
+    through to the committed state, writes and deletes stay in the
+    changes, deletes as b''.
+    """
+
+    def pop(self, key, *default):
+        self.maps[0][key] = b''
+
+
+class MemoryValidator(MemoryRestApi):
+    """Applies submitted batches with the handler, committing them in
+    blocks from a daemon thread, and serves the results on
+    http://host:port.
+    """
+
+    def __init__(self, state=None, host='127.0.0.1', port=0, latency=0,
+                 block_interval=0.1, max_block_batches=None,
+                 max_queue=None, retry_after=None, event_stream=None):
+        """Constructor.
+
+        Args:
+            state (dict): address (str) keys, data (bytes) values; shared
+                with the caller and updated as blocks are committed.
+            host (str): interface to listen on.
+            port (int): port to listen on, any free port by default.
+            latency (float): seconds added to every response.
+            block_interval (float): seconds between blocks; the batches
+                queued meanwhile go in the next one.
+            max_block_batches (int): batches per block at most; all that
+                are queued by default.
+            max_queue (int): batches queued at most before submissions
+                are refused with 429; no limit by default.
+            retry_after (int): seconds of the Retry-After header sent
+                with 429; none by default.
+            event_stream (MemoryEventStream): publishes the events of each
+                block, if given; it must be started.
+        """
+        super().__init__(state=state, host=host, port=port,
+                         latency=latency)
+        self.block_interval = block_interval
+        self.max_block_batches = max_block_batches
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.event_stream = event_stream
+
+        self.handler = CoOTransactionHandler()
+        # batch id (str) keys, (status, invalid transactions) values
+        self.statuses = {}
+        self.block_num = 0
+
+        self._queue = collections.deque()
+        self._queued = threading.Condition(self._lock)
+        self._stopped = False
+        self._block_thread = None
+
+    def start(self):
+        self._stopped = False
+        self._block_thread = threading.Thread(
+            target=self._produce_blocks, name='gdm-validator-blocks',
+            daemon=True)
+        self._block_thread.start()
+        return super().start()
+
+    def stop(self):
+        super().stop()
+        with self._queued:
+            self._stopped = True
+            self._queued.notify()
+        self._block_thread.join()
+
+    def submit_batches(self, body):
+        batch_list = BatchList()
+        try:
+            batch_list.ParseFromString(body)
+        except Exception:  # pylint: disable=broad-except
+            return 400, _error(35, 'Submitted Batches Invalid')
+        if not batch_list.batches:
+            return 400, _error(34, 'No Batches Submitted')
+
+        ids = [batch.header_signature for batch in batch_list.batches]
+        with self._queued:
+            if self.max_queue is not None and \
+                    len(self._queue) + len(ids) > self.max_queue:
+                headers = {}
+                if self.retry_after is not None:
+                    headers['Retry-After'] = str(self.retry_after)
+                return 429, _error(31, 'Unable to Accept Batches'), headers
+
+            for batch in batch_list.batches:
+                if batch.header_signature in self.statuses:
+                    continue
+                self.statuses[batch.header_signature] = ('PENDING', [])
+                self._queue.append(batch)
+            self._queued.notify()
+
+        return 202, {
+            'link': '{}/batch_statuses?id={}'.format(
+                self.url, ','.join(ids)),
+        }
+
+    @property
+    def queue_depth(self):
+        """The number of batches waiting for a block."""
+        with self._lock:
+            return len(self._queue)
+
+    def _batch_status(self, batch_id):
+        with self._lock:
+            return self.statuses.get(batch_id, ('UNKNOWN', []))
+
+    def _produce_blocks(self):
+        next_block_at = time.monotonic()
+        while True:
+            with self._queued:
+                while not self._queue and not self._stopped:
+                    self._queued.wait()
+                if self._stopped:
+                    return
+
+            delay = next_block_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            with self._queued:
+                count = len(self._queue)
+                if self.max_block_batches is not None:
+                    count = min(count, self.max_block_batches)
+                batches = [self._queue.popleft() for _ in range(count)]
+
+            self._commit_block(batches)
+            next_block_at = time.monotonic() + self.block_interval
+
+    def _commit_block(self, batches):
+        changes = {}
+        events = []
+        receipts = {}
+        statuses = {}
+        retries = []
+
+        for batch in batches:
+            batch_changes = {}
+            batch_events = []
+            batch_receipts = {}
+            invalid = None
+            failed = False
+
+            for transaction in batch.transactions:
+                header = TransactionHeader()
+                header.ParseFromString(transaction.header)
+                context = MemoryContext(
+                    _Overlay(batch_changes, changes, self.state),
+                    inputs=header.inputs,
+                    outputs=header.outputs)
+                try:
+                    self._apply(transaction, header, context)
+                    # committing resets them
+                    transaction_events = context.events
+                    receipt_data = context.receipt_data
+                    context.commit()
+                except (InvalidTransaction, AuthorizationException) as err:
+                    # as the SDK reports an AuthorizationException
+                    invalid = {
+                        'id': transaction.header_signature,
+                        'message': str(err),
+                        'extended_data': '',
+                    }
+                    break
+                except InternalError as err:
+                    LOGGER.warning(
+                        "Transaction %s failed, retrying its batch: %s",
+                        transaction.header_signature, err)
+                    failed = True
+                    break
+
+                batch_events.extend(transaction_events)
+                batch_receipts[transaction.header_signature] = receipt_data
+
+            if failed:
+                retries.append(batch)
+            elif invalid is None:
+                changes.update(batch_changes)
+                events.extend(batch_events)
+                receipts.update(batch_receipts)
+                statuses[batch.header_signature] = ('COMMITTED', [])
+            else:
+                LOGGER.debug("Batch %s is invalid: %s",
+                             batch.header_signature, invalid['message'])
+                statuses[batch.header_signature] = ('INVALID', [invalid])
+
+        for address, data in changes.items():
+            if data:
+                self.state[address] = data
+            else:
+                self.state.pop(address, None)
+
+        if self.event_stream is not None:
+            self.event_stream.publish_block(events)
+
+        with self._lock:
+            self.receipts.update(receipts)
+            self.statuses.update(statuses)
+            self.block_num += 1
+            # ahead of the batches queued since, in their order
+            self._queue.extendleft(reversed(retries))
+
+    def _apply(self, transaction, header, context):
+        if header.family_name != self.handler.family_name or \
+                header.family_version not in self.handler.family_versions:
+            raise InvalidTransaction(
+                'No transaction processor for {} {}'.format(
+                    header.family_name, header.family_version))
+
+        self.handler.apply(
+            TpProcessRequest(
+                header=header,
+                payload=transaction.payload,
+                signature=transaction.header_signature),
+            context)
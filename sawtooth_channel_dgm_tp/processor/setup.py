@@ -2,8 +2,11 @@ from __future__ import print_function
 
 import os
 import subprocess
+import sys
 
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
+from setuptools.command.develop import develop
 
 conf_dir = "/etc/sawtooth"
 
@@ -17,6 +20,30 @@ if os.path.exists("/lib/systemd/system"):
     data_files.append(('/lib/systemd/system',
                        ['packaging/systemd/sawtooth-coo-tp-python.service']))
 
+
+def generate_protobuf():
+    # sawtooth_coo/protobuf/*_pb2.py are generated from protos/, and not
+    # kept in git
+    subprocess.check_call([
+        sys.executable,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                     '..', 'bin', 'protogen')])
+
+
+class BuildPyCommand(build_py):
+
+    def run(self):
+        generate_protobuf()
+        build_py.run(self)
+
+
+class DevelopCommand(develop):
+
+    def run(self):
+        generate_protobuf()
+        develop.run(self)
+
+
 # FIXME: bin/get_version is too gaflumpy.
 # Something like this would be better:
 # https://github.com/paparazzi/paparazzi/blob/master/paparazzi_version
@@ -29,15 +56,24 @@ setup(
     author='Commonwealth Of Australia',
     url='https://github.com/trustbridge/sawtooth-channel-dgm-tp',
     packages=find_packages(),
+    setup_requires=[
+        'grpcio-tools',
+    ],
     install_requires=[
         'aiohttp',
         'colorlog',
         'protobuf',
+        'pyzmq',
         'sawtooth-sdk',
         'sawtooth-signing',
         'PyYAML',
+        'requests',
     ],
     data_files=data_files,
+    cmdclass={
+        'build_py': BuildPyCommand,
+        'develop': DevelopCommand,
+    },
     entry_points={
         'console_scripts': [
             'coo-tp-python = sawtooth_coo.processor.main:main',
@@ -0,0 +1,125 @@
+"""Fixtures for driving CoOTransactionHandler.apply with the in-memory
+stand-ins of sawtooth_coo.testing, and building the transactions a
+client would send.
+"""
+import pytest
+
+from sawtooth_coo.coo_address import make_index_addresses
+from sawtooth_coo.coo_address import make_message_address
+from sawtooth_coo.coo_address import make_message_addresses
+from sawtooth_coo.processor.coo_message import Message
+from sawtooth_coo.processor.handler import CoOTransactionHandler
+from sawtooth_coo.protobuf.generic_discrete_message_pb2 import MessageList
+from sawtooth_coo.testing.context import MemoryContext
+from sawtooth_coo.testing.context import make_process_request
+from sawtooth_coo.testing.validator import MemoryValidator
+
+
+FAMILY_VERSIONS = ('1.0', '1.1', '2.0')
+
+
+def make_message(sender_ref, sender='AU', receiver='SG'):
+    return Message(sender_ref, 'subject', 'predicate', 'object', sender,
+                   receiver)
+
+
+def fields(message):
+    return (message.sender_ref, message.subject, message.predicate,
+            message.object, message.sender, message.receiver)
+
+
+def declared_addresses(family_version, message):
+    """The addresses a client declares for message, as GDMClient does."""
+    if family_version == '1.0':
+        return [make_message_address(message.sender_ref)]
+
+    return make_message_addresses(
+        message.sender_ref, message.sender, message.receiver) \
+        + make_index_addresses(
+            message.sender_ref, message.sender, message.receiver)
+
+
+def encode_payload(family_version, messages):
+    if family_version == '1.1':
+        message_list = MessageList()
+        for message in messages:
+            message_list.messages.add(
+                sender_ref=message.sender_ref,
+                subject=message.subject,
+                predicate=message.predicate,
+                object=message.object,
+                sender=message.sender,
+                recipient=message.receiver)
+        return message_list.SerializeToString()
+
+    return b'\n'.join(
+        ','.join(fields(message)).encode() for message in messages)
+
+
+def make_request(family_version, messages, payload=None):
+    addresses = [
+        address for message in messages
+        for address in declared_addresses(family_version, message)
+    ]
+
+    return make_process_request(
+        encode_payload(family_version, messages)
+        if payload is None else payload,
+        family_version=family_version,
+        inputs=addresses,
+        outputs=addresses)
+
+
+@pytest.fixture
+def state():
+    """The validator state: address keys, data values."""
+    return {}
+
+
+@pytest.fixture
+def apply(state):
+    """Apply a transaction of family_version carrying messages to state,
+    and commit it unless commit is False.
+
+    Returns:
+        (MemoryContext): the transaction's context.
+    """
+    handler = CoOTransactionHandler()
+
+    def apply(family_version, messages, payload=None, commit=True):
+        request = make_request(family_version, messages, payload=payload)
+        context = MemoryContext(
+            state,
+            inputs=request.header.inputs,
+            outputs=request.header.outputs)
+        handler.apply(request, context)
+        if commit:
+            context.commit()
+        return context
+
+    return apply
+
+
+class FlakyValidator(MemoryValidator):
+    """Answers the first failures batch_statuses and receipts queries
+    with 503, as a REST API behind a restarting proxy might.
+    """
+
+    failures = 0
+
+    def _flake(self):
+        with self._lock:
+            if self.failures:
+                self.failures -= 1
+                return True
+        return False
+
+    def batch_statuses(self, ids):
+        if self._flake():
+            return 503, {'error': {'code': 503, 'title': 'Unavailable'}}
+        return super().batch_statuses(ids)
+
+    def get_receipts(self, ids):
+        if self._flake():
+            return 503, {'error': {'code': 503, 'title': 'Unavailable'}}
+        return super().get_receipts(ids)
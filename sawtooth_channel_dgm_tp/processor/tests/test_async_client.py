@@ -0,0 +1,154 @@
+import asyncio
+import threading
+
+import aiohttp
+import pytest
+
+from sawtooth_signing import create_context
+
+from sawtooth_coo.coo_async_client import AsyncGDMClient
+from sawtooth_coo.coo_exceptions import CoONotFoundException
+from sawtooth_coo.coo_waiter import AsyncBatchStatusWaiter
+from sawtooth_coo.processor.coo_state import decode_state_entry
+
+from conftest import FlakyValidator
+from conftest import fields
+from conftest import make_message
+
+
+@pytest.fixture
+def validator():
+    validator = FlakyValidator(block_interval=0.01)
+    validator.start()
+    yield validator
+    validator.stop()
+
+
+def _key():
+    return create_context('secp256k1').new_random_private_key().as_hex()
+
+
+def _run(validator, test, **kwargs):
+    async def run():
+        async with AsyncGDMClient(
+                validator.url, key=_key(), **kwargs) as client:
+            return await test(client)
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('binary', (False, True))
+def test_create_waits_and_shows(validator, binary):
+    message = make_message('ref-1')
+
+    async def test(client):
+        await client.create(*fields(message), wait=5, binary=binary)
+        return await client.show('ref-1')
+
+    stored = decode_state_entry(_run(validator, test))
+    assert fields(stored['ref-1']) == fields(message)
+
+
+def test_show_raises_not_found(validator):
+    async def test(client):
+        with pytest.raises(CoONotFoundException):
+            await client.show('ref-1')
+
+    _run(validator, test)
+
+
+def test_create_many_signs_off_the_event_loop(validator):
+    messages = [make_message('ref-{}'.format(n)) for n in range(5)]
+    signed_on = []
+
+    async def test(client):
+        pack_messages = client._pack_messages
+
+        def recording(*args):
+            signed_on.append(threading.current_thread())
+            return pack_messages(*args)
+
+        client._pack_messages = recording
+        batch_ids = await client.create_many(messages, wait=5)
+        return batch_ids, [
+            message async for message in client.list(page_size=2)]
+
+    batch_ids, listed = _run(validator, test)
+
+    assert signed_on and threading.main_thread() not in signed_on
+    assert set(validator.statuses) == set(batch_ids)
+    assert sorted(map(fields, listed)) == sorted(map(fields, messages))
+
+
+def test_list_reads_page_by_page(validator):
+    messages = [make_message('ref-{}'.format(n)) for n in range(6)]
+
+    async def test(client):
+        await client.create_many(messages, wait=5)
+        validator.reset_counters()
+        return [message async for message in client.list(page_size=2)]
+
+    listed = _run(validator, test)
+
+    assert sorted(map(fields, listed)) == sorted(map(fields, messages))
+    # a page of 2 entries per request
+    assert validator.requests >= 3
+
+
+def test_requests_in_flight_are_bounded(validator):
+    validator.latency = 0.02
+
+    async def test(client):
+        await client.create(*fields(make_message('ref-1')), wait=5)
+        validator.reset_counters()
+        await asyncio.gather(*[client.show('ref-1') for _ in range(10)])
+
+    async def run():
+        # a pool large enough that only max_concurrency bounds them
+        connector = aiohttp.TCPConnector(limit=50)
+        async with AsyncGDMClient(validator.url, key=_key(),
+                                  max_concurrency=2,
+                                  connector=connector) as client:
+            await test(client)
+        await connector.close()
+
+    asyncio.run(run())
+
+    assert validator.requests == 10
+    assert validator.connections <= 2
+
+
+def test_async_waiter_follows_submitted_batches(validator):
+    messages = [make_message('ref-1'), make_message('ref-1', 'SG', 'AU')]
+
+    async def test(client):
+        batch_ids = await client.create_many(messages, max_batch_size=1)
+        waiter = AsyncBatchStatusWaiter(
+            client, min_interval=0.01, max_interval=0.05)
+        statuses = await waiter.wait(batch_ids, timeout=5)
+        await waiter.close()
+        return statuses
+
+    statuses = _run(validator, test)
+
+    # the same sender_ref again, between other parties
+    assert sorted(status.status for status in statuses.values()) == \
+        ['COMMITTED', 'INVALID']
+
+
+def test_posted_reads_are_retried(validator):
+    message = make_message('ref-1')
+
+    async def test(client):
+        batch_ids, transaction_ids = await client.create_many(
+            [message], wait=5, with_transaction_ids=True)
+        validator.failures = 2
+        statuses = await client.get_statuses(batch_ids)
+        validator.failures = 2
+        receipts = await client.confirm([message], transaction_ids)
+        return statuses[batch_ids[0]], receipts
+
+    status, receipts = _run(validator, test)
+
+    assert status['status'] == 'COMMITTED'
+    assert receipts[0] is not None
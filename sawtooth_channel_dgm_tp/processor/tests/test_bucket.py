@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from sawtooth_coo.processor.coo_bucket import IndexEntryBucket
+from sawtooth_coo.processor.coo_bucket import IndexedBucket
+
+from conftest import fields
+from conftest import make_message
+
+
+def _decoded(bucket):
+    return {sender_ref: fields(message)
+            for sender_ref, message in bucket.to_dict().items()}
+
+
+def _bucket(*sender_refs):
+    return IndexedBucket.from_messages(
+        {sender_ref: make_message(sender_ref) for sender_ref in sender_refs})
+
+
+def test_empty_bucket():
+    bucket = IndexedBucket()
+
+    assert len(bucket) == 0
+    assert bucket.keys() == []
+    assert bucket.position('ref-1') is None
+    assert bucket.get('ref-1') is None
+    assert bucket.data == IndexedBucket.from_messages({}).data
+
+
+@pytest.mark.parametrize('sender_ref', ('ref-0', 'ref-2', 'ref-4'))
+def test_insert_splices_new_records_in_order(sender_ref):
+    bucket = _bucket('ref-1', 'ref-3')
+
+    inserted = bucket.insert(make_message(sender_ref))
+
+    assert inserted.keys() == sorted(['ref-1', 'ref-3', sender_ref])
+    assert inserted.data == _bucket('ref-1', 'ref-3', sender_ref).data
+    # the bucket inserted into is left as it was
+    assert bucket.keys() == ['ref-1', 'ref-3']
+
+
+@pytest.mark.parametrize('sender_ref', ('ref-1', 'ref-2', 'ref-3'))
+def test_insert_replaces_records_of_another_length(sender_ref):
+    bucket = _bucket('ref-1', 'ref-2', 'ref-3')
+    message = make_message(sender_ref, sender='A' * 40, receiver='')
+
+    replaced = bucket.insert(message)
+
+    assert replaced.keys() == ['ref-1', 'ref-2', 'ref-3']
+    # every record after it moved with the shift in length
+    for other in replaced.keys():
+        expected = message if other == sender_ref else make_message(other)
+        assert fields(replaced.get(other)) == fields(expected)
+
+
+def test_position_and_keys_follow_utf8_order():
+    sender_refs = ['b', 'a', 'é', 'z', 'ab']
+    bucket = _bucket(*sender_refs)
+
+    assert bucket.keys() == sorted(sender_refs)
+    for index, sender_ref in enumerate(sorted(sender_refs)):
+        assert bucket.position(sender_ref) == index
+        assert sender_ref in bucket
+    assert bucket.position('aa') is None
+    assert 'aa' not in bucket
+
+
+def test_insert_keeps_the_class_and_prefix():
+    bucket = IndexEntryBucket().insert(make_message('ref-1'))
+
+    assert isinstance(bucket, IndexEntryBucket)
+    assert bucket.data.startswith(IndexEntryBucket.PREFIX)
+    assert IndexEntryBucket(bucket.data).keys() == ['ref-1']
+
+
+def test_insert_agrees_with_from_messages():
+    rng = random.Random(0)
+    for _ in range(50):
+        bucket = IndexedBucket()
+        messages = {}
+        for _ in range(rng.randint(1, 30)):
+            sender_ref = 'ref-{}'.format(rng.randint(0, 15))
+            message = make_message(
+                sender_ref,
+                sender=rng.choice(['AU', 'SG', 'A' * rng.randint(0, 64)]),
+                receiver=rng.choice(['AU', 'SG', '']))
+            bucket = bucket.insert(message)
+            messages[sender_ref] = message
+
+            assert bucket.data == IndexedBucket.from_messages(messages).data
+
+        assert _decoded(bucket) == {
+            sender_ref: fields(message)
+            for sender_ref, message in messages.items()}
@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+from sawtooth_signing import create_context
+
+from sawtooth_coo.coo_address import GDM_NAMESPACE
+from sawtooth_coo.coo_address import make_message_address
+from sawtooth_coo.coo_cache import MessageCache
+from sawtooth_coo.coo_client import GDMClient
+from sawtooth_coo.coo_exceptions import CoONotFoundException
+from sawtooth_coo.coo_export import Exporter
+
+from conftest import FlakyValidator
+from conftest import make_message
+
+
+@pytest.fixture
+def validator():
+    validator = FlakyValidator(block_interval=0.01)
+    validator.start()
+    yield validator
+    validator.stop()
+
+
+def _key():
+    return create_context('secp256k1').new_random_private_key().as_hex()
+
+
+@pytest.fixture
+def client(validator):
+    client = GDMClient(validator.url, key=_key())
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def messages(client):
+    messages = [make_message('ref-{}'.format(n)) for n in range(6)]
+    client.create_many(messages, wait=5)
+    return messages
+
+
+def test_list_pages_reads_every_page_at_the_first_head(
+        validator, client, messages):
+    first_head = validator.head
+    heads = []
+    listed = []
+    for page, _, head in client.list_pages(page_size=2):
+        # a block committed between pages moves the chain head
+        validator.head = 'f' * 128
+        heads.append(head)
+        listed.extend(message.sender_ref for message in page)
+
+    assert heads == [first_head] * len(heads)
+    assert sorted(listed) == [message.sender_ref for message in messages]
+
+
+def test_export_checkpoint_records_head(
+        tmp_path, validator, client, messages):
+    path = str(tmp_path / 'export.jsonl')
+    checkpoints = []
+
+    class Recording(Exporter):
+        def _write_checkpoint(self, output, position, head):
+            checkpoints.append(head)
+            super()._write_checkpoint(output, position, head)
+
+    exporter = Recording(client, path, page_size=2, checkpoint_pages=1)
+
+    assert exporter.run() == len(messages)
+    assert checkpoints and set(checkpoints) == {validator.head}
+
+
+def test_resumed_export_reads_at_the_checkpoint_head(
+        tmp_path, validator, client, messages):
+    path = tmp_path / 'export.jsonl'
+    path.write_bytes(b'')
+    checkpoint_path = tmp_path / 'export.jsonl.checkpoint'
+    checkpoint_path.write_text(json.dumps({
+        'format': 'jsonl',
+        'compression': None,
+        'position': GDM_NAMESPACE,
+        'head': 'a' * 128,
+        'offset': 0,
+        'exported': 0,
+    }))
+    heads = []
+    list_pages = client.list_pages
+
+    def recording_list_pages(**kwargs):
+        for page in list_pages(**kwargs):
+            heads.append(page[2])
+            yield page
+
+    client.list_pages = recording_list_pages
+
+    assert Exporter(client, str(path), page_size=2).run() == len(messages)
+    assert heads and set(heads) == {'a' * 128}
+
+
+def test_show_skips_an_entry_without_the_sender_ref(validator):
+    client = GDMClient(validator.url, key=_key(), cache=MessageCache())
+    address = make_message_address('ref-2')
+    # another sender_ref stored at the address first, e.g. a collision
+    validator.state[address] = b'ref-1,subject,object,predicate,AU,SG'
+
+    with pytest.raises(CoONotFoundException):
+        client.show('ref-2')
+
+    validator.state[address] += b'|ref-2,subject,object,predicate,AU,SG'
+
+    assert b'ref-2,' in client.show('ref-2')
+    client.close()
+
+
+def test_posted_reads_are_retried(validator, client):
+    message = make_message('ref-1')
+    batch_ids, transaction_ids = client.create_many(
+        [message], wait=5, with_transaction_ids=True)
+
+    validator.failures = 2
+    statuses = client.get_statuses(batch_ids)
+    validator.failures = 2
+    receipts = client.confirm([message], transaction_ids)
+
+    assert statuses[batch_ids[0]]['status'] == 'COMMITTED'
+    assert receipts[0] is not None
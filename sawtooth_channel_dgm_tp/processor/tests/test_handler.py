@@ -0,0 +1,220 @@
+import itertools
+
+import pytest
+
+from sawtooth_sdk.processor.exceptions import InvalidTransaction
+
+from sawtooth_coo.coo_address import make_channel_message_address
+from sawtooth_coo.coo_address import make_index_addresses
+from sawtooth_coo.coo_address import make_message_address
+from sawtooth_coo.processor.coo_bucket import decode_registry_entry
+from sawtooth_coo.processor.coo_bucket import encode_registry_entry
+from sawtooth_coo.processor.coo_bucket import record_hash
+from sawtooth_coo.processor.coo_events import MESSAGE_CREATED
+from sawtooth_coo.processor.coo_events import decode_event_data
+from sawtooth_coo.processor.coo_message import Message
+from sawtooth_coo.processor.coo_receipts import decode_receipt_data
+from sawtooth_coo.processor.coo_state import decode_state_entry
+
+from conftest import FAMILY_VERSIONS
+from conftest import declared_addresses
+from conftest import fields
+from conftest import make_message
+
+
+def _stored_at(family_version, message):
+    if family_version == '1.0':
+        return make_message_address(message.sender_ref)
+    return make_channel_message_address(
+        message.sender_ref, message.sender, message.receiver)
+
+
+@pytest.mark.parametrize('family_version', FAMILY_VERSIONS)
+def test_stores_message(apply, state, family_version):
+    message = make_message('ref-1')
+
+    changes = apply(family_version, [message], commit=False).commit()
+
+    address = _stored_at(family_version, message)
+    stored = decode_state_entry(state[address])
+    assert list(stored) == ['ref-1']
+    assert fields(stored['ref-1']) == fields(message)
+
+    if family_version == '1.0':
+        assert list(changes) == [address]
+    else:
+        # recorded in the registry entry at the legacy address
+        registry = decode_registry_entry(
+            state[make_message_address('ref-1')])
+        assert registry == {'ref-1': address}
+
+    assert set(changes) <= set(declared_addresses(family_version, message))
+
+
+def test_legacy_transaction_is_unchanged(apply, state):
+    # declares, reads and writes the legacy address alone, as before
+    # there were later versions
+    context = apply('1.0', [make_message('ref-1')], commit=False)
+
+    assert context.inputs == [make_message_address('ref-1')]
+    assert context.commit() == {
+        make_message_address('ref-1'): b'ref-1,subject,object,predicate,AU,SG'
+    }
+
+
+@pytest.mark.parametrize('family_version,stored', [
+    # a message bucket, where a channel layout message is recorded
+    ('1.1', b'other,subject,object,predicate,AU,SG'),
+    ('2.0', b'other,subject,object,predicate,AU,SG'),
+    # a registry entry, where a legacy message is stored
+    ('1.0', encode_registry_entry({'other': 'address'})),
+])
+def test_rejects_legacy_address_collision(
+        apply, state, family_version, stored):
+    state[make_message_address('ref-1')] = stored
+
+    with pytest.raises(InvalidTransaction) as raised:
+        apply(family_version, [make_message('ref-1')])
+    assert raised.value.reason == 'address_collision'
+
+
+@pytest.mark.parametrize('family_version', FAMILY_VERSIONS)
+def test_index_entries(apply, state, family_version):
+    message = make_message('ref-1')
+
+    apply(family_version, [message])
+
+    for address in make_index_addresses('ref-1', 'AU', 'SG'):
+        if family_version == '1.0':
+            # 1.0 transactions do not declare the index entries
+            assert address not in state
+        else:
+            assert list(decode_state_entry(state[address])) == ['ref-1']
+
+
+def test_stores_every_message_of_a_batch_payload(apply, state):
+    messages = [make_message('ref-{}'.format(n)) for n in range(5)]
+
+    apply('2.0', messages)
+
+    for message in messages:
+        stored = decode_state_entry(state[_stored_at('2.0', message)])
+        assert fields(stored[message.sender_ref]) == fields(message)
+
+
+@pytest.mark.parametrize(
+    'first_version,second_version',
+    list(itertools.product(FAMILY_VERSIONS, repeat=2)))
+def test_rejects_existing_sender_ref(apply, first_version, second_version):
+    apply(first_version, [make_message('ref-1')])
+
+    with pytest.raises(InvalidTransaction) as raised:
+        apply(second_version, [make_message('ref-1')])
+    assert raised.value.reason == 'message_exists'
+
+
+@pytest.mark.parametrize('first_version', FAMILY_VERSIONS)
+@pytest.mark.parametrize('second_version', ('1.1', '2.0'))
+def test_rejects_existing_sender_ref_between_other_parties(
+        apply, first_version, second_version):
+    apply(first_version, [make_message('ref-1', 'AU', 'SG')])
+
+    with pytest.raises(InvalidTransaction) as raised:
+        apply(second_version, [make_message('ref-1', 'NZ', 'CN')])
+    assert raised.value.reason == 'message_exists'
+
+
+def test_rejects_batch_with_one_existing_sender_ref(apply, state):
+    apply('1.1', [make_message('ref-1')])
+    before = dict(state)
+
+    with pytest.raises(InvalidTransaction):
+        apply('2.0', [make_message('ref-2'), make_message('ref-1')])
+
+    assert state == before
+
+
+@pytest.mark.parametrize('family_version', ('1.1', '2.0'))
+def test_rejects_duplicate_in_payload(apply, family_version):
+    with pytest.raises(InvalidTransaction) as raised:
+        apply(family_version, [make_message('ref-1'), make_message('ref-1')])
+    assert raised.value.reason == 'duplicate_in_payload'
+
+
+def test_protobuf_fields_may_hold_csv_separators(apply, state):
+    message = Message('ref-1', 'a|b', 'predicate', 'line\nbreak', 'AU', 'SG')
+
+    apply('1.1', [message])
+
+    stored = decode_state_entry(state[_stored_at('1.1', message)])
+    assert fields(stored['ref-1']) == fields(message)
+
+
+@pytest.mark.parametrize('family_version,payload,reason', [
+    ('1.0', b'ref-1,subject,predicate', 'invalid_payload'),
+    ('1.0', b'ref-1,,predicate,object,AU,SG', 'missing_field'),
+    ('1.0', b'ref|1,subject,predicate,object,AU,SG', 'invalid_sender_ref'),
+    ('1.0', b'ref-1,sub|ject,predicate,object,AU,SG', 'invalid_field'),
+    ('1.0', b'ref-1,subject,predicate,object,AU,S\nG', 'invalid_field'),
+    ('2.0', b'ref-1,a|b,predicate,object,AU,SG', 'invalid_field'),
+    ('2.0', b'ref-1,subject,predicate,object,A|U,SG', 'invalid_field'),
+    ('1.1', b'\xff\xff', 'invalid_payload'),
+    ('1.1', b'', 'no_messages'),
+    ('2.0', b'ref-1,subject\nref-2', 'invalid_payload'),
+])
+def test_rejects_invalid_payload(apply, family_version, payload, reason):
+    with pytest.raises(InvalidTransaction) as raised:
+        apply(family_version, [make_message('ref-1')], payload=payload)
+    assert raised.value.reason == reason
+
+
+@pytest.mark.parametrize('family_version', FAMILY_VERSIONS)
+def test_receipt(apply, state, family_version):
+    messages = [make_message('ref-2')]
+    if family_version == '2.0':
+        messages.append(make_message('ref-1'))
+
+    context = apply(family_version, messages, commit=False)
+
+    [data] = context.receipt_data
+    receipts = decode_receipt_data(data)
+    assert [receipt.sender_ref for receipt in receipts] == [
+        message.sender_ref for message in messages]
+    for receipt, message in zip(receipts, messages):
+        assert receipt.address == _stored_at(family_version, message)
+        assert receipt.record_hash == record_hash(message)
+        assert receipt.position == 0
+
+
+@pytest.mark.parametrize('family_version', FAMILY_VERSIONS)
+def test_created_events(apply, family_version):
+    messages = [make_message('ref-1')]
+    if family_version == '2.0':
+        messages += [make_message('ref-2'), make_message('ref-3', 'SG', 'AU')]
+
+    context = apply(family_version, messages, commit=False)
+
+    assert [event.event_type for event in context.events] == \
+        [MESSAGE_CREATED] * (2 if family_version == '2.0' else 1)
+
+    event = context.events[0]
+    attributes = [(a.key, a.value) for a in event.attributes]
+    assert attributes[:2] == [('sender', 'AU'), ('receiver', 'SG')]
+    assert [value for key, value in attributes if key == 'sender_ref'] == \
+        [message.sender_ref for message in messages
+         if message.sender == 'AU']
+    assert [fields(message) for message in decode_event_data(event.data)] \
+        == [fields(message) for message in messages
+            if message.sender == 'AU']
+
+
+@pytest.mark.parametrize('family_version', FAMILY_VERSIONS)
+def test_one_state_round_trip_each_way(apply, family_version):
+    messages = [make_message('ref-1')]
+    if family_version == '2.0':
+        messages += [make_message('ref-{}'.format(n)) for n in range(2, 10)]
+
+    context = apply(family_version, messages, commit=False)
+
+    assert context.get_calls == 1
+    assert context.set_calls == 1
@@ -0,0 +1,114 @@
+import io
+import time
+
+import pytest
+
+from sawtooth_signing import create_context
+
+from sawtooth_coo.coo_address import make_message_address
+from sawtooth_coo.coo_client import GDMClient
+from sawtooth_coo.coo_export import write_csv
+from sawtooth_coo.coo_import import Importer
+from sawtooth_coo.coo_import import read_csv
+from sawtooth_coo.processor.coo_message import Message
+from sawtooth_coo.testing.validator import MemoryValidator
+
+from conftest import fields
+from conftest import make_message
+
+
+@pytest.fixture
+def validator():
+    validator = MemoryValidator(block_interval=0.01)
+    validator.start()
+    yield validator
+    validator.stop()
+
+
+@pytest.fixture
+def client(validator):
+    key = create_context('secp256k1').new_random_private_key().as_hex()
+    client = GDMClient(validator.url, key=key)
+    yield client
+    client.close()
+
+
+def _log(path):
+    with open(path) as log:
+        return [line.rstrip('\n').split('\t')[:2] for line in log]
+
+
+def test_resume_fails_unknown_batches_without_waiting(tmp_path, client):
+    log_path = str(tmp_path / 'import.log')
+    committed = client.create_many([make_message('ref-1')], wait=5)[0]
+    with open(log_path, 'w') as log:
+        log.write('1\tSUBMITTED\tref-1\t{}\t-\t\n'.format(committed))
+        # a batch the validator never received
+        log.write('2\tSUBMITTED\tref-2\t{}\t-\t\n'.format('f' * 128))
+
+    waited = []
+    add = client.waiter.add
+
+    def recording_add(batch_id, *args, **kwargs):
+        waited.append(batch_id)
+        return add(batch_id, *args, **kwargs)
+
+    client.waiter.add = recording_add
+
+    started = time.monotonic()
+    stats = Importer(client, log_path=log_path, wait=30).run(
+        [(1, make_message('ref-1')), (2, make_message('ref-2'))])
+
+    assert time.monotonic() - started < 5
+    assert _log(log_path)[2:] == [
+        ['1', 'COMMITTED'],
+        ['2', 'FAILED'],
+        ['2', 'SUBMITTED'],
+        ['2', 'COMMITTED'],
+    ]
+    assert stats.skipped == 1
+    # only PENDING batches are waited on
+    assert committed not in waited and 'f' * 128 not in waited
+
+
+
+def test_chunks_turned_away_are_submitted_again(tmp_path, validator, client):
+    log_path = str(tmp_path / 'import.log')
+    validator.max_queue = 0
+    submit_batches = client.submit_batches
+
+    def refusing_once(batches):
+        try:
+            submit_batches(batches)
+        finally:
+            validator.max_queue = None
+
+    client.submit_batches = refusing_once
+
+    stats = Importer(client, log_path=log_path, wait=30).run(
+        [(1, make_message('ref-1')), (2, make_message('ref-2'))])
+
+    assert _log(log_path) == [
+        ['1', 'SUBMITTED'], ['2', 'SUBMITTED'],
+        ['1', 'COMMITTED'], ['2', 'COMMITTED'],
+    ]
+    assert (stats.committed, stats.failed) == (2, 0)
+
+
+def test_exported_records_1_0_can_not_carry_import_as_1_1(validator, client):
+    messages = [
+        make_message('ref-1'),
+        Message('ref-2', 'subject, with a comma', 'predicate', 'a|b',
+                'AU', 'SG'),
+    ]
+    exported = io.StringIO()
+    write_csv(exported, messages)
+    exported.seek(0)
+
+    stats = Importer(client, wait=30).run(read_csv(exported))
+
+    assert (stats.committed, stats.failed, stats.invalid) == (2, 0, 0)
+    assert sorted(map(fields, client.list())) == list(map(fields, messages))
+    # as 1.0 where it can be
+    assert validator.state[make_message_address('ref-1')].startswith(
+        b'ref-1,')
@@ -0,0 +1,126 @@
+import json
+import time
+
+import pytest
+
+from sawtooth_signing import create_context
+
+from sawtooth_coo.coo_client import GDMClient
+from sawtooth_coo.coo_exceptions import CoOException
+from sawtooth_coo.coo_outbox import COMMITTED
+from sawtooth_coo.coo_outbox import INVALID
+from sawtooth_coo.coo_outbox import Outbox
+from sawtooth_coo.coo_outbox import SIGNED
+from sawtooth_coo.coo_outbox import SUBMITTED
+from sawtooth_coo.testing.rest_api import MemoryRestApi
+from sawtooth_coo.testing.validator import MemoryValidator
+
+from conftest import fields
+from conftest import make_message
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    outbox = Outbox(str(tmp_path / 'outbox.db'))
+    yield outbox
+    outbox.close()
+
+
+@pytest.fixture
+def validator():
+    validator = MemoryValidator(block_interval=0.01)
+    validator.start()
+    yield validator
+    validator.stop()
+
+
+@pytest.fixture
+def key():
+    return create_context('secp256k1').new_random_private_key().as_hex()
+
+
+def _statuses(outbox, sender_ref):
+    return [journaled.status for journaled in outbox.lookup(sender_ref)]
+
+
+def test_create_wait_is_not_held_to_the_outbox_wait(outbox, key):
+    with MemoryRestApi(commit_delay=60) as api:
+        client = GDMClient(api.url, key=key, outbox=outbox)
+        started = time.monotonic()
+        client.create(*fields(make_message('ref-1')), wait=0.2)
+        waited = time.monotonic() - started
+        client.close()
+
+    assert waited < 5
+    assert _statuses(outbox, 'ref-1') == [SUBMITTED]
+
+
+def test_committed_and_invalid_batches_are_recorded(
+        outbox, validator, key):
+    client = GDMClient(validator.url, key=key, outbox=outbox)
+    client.create(*fields(make_message('ref-1')), wait=5)
+    # the same sender_ref again
+    client.create(*fields(make_message('ref-1')), wait=5)
+    client.close()
+
+    first, second = outbox.lookup('ref-1')
+    assert (first.status, first.detail) == (COMMITTED, '')
+    assert second.status == INVALID
+    invalid, = json.loads(second.detail)
+    assert invalid['id'] == second.transaction_id
+    assert outbox.counts() == {
+        SIGNED: 0, SUBMITTED: 0, COMMITTED: 1, INVALID: 1}
+
+
+def test_reconcile_posts_batches_signed_before_a_crash(
+        outbox, validator, key):
+    # nothing listens there: the batch is journaled, but never posted
+    crashed = GDMClient('http://127.0.0.1:1', key=key, outbox=outbox,
+                        retries=0)
+    with pytest.raises(CoOException):
+        crashed.create_many([make_message('ref-1')])
+    crashed.close()
+    assert _statuses(outbox, 'ref-1') == [SIGNED]
+
+    client = GDMClient(validator.url, key=key, outbox=outbox)
+    counts = client.reconcile(wait=5)
+    client.close()
+
+    assert counts['RESUBMITTED'] == 1
+    assert _statuses(outbox, 'ref-1') == [COMMITTED]
+
+
+def test_reconcile_posts_unknown_batches_unchanged(outbox, validator, key):
+    # the batch reached a REST API whose validator lost it
+    with MemoryRestApi(commit_delay=60) as api:
+        client = GDMClient(api.url, key=key, outbox=outbox)
+        batch_id, = client.create_many([make_message('ref-1')])
+        client.close()
+    assert _statuses(outbox, 'ref-1') == [SUBMITTED]
+
+    client = GDMClient(validator.url, key=key, outbox=outbox)
+    counts = client.reconcile(wait=5)
+    client.close()
+
+    assert counts['RESUBMITTED'] == 1
+    # the same signed batch, not a new transaction for the message
+    assert list(validator.statuses) == [batch_id]
+    assert outbox.lookup('ref-1')[0].batch_id == batch_id
+    assert _statuses(outbox, 'ref-1') == [COMMITTED]
+
+
+def test_reconcile_records_batches_committed_meanwhile(outbox, key):
+    with MemoryRestApi(commit_delay=60) as api:
+        client = GDMClient(api.url, key=key, outbox=outbox)
+        batch_id, = client.create_many([make_message('ref-1')])
+        client.close()
+        assert _statuses(outbox, 'ref-1') == [SUBMITTED]
+
+        # committed after the client stopped following it
+        api.batches[batch_id] = 0
+        client = GDMClient(api.url, key=key, outbox=outbox)
+        counts = client.reconcile()
+        client.close()
+
+    assert (counts['COMMITTED'], counts['RESUBMITTED']) == (1, 0)
+    assert _statuses(outbox, 'ref-1') == [COMMITTED]
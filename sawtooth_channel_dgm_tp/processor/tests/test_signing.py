@@ -0,0 +1,40 @@
+import pytest
+
+from sawtooth_signing import create_context
+from sawtooth_signing import CryptoFactory
+
+from sawtooth_coo.coo_signing import SigningPool
+
+
+@pytest.fixture(scope='module')
+def key():
+    return create_context('secp256k1').new_random_private_key()
+
+
+@pytest.fixture(scope='module')
+def pool(key):
+    with SigningPool(key.as_hex(), workers=2, chunk_size=4) as pool:
+        yield pool
+
+
+def test_signs_in_order(key, pool):
+    headers = [b'header-%d' % n for n in range(50)]
+    signer = CryptoFactory(create_context('secp256k1')).new_signer(key)
+
+    assert pool.sign(headers) == [signer.sign(header) for header in headers]
+
+
+def test_yields_before_reading_every_header(pool):
+    read = []
+
+    def headers():
+        for n in range(200):
+            read.append(n)
+            yield b'header-%d' % n
+
+    signatures = pool.sign_iter(headers())
+    next(signatures)
+
+    # chunk_size * CHUNKS_PER_WORKER * workers headers at most
+    assert len(read) <= 4 * SigningPool.CHUNKS_PER_WORKER * 2
+    assert len(list(signatures)) == 199
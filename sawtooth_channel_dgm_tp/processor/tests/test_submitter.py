@@ -0,0 +1,129 @@
+import time
+
+import pytest
+
+from sawtooth_signing import create_context
+
+from sawtooth_coo import coo_submitter
+from sawtooth_coo.coo_client import GDMClient
+from sawtooth_coo.coo_exceptions import CoOBackpressureException
+from sawtooth_coo.coo_submitter import SubmissionQueue
+from sawtooth_coo.testing.validator import MemoryValidator
+
+from conftest import make_message
+
+
+@pytest.fixture
+def validator():
+    validator = MemoryValidator(block_interval=0.01)
+    validator.start()
+    yield validator
+    validator.stop()
+
+
+@pytest.fixture
+def client(validator):
+    key = create_context('secp256k1').new_random_private_key().as_hex()
+    client = GDMClient(validator.url, key=key)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """The bounds of every jittered backoff drawn, each drawn as 0."""
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return 0
+
+    monkeypatch.setattr(coo_submitter.random, 'uniform', uniform)
+    return bounds
+
+
+def _refuse(validator, client, times):
+    """Have the validator turn the first times posts away with 429.
+
+    Returns:
+        (list of float): when each post was made.
+    """
+    posted_at = []
+    submit_batches = client.submit_batches
+
+    def refusing(batches):
+        posted_at.append(time.monotonic())
+        try:
+            submit_batches(batches)
+        except CoOBackpressureException:
+            if len(posted_at) == times:
+                validator.max_queue = None
+            raise
+
+    validator.max_queue = 0
+    client.submit_batches = refusing
+    return posted_at
+
+
+def _messages(count):
+    return [make_message('ref-{}'.format(n)) for n in range(count)]
+
+
+def test_grows_window_and_batches_while_commits_are_quick(client):
+    with SubmissionQueue(client, batch_size=1, window=1,
+                         max_window=4) as queue:
+        futures = queue.put_many(_messages(20))
+        queue.join()
+        stats = queue.stats()
+
+    assert [future.result().batch_status.status
+            for future in futures] == ['COMMITTED'] * 20
+    assert stats['window'] > 1
+    assert stats['batch_size'] > 1
+    assert stats['committed'] == 20
+
+
+def test_requeues_refused_batches_with_jittered_backoff(
+        validator, client, backoffs):
+    posted_at = _refuse(validator, client, 3)
+
+    with SubmissionQueue(client, batch_size=8, window=4) as queue:
+        futures = queue.put_many(_messages(8))
+        queue.join()
+        stats = queue.stats()
+
+    # exponential in the refusals in a row, drawn from 0 up
+    assert backoffs == [(0, 0.25), (0, 0.5), (0, 1.0)]
+    assert len(posted_at) == 4
+    # halved once per target latency, however many refusals
+    assert (stats['window'], stats['batch_size']) == (2, 4)
+    assert (stats['refused'], stats['committed']) == (3, 8)
+    # the same signed batch each time
+    batch_ids = {future.result().batch_status.batch_id for future in futures}
+    assert list(validator.statuses) == list(batch_ids)
+
+
+def test_waits_for_retry_after(validator, client, backoffs):
+    validator.retry_after = 1
+    posted_at = _refuse(validator, client, 1)
+
+    with SubmissionQueue(client) as queue:
+        future = queue.put(make_message('ref-1'))
+        queue.join()
+
+    assert future.result().batch_status.status == 'COMMITTED'
+    assert backoffs == []
+    assert posted_at[1] - posted_at[0] >= 1
+
+
+def test_submits_signed_batches_as_they_are(validator, client):
+    messages = _messages(3)
+    batches, batch_ids, transaction_ids = client.sign_batches(messages)
+
+    with SubmissionQueue(client) as queue:
+        futures = queue.put_batches(batches)
+        queue.join()
+
+    assert [future.result().transaction_id for future in futures] == \
+        transaction_ids
+    assert set(validator.statuses) == set(batch_ids)
@@ -0,0 +1,111 @@
+import itertools
+
+import pytest
+
+from sawtooth_coo.coo_exceptions import CoOException
+from sawtooth_coo.coo_subscriber import GDMSubscriber
+from sawtooth_coo.testing.events import MemoryEventStream
+
+from conftest import fields
+from conftest import make_message
+
+
+@pytest.fixture
+def stream():
+    with MemoryEventStream() as stream:
+        yield stream
+
+
+@pytest.fixture
+def publish(apply, stream):
+    """Apply a 2.0 transaction carrying messages, and publish its events
+    as a block.
+
+    Returns:
+        (str): the id of the block.
+    """
+    def publish(messages):
+        events = []
+        if messages:
+            context = apply('2.0', messages, commit=False)
+            # commit resets the events the context collected
+            events = context.events
+            context.commit()
+        return stream.publish_block(events)
+
+    return publish
+
+
+def _take(subscriber, count):
+    return list(itertools.islice(subscriber.blocks(timeout=5), count))
+
+
+MESSAGES = [
+    make_message('ref-1', 'AU', 'SG'),
+    make_message('ref-2', 'SG', 'AU'),
+    make_message('ref-3', 'AU', 'NZ'),
+]
+
+
+@pytest.mark.parametrize('receiver,sender,expected', [
+    (None, None, ['ref-1', 'ref-2', 'ref-3']),
+    ('SG', None, ['ref-1']),
+    (None, 'AU', ['ref-1', 'ref-3']),
+    ('NZ', 'AU', ['ref-3']),
+    ('SG', 'SG', []),
+])
+def test_blocks_filter_messages(stream, publish, receiver, sender,
+                                expected):
+    with GDMSubscriber(stream.url, receiver=receiver,
+                       sender=sender) as subscriber:
+        block_id = publish(MESSAGES)
+        [block] = _take(subscriber, 1)
+
+    # the block is reported even with no matching messages
+    assert block.block_id == block_id
+    assert sorted(fields(message) for message in block.messages) == [
+        fields(message) for message in MESSAGES
+        if message.sender_ref in expected]
+
+
+def test_catches_up_from_last_known_block(stream, publish):
+    first = publish([make_message('ref-1')])
+    second = publish([make_message('ref-2')])
+    third = publish([])
+
+    with GDMSubscriber(stream.url, receiver='SG',
+                       last_known_block_ids=[first]) as subscriber:
+        blocks = _take(subscriber, 2)
+        fourth = publish([make_message('ref-4')])
+        blocks += _take(subscriber, 1)
+
+    assert [block.block_id for block in blocks] == [second, third, fourth]
+    assert [[message.sender_ref for message in block.messages]
+            for block in blocks] == [['ref-2'], [], ['ref-4']]
+    assert subscriber.last_block_id == fourth
+
+
+def test_resubscribes_from_last_block_seen(stream, publish):
+    subscriber = GDMSubscriber(stream.url)
+    with subscriber:
+        publish([make_message('ref-1')])
+        _take(subscriber, 1)
+
+    missed = publish([make_message('ref-2')])
+
+    with subscriber:
+        [block] = _take(subscriber, 1)
+
+    assert block.block_id == missed
+    assert [message.sender_ref for message in block.messages] == ['ref-2']
+
+
+def test_unknown_block(stream, publish):
+    publish([make_message('ref-1')])
+
+    subscriber = GDMSubscriber(
+        stream.url, last_known_block_ids=['f' * 128])
+
+    with pytest.raises(CoOException) as raised:
+        subscriber.subscribe()
+    assert 'UNKNOWN_BLOCK' in str(raised.value)
@@ -0,0 +1,59 @@
+import pytest
+
+from sawtooth_sdk.processor.exceptions import AuthorizationException
+from sawtooth_sdk.processor.exceptions import InternalError
+from sawtooth_signing import create_context
+
+from sawtooth_coo.coo_client import GDMClient
+from sawtooth_coo.testing.context import MemoryContext
+from sawtooth_coo.testing.validator import MemoryValidator
+
+from conftest import make_message
+
+
+def test_context_allows_declared_addresses_and_prefixes():
+    context = MemoryContext(
+        {'abc1': b'data'}, inputs=['abc1', 'de'], outputs=['de'])
+
+    assert [entry.data for entry in context.get_state(['abc1', 'de5'])] \
+        == [b'data']
+    context.set_state({'de5': b'data'})
+    context.delete_state(['de6'])
+
+
+@pytest.mark.parametrize('call,argument', [
+    ('get_state', ['abc2']),
+    ('set_state', {'abc1': b'data'}),
+    ('delete_state', ['abc1']),
+])
+def test_context_rejects_undeclared_addresses(call, argument):
+    context = MemoryContext({}, inputs=['abc1'], outputs=['de'])
+
+    with pytest.raises(AuthorizationException):
+        getattr(context, call)(argument)
+
+
+def test_internal_error_leaves_the_batch_pending():
+    validator = MemoryValidator(block_interval=0.01)
+    key = create_context('secp256k1').new_random_private_key().as_hex()
+    # the statuses while each failed attempt is applied
+    failures = []
+    apply = validator.handler.apply
+
+    def failing_apply(request, context):
+        if len(failures) < 3:
+            failures.append(list(validator.statuses.values()))
+            raise InternalError('state unavailable')
+        apply(request, context)
+
+    validator.handler.apply = failing_apply
+    validator.start()
+    client = GDMClient(validator.url, key=key)
+    try:
+        [batch_id] = client.create_many([make_message('ref-1')], wait=5)
+    finally:
+        client.close()
+        validator.stop()
+
+    assert failures == [[('PENDING', [])]] * 3
+    assert validator.statuses[batch_id] == ('COMMITTED', [])
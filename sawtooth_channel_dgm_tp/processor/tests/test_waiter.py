@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from sawtooth_coo.coo_exceptions import CoOException
+from sawtooth_coo.coo_waiter import AsyncBatchStatusWaiter
+from sawtooth_coo.coo_waiter import BatchStatusWaiter
+
+
+class StatusSource:
+    """Answers get_statuses from a dict of batch id keys and status
+    values, counting the queries.
+    """
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.queries = 0
+
+    def get_statuses(self, batch_ids):
+        self.queries += 1
+        return {
+            batch_id: {'id': batch_id, 'status': self.statuses[batch_id],
+                       'invalid_transactions': []}
+            for batch_id in batch_ids
+        }
+
+
+class AsyncStatusSource(StatusSource):
+
+    async def get_statuses(self, batch_ids):
+        return super().get_statuses(batch_ids)
+
+
+def _waiter(source, **kwargs):
+    kwargs.setdefault('min_interval', 0.001)
+    kwargs.setdefault('max_interval', 0.001)
+    return BatchStatusWaiter(source, **kwargs)
+
+
+def test_resolves_final_statuses_together():
+    source = StatusSource({'a': 'COMMITTED', 'b': 'INVALID'})
+    waiter = _waiter(source)
+
+    statuses = waiter.wait(['a', 'b'], timeout=5)
+
+    assert [status.status for status in statuses.values()] == \
+        ['COMMITTED', 'INVALID']
+    # the thread may poll for 'a' before 'b' is added
+    assert source.queries <= 2
+    assert waiter.outstanding == 0
+
+
+def test_resolves_unknown_after_unknown_polls():
+    source = StatusSource({'a': 'UNKNOWN'})
+    waiter = _waiter(source, unknown_polls=3)
+
+    status = waiter.wait(['a'], timeout=5)['a']
+
+    assert status.status == 'UNKNOWN'
+    assert source.queries == 3
+
+
+def test_pending_resets_unknown_polls():
+    source = StatusSource({'a': 'UNKNOWN'})
+    answers = iter(['UNKNOWN', 'PENDING', 'UNKNOWN', 'UNKNOWN'])
+
+    def get_statuses(batch_ids):
+        source.statuses['a'] = next(answers, 'UNKNOWN')
+        return StatusSource.get_statuses(source, batch_ids)
+
+    source.get_statuses = get_statuses
+    waiter = _waiter(source, unknown_polls=2)
+
+    assert waiter.wait(['a'], timeout=5)['a'].status == 'UNKNOWN'
+    assert source.queries == 4
+
+
+def test_times_out_with_last_status():
+    waiter = _waiter(StatusSource({'a': 'PENDING'}))
+
+    assert waiter.wait(['a'], timeout=0.05)['a'].status == 'PENDING'
+
+
+def test_close_resolves_waiting_batches_and_stops_the_thread():
+    waiter = _waiter(StatusSource({'a': 'PENDING'}))
+    future = waiter.add('a')
+
+    waiter.close()
+
+    assert future.result(timeout=1).status == 'PENDING'
+    assert not any(thread.name == 'gdm-batch-waiter'
+                   for thread in threading.enumerate())
+    with pytest.raises(CoOException):
+        waiter.add('b')
+
+
+def test_async_waiter():
+    async def run():
+        source = AsyncStatusSource(
+            {'a': 'COMMITTED', 'b': 'UNKNOWN', 'c': 'PENDING'})
+        waiter = AsyncBatchStatusWaiter(
+            source, min_interval=0.001, max_interval=0.001,
+            unknown_polls=2)
+
+        statuses = await waiter.wait(['a', 'b'], timeout=5)
+        pending = waiter.add('c')
+        await waiter.close()
+
+        return statuses, await pending, waiter.outstanding
+
+    statuses, pending, outstanding = asyncio.run(run())
+
+    assert [status.status for status in statuses.values()] == \
+        ['COMMITTED', 'UNKNOWN']
+    assert pending.status == 'PENDING'
+    assert outstanding == 0
+
+
+def test_wait_does_not_take_the_deadline_of_an_earlier_add():
+    waiter = _waiter(StatusSource({'a': 'PENDING'}))
+    waiter.add('a', timeout=300)
+
+    started = time.monotonic()
+    status = waiter.wait(['a'], timeout=0.05)['a']
+
+    assert time.monotonic() - started < 5
+    assert status.status == 'PENDING'
+    # still followed for the earlier add
+    assert waiter.outstanding == 1
+    waiter.close()
+
+
+def test_async_wait_does_not_take_the_deadline_of_an_earlier_add():
+    async def run():
+        waiter = AsyncBatchStatusWaiter(
+            AsyncStatusSource({'a': 'PENDING'}),
+            min_interval=0.001, max_interval=0.001)
+        earlier = waiter.add('a', timeout=300)
+
+        status = (await waiter.wait(['a'], timeout=0.05))['a']
+        outstanding = waiter.outstanding
+        await waiter.close()
+
+        return status, outstanding, await earlier
+
+    started = time.monotonic()
+    status, outstanding, earlier = asyncio.run(run())
+
+    assert time.monotonic() - started < 5
+    assert status.status == 'PENDING'
+    assert outstanding == 1
+    assert earlier.status == 'PENDING'